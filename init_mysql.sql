@@ -42,6 +42,20 @@ CREATE TABLE IF NOT EXISTS monitors (
     INDEX idx_user_active (user_id, is_active)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='监测配置';
 
+CREATE TABLE IF NOT EXISTS monitor_alert_states (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    monitor_id INT NOT NULL,
+    alert_type VARCHAR(20) NOT NULL COMMENT '条件类型: price_min/price_max/rise/fall',
+    state VARCHAR(16) NOT NULL DEFAULT 'armed' COMMENT '状态: armed/triggered/cooldown',
+    triggered_at DATETIME COMMENT '最近一次触发通知的时间',
+    last_value DECIMAL(10,2) COMMENT '最近一次触发时的价格或涨跌幅',
+    trigger_count INT DEFAULT 0 COMMENT '累计触发次数',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_monitor_type (monitor_id, alert_type),
+    FOREIGN KEY (monitor_id) REFERENCES monitors(id) ON DELETE CASCADE,
+    INDEX idx_state (state)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='监测预警状态';
+
 CREATE TABLE IF NOT EXISTS stock_daily (
     id INT AUTO_INCREMENT PRIMARY KEY,
     stock_id INT NOT NULL,
@@ -60,6 +74,18 @@ CREATE TABLE IF NOT EXISTS stock_daily (
     INDEX idx_stock_date (stock_id, trade_date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='股票日线数据';
 
+CREATE TABLE IF NOT EXISTS indicator_signals (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    trade_date DATE NOT NULL COMMENT '交易日期',
+    signal_type VARCHAR(32) NOT NULL COMMENT '信号类型: ma_golden_cross/rsi_oversold/boll_break_upper/macd_golden_cross 等',
+    stock_code VARCHAR(10) NOT NULL COMMENT '股票代码',
+    value DECIMAL(12,4) COMMENT '信号值（RSI 类为 RSI 值，其余为收盘价）',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_date_signal_stock (trade_date, signal_type, stock_code),
+    INDEX idx_date_signal (trade_date, signal_type),
+    INDEX idx_stock_code (stock_code)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='全市场技术信号';
+
 CREATE TABLE IF NOT EXISTS notifications (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
@@ -77,14 +103,31 @@ CREATE TABLE IF NOT EXISTS notifications (
     INDEX idx_is_sent (is_sent)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='通知记录';
 
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    notification_id INT NOT NULL UNIQUE COMMENT '对应的通知记录',
+    user_id INT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT '状态: pending/failed，投递成功后删除',
+    attempts INT DEFAULT 0 COMMENT '已尝试投递次数',
+    next_attempt_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '下次投递时间（指数退避）',
+    last_error VARCHAR(500) COMMENT '最近一次投递失败原因',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (notification_id) REFERENCES notifications(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_status_next (status, next_attempt_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='通知发件箱';
+
+-- 已有数据库中缺少的新增列（digest_enabled、digest_window）由后端启动时自动补齐，见 app/database.py ADDED_COLUMNS
 CREATE TABLE IF NOT EXISTS notification_configs (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL UNIQUE,
     api_url VARCHAR(500) COMMENT 'Webhook/API地址',
     api_headers JSON COMMENT '请求头配置',
     api_method VARCHAR(10) DEFAULT 'POST' COMMENT '请求方法',
-    api_body_template TEXT COMMENT '请求体模板',
+    api_body_template TEXT COMMENT '请求体模板，支持 {{content}}、{{count}} 占位符',
     is_enabled TINYINT(1) DEFAULT 1 COMMENT '是否启用',
+    digest_enabled TINYINT(1) DEFAULT 0 COMMENT '是否合并发送（汇总窗口内的通知合并为一次请求）',
+    digest_window INT DEFAULT 60 COMMENT '汇总窗口（秒）',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
@@ -7,9 +7,11 @@ from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.services.data_fetcher import data_fetcher
+from app.services.live_indicators import live_indicators
+from app.services.indicator_cache import indicator_cache
 from app.services.stock_service import get_stock_detail
 from app.core.logging import get_logger
-from app.utils.indicators import calculate_ma, calculate_macd, calculate_rsi
+from app.utils.indicators import calculate_ma_lines, calculate_macd, calculate_rsi
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -20,6 +22,7 @@ async def get_kline_chart(
     stock_id: int,
     period: str = Query("daily", description="周期: daily/weekly/monthly"),
     limit: int = Query(200, le=500, description="数据条数"),
+    adjust: str = Query("qfq", description="复权类型: qfq(前复权)/hfq(后复权)/none(不复权)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -32,7 +35,7 @@ async def get_kline_chart(
         stock_code = stock.code if stock else str(stock_id).zfill(6)
         
         klines = await data_fetcher.get_kline_data(
-            stock_code, period, limit=limit
+            stock_code, period, limit=limit, adjust=adjust
         )
         
         return {
@@ -43,6 +46,7 @@ async def get_kline_chart(
             },
             "klines": klines,
             "period": period,
+            "adjust": adjust,
             "total": len(klines)
         }
     except Exception as e:
@@ -76,19 +80,22 @@ async def get_technical_indicators(
         # 计算技术指标
         indicators_data = {}
         
+        # 同一K线版本的指标结果直接从缓存返回
         if "ma" in indicator:
-            indicators_data["ma"] = {
-                "ma5": calculate_ma(klines, 5),
-                "ma10": calculate_ma(klines, 10),
-                "ma20": calculate_ma(klines, 20),
-                "ma60": calculate_ma(klines, 60)
-            }
+            indicators_data["ma"] = indicator_cache.get(
+                stock_code, period, "qfq", "ma:5,10,20,60", klines,
+                lambda k: calculate_ma_lines(k, (5, 10, 20, 60))
+            )
         
         if "macd" in indicator:
-            indicators_data["macd"] = calculate_macd(klines)
+            indicators_data["macd"] = indicator_cache.get(
+                stock_code, period, "qfq", "macd:12,26,9", klines, calculate_macd
+            )
         
         if "rsi" in indicator:
-            indicators_data["rsi"] = calculate_rsi(klines)
+            indicators_data["rsi"] = indicator_cache.get(
+                stock_code, period, "qfq", "rsi:14", klines, calculate_rsi
+            )
         
         return {
             "stock": {
@@ -108,3 +115,37 @@ async def get_technical_indicators(
 
 # 为了向后兼容，保留 /kline/{stock_id} 路由
 # 但建议前端统一使用 /api/stocks/{id}/kline
+
+
+@router.get("/indicators/{stock_id}/latest")
+async def get_latest_indicators(
+    stock_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取最新一根日K的技术指标（MA5/10/20/60、MACD、RSI14、布林带）
+
+    指标状态常驻内存，盘中随行情增量更新，适合实时刷新
+    """
+    try:
+        stock = await get_stock_detail(db, stock_id)
+        stock_code = stock.code if stock else str(stock_id).zfill(6)
+
+        latest = await live_indicators.get(stock_code)
+        if latest is None:
+            raise HTTPException(status_code=404, detail="无法获取K线数据")
+
+        return {
+            "stock": {
+                "id": stock.id if stock else stock_id,
+                "code": stock.code if stock else stock_code,
+                "name": stock.name if stock else ""
+            },
+            "indicators": latest,
+            "period": "daily"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取最新技术指标失败: {stock_id}, 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail="获取技术指标失败")
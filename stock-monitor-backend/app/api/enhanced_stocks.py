@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 import akshare as ak
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
@@ -14,6 +14,9 @@ from app.database import get_db
 from app.dependencies import get_current_user
 from app.models.user import User
 from app.core.logging import get_logger
+from app.services.data_fetcher import data_fetcher
+from app.services.indicator_cache import indicator_cache
+from app.utils.indicators import calculate_technical_summary
 
 logger = get_logger(__name__)
 
@@ -468,58 +471,28 @@ async def get_dragon_tiger_list():
         }
 
 @router.get("/stocks/{stock_code}/technical")
-async def get_stock_technical(stock_code: str):
-    """获取股票技术指标"""
+async def get_stock_technical(
+    stock_code: str,
+    volume_period: int = Query(5, ge=1, le=60, description="量比的平均成交量天数")
+):
+    """
+    获取股票技术指标
+    日K来自共享的K线缓存（前复权），指标使用统一的计算实现，K线已缓存时不产生上游请求
+    """
     try:
-        # 获取历史数据用于计算技术指标
-        end_date = datetime.now().strftime("%Y%m%d")
-        start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
-        
-        hist_data = await run_in_executor(
-            ak.stock_zh_a_hist, 
-            stock_code, 
-            "daily", 
-            start_date, 
-            end_date, 
-            ""
-        )
+        klines = await data_fetcher.get_kline_data(stock_code, "daily", limit=250)
         
-        if hist_data.empty:
+        if not klines:
             return {"technical": {}, "timestamp": datetime.now().isoformat()}
         
-        # 计算简单技术指标
-        latest = hist_data.iloc[-1]
-        recent_20 = hist_data.tail(20)
-        recent_60 = hist_data.tail(60)
-        
-        ma5 = recent_20.tail(5)['收盘'].mean() if len(recent_20) >= 5 else None
-        ma10 = recent_20.tail(10)['收盘'].mean() if len(recent_20) >= 10 else None
-        ma20 = recent_20['收盘'].mean() if len(recent_20) >= 20 else None
-        ma60 = recent_60['收盘'].mean() if len(recent_60) >= 60 else None
-        
-        # 计算RSI (简化版)
-        price_changes = hist_data['收盘'].diff().dropna()
-        gains = price_changes.where(price_changes > 0, 0)
-        losses = -price_changes.where(price_changes < 0, 0)
-        
-        if len(gains) >= 14:
-            avg_gain = gains.rolling(14).mean().iloc[-1]
-            avg_loss = losses.rolling(14).mean().iloc[-1]
-            rs = avg_gain / avg_loss if avg_loss != 0 else 0
-            rsi = 100 - (100 / (1 + rs))
-        else:
-            rsi = None
+        # 同一K线版本的计算结果直接从缓存返回
+        technical = indicator_cache.get(
+            stock_code, "daily", "qfq", f"technical:{volume_period}", klines,
+            lambda k: calculate_technical_summary(k, volume_period)
+        )
         
         return {
-            "technical": {
-                "ma5": round(ma5, 2) if ma5 else None,
-                "ma10": round(ma10, 2) if ma10 else None,
-                "ma20": round(ma20, 2) if ma20 else None,
-                "ma60": round(ma60, 2) if ma60 else None,
-                "rsi": round(rsi, 2) if rsi else None,
-                "current_price": float(latest['收盘']),
-                "volume_ratio": float(latest['成交量']) / recent_20['成交量'].mean() if len(recent_20) > 0 else None
-            },
+            "technical": technical,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -566,6 +539,36 @@ async def get_hot_stocks():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取热门股票失败: {str(e)}")
 
+@router.get("/market/signals")
+async def get_market_signals(
+    trade_date: Optional[date] = Query(None, description="交易日，默认最近一个有信号的交易日"),
+    db: AsyncSession = Depends(get_db)
+):
+    """全市场技术信号概览（各信号触发的股票数）"""
+    from app.services.universe_scan import universe_scan
+    try:
+        summary = await universe_scan.get_summary(db, trade_date)
+        return {**summary, "timestamp": datetime.now().isoformat()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取技术信号失败: {str(e)}")
+
+@router.get("/market/signals/{signal_type}")
+async def get_market_signal_stocks(
+    signal_type: str,
+    trade_date: Optional[date] = Query(None, description="交易日，默认最近一个有信号的交易日"),
+    limit: int = Query(200, ge=1, le=6000, description="返回数量"),
+    db: AsyncSession = Depends(get_db)
+):
+    """某个交易日触发指定信号的股票（如 ma_golden_cross 查询当日均线金叉）"""
+    from app.services.universe_scan import universe_scan, SIGNAL_TYPES
+    if signal_type not in SIGNAL_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的信号类型，可选: {', '.join(SIGNAL_TYPES)}")
+    try:
+        result = await universe_scan.get_signals(db, signal_type, trade_date, limit)
+        return {**result, "timestamp": datetime.now().isoformat()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取技术信号失败: {str(e)}")
+
 @router.get("/stocks/{stock_code}/peers")
 async def get_stock_peers(stock_code: str):
     """获取同行业股票对比"""
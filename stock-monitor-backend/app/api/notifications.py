@@ -22,14 +22,19 @@ async def get_config(
         return {
             "api_url": None,
             "api_method": "POST",
-            "is_enabled": False
+            "is_enabled": False,
+            "digest_enabled": False,
+            "digest_window": 60
         }
     return {
         "id": config.id,
         "api_url": config.api_url,
         "api_method": config.api_method,
         "api_headers": config.api_headers,
-        "is_enabled": config.is_enabled
+        "api_body_template": config.api_body_template,
+        "is_enabled": config.is_enabled,
+        "digest_enabled": bool(config.digest_enabled),
+        "digest_window": config.digest_window
     }
 
 @router.put("/config")
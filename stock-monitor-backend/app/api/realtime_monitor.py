@@ -21,6 +21,7 @@ from app.models.user import User
 from app.models.monitor import Monitor
 from app.models.stock import Stock
 from app.core.logging import get_logger
+from app.services.alert_engine import alert_engine, MonitorTable
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/api/realtime", tags=["实时监测"])
@@ -156,53 +157,6 @@ async def fetch_realtime_quotes(stock_codes: List[str]) -> Dict[str, Dict]:
         return result
 
 
-def check_alerts(monitor: Monitor, quote: Dict) -> List[Dict]:
-    """
-    检查监测预警条件
-    返回触发的预警列表
-    """
-    alerts = []
-    price = quote.get('price', 0)
-    change_percent = quote.get('change_percent', 0)
-    
-    if not price:
-        return alerts
-    
-    # 检查最高价预警（price_max）
-    if monitor.price_max and price >= float(monitor.price_max):
-        alerts.append({
-            'type': 'price_max',
-            'message': f'股价 {price:.2f} 已达到或超过预警价 {float(monitor.price_max):.2f}',
-            'level': 'warning'
-        })
-    
-    # 检查最低价预警（price_min）
-    if monitor.price_min and price <= float(monitor.price_min):
-        alerts.append({
-            'type': 'price_min',
-            'message': f'股价 {price:.2f} 已达到或低于预警价 {float(monitor.price_min):.2f}',
-            'level': 'warning'
-        })
-    
-    # 检查涨幅预警（rise_threshold）
-    if monitor.rise_threshold and change_percent >= float(monitor.rise_threshold):
-        alerts.append({
-            'type': 'rise',
-            'message': f'涨幅 {change_percent:.2f}% 已达到或超过预警值 {float(monitor.rise_threshold):.2f}%',
-            'level': 'info'
-        })
-    
-    # 检查跌幅预警（fall_threshold）
-    if monitor.fall_threshold and change_percent <= -float(monitor.fall_threshold):
-        alerts.append({
-            'type': 'fall',
-            'message': f'跌幅 {abs(change_percent):.2f}% 已达到或超过预警值 {float(monitor.fall_threshold):.2f}%',
-            'level': 'danger'
-        })
-    
-    return alerts
-
-
 @router.get("/monitors")
 async def get_realtime_monitors(
     current_user: User = Depends(get_current_user),
@@ -237,11 +191,22 @@ async def get_realtime_monitors(
         # 3. 获取实时行情
         quotes = await fetch_realtime_quotes(stock_codes)
         
-        # 4. 组装返回数据
+        # 4. 一次计算全部监测的预警条件（与定时检查共用预警引擎）
+        table = MonitorTable.from_records(
+            (monitor.id, monitor.user_id, stock.id, stock.code,
+             monitor.price_min, monitor.price_max, monitor.rise_threshold, monitor.fall_threshold)
+            for monitor, stock in monitors_with_stocks
+        )
+        alert_result = alert_engine.evaluate(table, quotes)
+        alerts_by_monitor = {
+            int(table.monitor_ids[row]): alert_result.alerts(row) for row in alert_result.triggered_rows().tolist()
+        }
+        
+        # 5. 组装返回数据
         monitor_list = []
         for monitor, stock in monitors_with_stocks:
             quote = quotes.get(stock.code, {})
-            alerts = check_alerts(monitor, quote) if quote else []
+            alerts = alerts_by_monitor.get(monitor.id, [])
             
             monitor_list.append({
                 "id": monitor.id,
@@ -321,11 +286,19 @@ async def get_realtime_status():
     """
     获取实时监测服务状态
     """
+    from app.core.leader import leader_election
+    from app.services.quote_stream import quote_stream
+    from app.services.alert_watcher import alert_watcher
+    from app.services.notification_outbox import notification_outbox
     return {
         "is_trading": is_trading_time(),
         "cache_valid": is_monitor_cache_valid(),
         "cache_size": len(_monitor_cache),
         "cache_ttl": _MONITOR_CACHE_TTL if is_trading_time() else 300,
         "cache_time": _monitor_cache_time.isoformat() if _monitor_cache_time else None,
+        "stream": quote_stream.get_status(),
+        "leader": leader_election.get_status(),
+        "alerts": alert_watcher.get_status(),
+        "notifications": notification_outbox.get_status(),
         "server_time": datetime.now().isoformat()
     }
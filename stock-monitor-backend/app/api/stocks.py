@@ -6,7 +6,8 @@ from app.services.data_fetcher import data_fetcher
 from app.services.akshare_api import akshare_service
 from app.database import get_db
 from app.core.logging import get_logger
-from app.utils.indicators import calculate_ma, calculate_rsi, calculate_macd
+from app.utils.indicators import calculate_ma_lines, calculate_rsi, calculate_macd
+from app.services.indicator_cache import indicator_cache
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -144,6 +145,7 @@ async def get_stock_kline(
     stock_id: int,
     type: str = Query("day", description="K线类型: day/week/month"),
     limit: int = Query(200, le=500, description="数据条数"),
+    adjust: str = Query("qfq", description="复权类型: qfq(前复权)/hfq(后复权)/none(不复权)"),
     db: AsyncSession = Depends(get_db)
 ):
     """获取K线数据"""
@@ -162,12 +164,13 @@ async def get_stock_kline(
         
         # 获取K线数据
         klines = await data_fetcher.get_kline_data(
-            stock_code, period, limit=limit
+            stock_code, period, limit=limit, adjust=adjust
         )
         
         return {
             "klines": klines,
             "period": type,
+            "adjust": adjust,
             "total": len(klines)
         }
     except Exception as e:
@@ -198,14 +201,10 @@ async def get_stock_indicators(
         # 计算技术指标
         indicators_data = {}
         if "ma" in indicator:
-            ma5 = calculate_ma(klines, 5)
-            ma10 = calculate_ma(klines, 10)
-            ma20 = calculate_ma(klines, 20)
-            indicators_data = {
-                "ma5": ma5,
-                "ma10": ma10,
-                "ma20": ma20
-            }
+            indicators_data = indicator_cache.get(
+                stock_code, "daily", "qfq", "ma:5,10,20", klines,
+                lambda k: calculate_ma_lines(k, (5, 10, 20))
+            )
         
         return indicators_data
     except HTTPException:
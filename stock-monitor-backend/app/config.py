@@ -43,10 +43,86 @@ class Settings(BaseSettings):
     STOCK_UPDATE_INTERVAL: int = 300  # 股票数据更新间隔（秒）
     MONITOR_CHECK_INTERVAL: int = 60  # 监测检查间隔（秒）
 
+    # 批量行情配置
+    QUOTE_BATCH_SIZE: int = 200  # 东方财富批量行情每个请求的股票数
+    QUOTE_BATCH_CONCURRENCY: int = 4  # 批量行情并发请求数
+    SINA_BATCH_SIZE: int = 300  # 新浪备用行情每个请求的股票数
+
+    # 多进程共享行情快照（POSIX 共享内存，多个 worker 只下载一份全市场数据）
+    MARKET_SNAPSHOT_SHARED: bool = True  # 是否启用（不支持的平台自动退回进程内缓存）
+    MARKET_SNAPSHOT_NAME: str = "stock_monitor_market"  # 共享内存名称，同一主机多套部署时需区分
+    MARKET_SNAPSHOT_CAPACITY: int = 8000  # 快照最多容纳的股票数
+    MARKET_SNAPSHOT_MIN_INTERVAL: int = 60  # 距上次发布不足该秒数时，其他进程不再重复下载
+
+    # 主进程选举（多 worker 部署时只有主进程运行定时任务）
+    LEADER_LOCK_FILE: str = ""  # 选举锁文件路径，为空时使用系统临时目录下的 stock_monitor_leader.lock
+    LEADER_RETRY_INTERVAL: float = 5.0  # 从进程尝试接管的间隔（秒）
+
+    # 预警状态机（只在条件从不满足变为满足时通知）
+    ALERT_COOLDOWN: int = 1800  # 同一监测同一条件两次通知的最小间隔（秒）
+    ALERT_HYSTERESIS: float = 0.5  # 回差：价格条件为阈值的百分比，涨跌幅条件为百分点，条件回落超过回差才算解除
+    ALERT_REARM_POLICY: str = "cross"  # 重新布防策略：cross 条件解除且冷却结束后布防；daily 每个交易日最多通知一次
+    ALERT_EVENT_DRIVEN: bool = True  # 收到行情立即检查相关监测（主进程）
+    ALERT_EVENT_DEBOUNCE: float = 0.2  # 合并短时间内多次行情更新的等待时间（秒）
+    MONITOR_REGISTRY_RECONCILE: int = 30  # 活跃监测注册表与数据库校验的间隔（秒），发现其他进程的修改
+    ALERT_SAFETY_NET_INTERVAL: int = 2  # 定时全量检查的间隔（分钟）
+    ALERT_POLL_INTERVAL: float = 5.0  # 推送行情未连接时，主进程轮询监测股票行情的间隔（秒），0 表示不轮询
+
+    # 通知投递（预警检查只写入发件箱，由主进程的投递任务异步发送）
+    NOTIFY_WORKERS: int = 8  # 并发投递的工作协程数
+    NOTIFY_PER_DESTINATION: int = 2  # 同一目标主机的最大并发请求数
+    NOTIFY_MAX_ATTEMPTS: int = 6  # 最多尝试投递次数，超过后标记为 failed
+    NOTIFY_RETRY_BASE: float = 5.0  # 首次重试等待时间（秒），之后每次翻倍
+    NOTIFY_RETRY_MAX: float = 600.0  # 重试等待时间上限（秒）
+    NOTIFY_POLL_INTERVAL: float = 5.0  # 没有新通知时扫描发件箱的间隔（秒）
+    NOTIFY_BATCH_SIZE: int = 200  # 每次从发件箱读取的最大条数
+    NOTIFY_FLUSH_INTERVAL: float = 0.5  # 投递结果合并写回数据库的等待时间（秒）
+    NOTIFY_DIGEST_MAX: int = 50  # 汇总模式下一次请求最多合并的通知条数
+
+    # 上游数据源地址（离线压测时可指向本地模拟服务，见 simulator/）
+    EASTMONEY_PUSH2_URL: str = "https://push2.eastmoney.com"  # 实时行情、资金流向
+    EASTMONEY_PUSH2HIS_URL: str = "https://push2his.eastmoney.com"  # K线
+    EASTMONEY_SEARCH_URL: str = "https://searchapi.eastmoney.com"  # 搜索
+    SINA_QUOTE_URL: str = "https://hq.sinajs.cn"  # 新浪备用行情
+
+    # 推送行情配置（东方财富 push2 SSE 长连接）
+    QUOTE_STREAM_ENABLED: bool = False  # 是否启用推送行情
+    QUOTE_STREAM_URL: str = "https://push2.eastmoney.com/api/qt/ulist/sse"  # 推送地址，可指向本地模拟服务
+    QUOTE_STREAM_STALE_SECONDS: float = 30.0  # 超过该时间没有收到任何消息则重连（秒）
+    QUOTE_STREAM_RECONNECT_MIN: float = 1.0  # 重连初始等待（秒）
+    QUOTE_STREAM_RECONNECT_MAX: float = 30.0  # 重连最大等待（秒）
+    QUOTE_STREAM_REFRESH_INTERVAL: int = 30  # 重新加载监测股票列表的间隔（秒）
+
+    # HTTP 客户端配置（按上游主机划分连接池，按接口类别区分超时）
+    HTTP_POOL_SIZE_EASTMONEY: int = 20  # push2.eastmoney.com 连接池大小
+    HTTP_POOL_SIZE_EASTMONEY_HIS: int = 10  # push2his.eastmoney.com 连接池大小
+    HTTP_POOL_SIZE_SEARCH: int = 5  # searchapi.eastmoney.com 连接池大小
+    HTTP_POOL_SIZE_SINA: int = 10  # hq.sinajs.cn 连接池大小
+    HTTP_POOL_SIZE_WEBHOOK: int = 20  # 通知 Webhook 连接池大小
+    HTTP_POOL_SIZE_STREAM: int = 2  # 推送行情长连接池大小
+    HTTP_DNS_CACHE_TTL: int = 300  # DNS 缓存时间（秒）
+    HTTP_KEEPALIVE_TIMEOUT: int = 60  # 空闲长连接保持时间（秒）
+    HTTP_CONNECT_TIMEOUT: float = 1.0  # 行情类上游连接超时（秒）
+    HTTP_READ_TIMEOUT_QUOTE: float = 2.0  # 实时行情读取超时（秒）
+    HTTP_READ_TIMEOUT_KLINE: float = 5.0  # K线/资金流向读取超时（秒）
+    HTTP_READ_TIMEOUT_SEARCH: float = 3.0  # 搜索读取超时（秒）
+    HTTP_CONNECT_TIMEOUT_WEBHOOK: float = 3.0  # Webhook 连接超时（秒）
+    HTTP_READ_TIMEOUT_WEBHOOK: float = 10.0  # Webhook 读取超时（秒）
+
     # 缓存配置
     CACHE_TTL_REALTIME: int = 60  # 实时数据缓存时间（秒），调长到60秒
     CACHE_TTL_KLINE: int = 600  # K线数据缓存时间（秒），调长到10分钟
     CACHE_TTL_FINANCIAL: int = 3600  # 财务数据缓存时间（秒）
+    CACHE_TTL_KLINE_MINUTE: int = 30  # 分钟K线缓存时间（秒）
+    CACHE_TTL_ADJUST_FACTOR: int = 43200  # 复权因子表缓存时间（秒），除权除息很少发生
+    CACHE_TTL_NEGATIVE: int = 120  # 负缓存时间（秒）：所有数据源都查不到的股票（北交所、退市、停牌等）及空结果
+    INDICATOR_CACHE_SIZE: int = 2000  # 技术指标结果缓存条数（按K线版本自动失效）
+
+    # 全市场技术信号扫描（主进程定时执行，结果按交易日写入 indicator_signals 表）
+    UNIVERSE_SCAN_BARS: int = 120  # 参与计算的日K数量
+    UNIVERSE_SCAN_KEEP_DAYS: int = 5  # 收盘后扫描写入最近几个交易日的信号
+    UNIVERSE_SCAN_CONCURRENCY: int = 8  # 构建历史K线矩阵时的并发下载数
+    UNIVERSE_SCAN_INTERVAL: int = 10  # 盘中用最新价重新扫描当日信号的间隔（分钟）
     
     # 市场数据缓存配置（避免频繁调用 AkShare API）
     # 由于监测个股已有专门的高效 API，市场数据缓存时间可以调长
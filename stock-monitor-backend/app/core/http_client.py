@@ -0,0 +1,109 @@
+"""
+共享 HTTP 客户端
+为整个应用提供统一管理的 aiohttp 会话：
+1. 按上游主机划分长连接池，复用 TCP/TLS 连接
+2. 每个连接池开启 DNS 缓存
+3. 按接口类别区分连接超时和读取超时，避免慢上游长时间占用连接
+应用启动时创建，关闭时统一释放
+"""
+from typing import Dict, Tuple
+import aiohttp
+
+from app.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 上游连接池
+UPSTREAM_EASTMONEY = "eastmoney"          # push2.eastmoney.com（实时行情、资金流向）
+UPSTREAM_EASTMONEY_HIS = "eastmoney_his"  # push2his.eastmoney.com（K线）
+UPSTREAM_EASTMONEY_SEARCH = "eastmoney_search"  # searchapi.eastmoney.com（搜索）
+UPSTREAM_SINA = "sina"                    # hq.sinajs.cn（备用行情）
+UPSTREAM_WEBHOOK = "webhook"              # 用户配置的通知地址
+UPSTREAM_EASTMONEY_STREAM = "eastmoney_stream"  # push2.eastmoney.com 推送行情长连接
+
+# 接口类别
+ENDPOINT_QUOTE = "quote"
+ENDPOINT_KLINE = "kline"
+ENDPOINT_SEARCH = "search"
+ENDPOINT_WEBHOOK = "webhook"
+ENDPOINT_STREAM = "stream"
+
+
+class HTTPClientManager:
+    """共享 HTTP 会话管理器"""
+
+    def __init__(self):
+        settings = get_settings()
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        # 各上游连接池大小
+        self._pool_sizes: Dict[str, int] = {
+            UPSTREAM_EASTMONEY: settings.HTTP_POOL_SIZE_EASTMONEY,
+            UPSTREAM_EASTMONEY_HIS: settings.HTTP_POOL_SIZE_EASTMONEY_HIS,
+            UPSTREAM_EASTMONEY_SEARCH: settings.HTTP_POOL_SIZE_SEARCH,
+            UPSTREAM_SINA: settings.HTTP_POOL_SIZE_SINA,
+            UPSTREAM_WEBHOOK: settings.HTTP_POOL_SIZE_WEBHOOK,
+            UPSTREAM_EASTMONEY_STREAM: settings.HTTP_POOL_SIZE_STREAM,
+        }
+        # 各接口类别的 (连接超时, 读取超时)，单位秒
+        self._timeouts: Dict[str, Tuple[float, float]] = {
+            ENDPOINT_QUOTE: (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT_QUOTE),
+            ENDPOINT_KLINE: (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT_KLINE),
+            ENDPOINT_SEARCH: (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT_SEARCH),
+            ENDPOINT_WEBHOOK: (settings.HTTP_CONNECT_TIMEOUT_WEBHOOK, settings.HTTP_READ_TIMEOUT_WEBHOOK),
+            # 推送连接没有总超时，长时间收不到消息视为断线
+            ENDPOINT_STREAM: (settings.HTTP_CONNECT_TIMEOUT, settings.QUOTE_STREAM_STALE_SECONDS),
+        }
+        self._dns_cache_ttl = settings.HTTP_DNS_CACHE_TTL
+        self._keepalive_timeout = settings.HTTP_KEEPALIVE_TIMEOUT
+
+    def _create_session(self, upstream: str) -> aiohttp.ClientSession:
+        """创建某个上游的会话（独立连接池）"""
+        size = self._pool_sizes.get(upstream, 10)
+        connector = aiohttp.TCPConnector(
+            limit=size,
+            limit_per_host=size,
+            ttl_dns_cache=self._dns_cache_ttl,
+            keepalive_timeout=self._keepalive_timeout,
+        )
+        # 默认使用行情类超时，具体请求可以通过 timeout() 覆盖
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout(ENDPOINT_QUOTE))
+
+    async def start(self) -> None:
+        """应用启动时预先创建所有连接池"""
+        for upstream in self._pool_sizes:
+            self.session(upstream)
+        logger.info(f"HTTP 客户端已启动，连接池: {self._pool_sizes}")
+
+    def session(self, upstream: str) -> aiohttp.ClientSession:
+        """获取某个上游的共享会话（未启动或已关闭时自动创建）"""
+        session = self._sessions.get(upstream)
+        if session is None or session.closed:
+            session = self._create_session(upstream)
+            self._sessions[upstream] = session
+        return session
+
+    def timeout(self, endpoint: str) -> aiohttp.ClientTimeout:
+        """获取某类接口的超时配置"""
+        connect, read = self._timeouts.get(endpoint, self._timeouts[ENDPOINT_QUOTE])
+        # sock_read 只限制单次读取，持续缓慢返回数据的上游仍会一直占用连接，
+        # 因此普通请求还要限制总耗时；推送长连接没有总超时，靠 sock_read 判断断线
+        # connect 包含等待连接池空闲连接的时间，给出一个读取超时的余量
+        return aiohttp.ClientTimeout(
+            total=None if endpoint == ENDPOINT_STREAM else connect + read,
+            connect=connect + read,
+            sock_connect=connect,
+            sock_read=read,
+        )
+
+    async def close(self) -> None:
+        """应用关闭时释放所有连接"""
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
+        logger.info("HTTP 客户端已关闭")
+
+
+# 全局单例
+http_client = HTTPClientManager()
@@ -0,0 +1,131 @@
+"""
+主进程选举
+多个 uvicorn worker 中只有一个进程运行定时任务（刷新全市场数据、检查监测条件），
+避免任务和通知随 worker 数量成倍增加：
+1. 每个进程以非阻塞方式尝试对同一个锁文件加排他 flock，拿到锁的进程成为主进程
+2. 其余进程定期重试；主进程退出或崩溃时操作系统自动释放锁，下一次重试的进程接管
+3. 锁文件中写入主进程 PID，便于排查
+不需要外部服务。不支持 fcntl 的平台（Windows）视为单进程部署，直接成为主进程。
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Any, Optional, Union
+
+from app.config import get_settings
+from app.core.logging import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+Callback = Callable[[], Union[None, Awaitable[None]]]
+
+
+class LeaderElection:
+    """基于文件锁的主进程选举"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.lock_file = settings.LEADER_LOCK_FILE or os.path.join(
+            tempfile.gettempdir(), "stock_monitor_leader.lock"
+        )
+        self.retry_interval = settings.LEADER_RETRY_INTERVAL
+        self.is_leader = False
+        self.elected_at: Optional[datetime] = None
+        self._fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._on_elected: Optional[Callback] = None
+        self._on_resigned: Optional[Callback] = None
+
+    async def start(self, on_elected: Callback, on_resigned: Optional[Callback] = None) -> None:
+        """
+        参与选举
+
+        Args:
+            on_elected: 成为主进程时调用（启动定时任务）
+            on_resigned: 停止时若本进程是主进程则调用（关闭定时任务）
+        """
+        self._on_elected = on_elected
+        self._on_resigned = on_resigned
+        if await self._try_acquire():
+            return
+        logger.info(f"进程 {os.getpid()} 作为从进程运行，等待接管定时任务")
+        self._task = asyncio.create_task(self._retry_loop())
+
+    async def stop(self) -> None:
+        """退出选举；主进程先关闭定时任务再释放锁"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader and self._on_resigned is not None:
+            await self._call(self._on_resigned)
+        self._release()
+
+    def get_status(self) -> Dict[str, Any]:
+        """选举状态"""
+        return {
+            "pid": os.getpid(),
+            "is_leader": self.is_leader,
+            "leader_pid": self._read_leader_pid(),
+            "elected_at": self.elected_at.isoformat() if self.elected_at else None,
+        }
+
+    async def _retry_loop(self) -> None:
+        while not self.is_leader:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                await self._try_acquire()
+            except Exception as e:
+                logger.error(f"主进程选举失败: {str(e)}")
+
+    async def _try_acquire(self) -> bool:
+        """尝试加锁，成功后成为主进程并执行回调"""
+        if fcntl is not None:
+            if self._fd is None:
+                self._fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            os.ftruncate(self._fd, 0)
+            os.pwrite(self._fd, str(os.getpid()).encode(), 0)
+
+        self.is_leader = True
+        self.elected_at = datetime.now()
+        logger.info(f"进程 {os.getpid()} 成为主进程，负责运行定时任务")
+        await self._call(self._on_elected)
+        return True
+
+    def _release(self) -> None:
+        if self._fd is not None:
+            if self.is_leader:
+                os.ftruncate(self._fd, 0)
+            os.close(self._fd)  # 关闭文件描述符即释放 flock
+            self._fd = None
+        self.is_leader = False
+
+    def _read_leader_pid(self) -> Optional[int]:
+        if fcntl is None:
+            return os.getpid()
+        try:
+            with open(self.lock_file) as f:
+                content = f.read().strip()
+            return int(content) if content else None
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    async def _call(callback: Callback) -> None:
+        result = callback()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+# 全局单例
+leader_election = LeaderElection()
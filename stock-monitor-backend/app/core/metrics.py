@@ -0,0 +1,101 @@
+"""
+运行指标
+进程内的计数器、瞬时值和耗时统计，通过 /metrics 以 Prometheus 文本格式输出。
+多 worker 部署时每个进程各自统计，输出中带 pid 标签便于区分。
+"""
+import os
+import threading
+from typing import Dict, Tuple, Any, List
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+COUNTER = "counter"
+GAUGE = "gauge"
+SUMMARY = "summary"
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + body + "}"
+
+
+class MetricsRegistry:
+    """指标注册表（线程安全，线程池中的同步代码也可以直接计数）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types: Dict[str, str] = {}
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, List[float]]] = {}  # [count, sum, max]
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """计数器累加"""
+        key = _label_key(labels)
+        with self._lock:
+            self._types.setdefault(name, COUNTER)
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """设置瞬时值"""
+        key = _label_key(labels)
+        with self._lock:
+            self._types.setdefault(name, GAUGE)
+            self._values.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """记录一次观测值（如耗时），输出次数、总和与最大值"""
+        key = _label_key(labels)
+        with self._lock:
+            self._types.setdefault(name, SUMMARY)
+            stats = self._summaries.setdefault(name, {}).setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+
+    def get(self, name: str, **labels) -> float:
+        """读取计数器或瞬时值（不存在时为 0）"""
+        with self._lock:
+            return self._values.get(name, {}).get(_label_key(labels), 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """以字典形式返回全部指标"""
+        with self._lock:
+            result: Dict[str, Any] = {}
+            for name, series in self._values.items():
+                result[name] = [{"labels": dict(k), "value": v} for k, v in series.items()]
+            for name, series in self._summaries.items():
+                result[name] = [
+                    {"labels": dict(k), "count": s[0], "sum": s[1], "max": s[2]}
+                    for k, s in series.items()
+                ]
+            return result
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        pid = (("pid", str(os.getpid())),)
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._types):
+                metric_type = self._types[name]
+                lines.append(f"# TYPE {name} {metric_type}")
+                if metric_type == SUMMARY:
+                    for key, (count, total, peak) in self._summaries.get(name, {}).items():
+                        lines.append(f"{name}_count{_format_labels(key, pid)} {count}")
+                        lines.append(f"{name}_sum{_format_labels(key, pid)} {total}")
+                        lines.append(f"{name}_max{_format_labels(key, pid)} {peak}")
+                else:
+                    for key, value in self._values.get(name, {}).items():
+                        lines.append(f"{name}{_format_labels(key, pid)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局单例
+metrics = MetricsRegistry()
@@ -38,6 +38,22 @@ async def check_monitor_conditions():
     print(f"[{datetime.now()}] 监测条件检查完成")
 
 
+async def scan_universe_signals():
+    """收盘后重建全市场K线矩阵并扫描最近几个交易日的技术信号"""
+    print(f"[{datetime.now()}] 开始全市场技术信号扫描...")
+    from app.services.universe_scan import universe_scan
+    await universe_scan.run_scan()
+
+
+async def scan_universe_signals_intraday():
+    """盘中用最新价扫描当日技术信号"""
+    from app.services.market_cache import market_cache
+    if not market_cache.is_trading_time():
+        return
+    from app.services.universe_scan import universe_scan
+    await universe_scan.run_scan(intraday=True)
+
+
 def start_scheduler():
     # 1. 市场数据缓存刷新任务
     # 开盘前刷新一次（9:00）
@@ -64,15 +80,30 @@ def start_scheduler():
         replace_existing=True
     )
     
-    # 2. 监测条件检查任务（每2分钟，由于监测个股有专门的高效 API，间隔可以调长）
+    # 2. 监测条件检查任务（行情到达时由 alert_watcher 即时检查，这里作为兜底）
+    from app.config import get_settings
     scheduler.add_job(
         check_monitor_conditions,
-        IntervalTrigger(minutes=2),
+        IntervalTrigger(minutes=get_settings().ALERT_SAFETY_NET_INTERVAL),
         id='check_monitors',
         replace_existing=True
     )
     
-    # 3. 股票数据更新任务（每 5 分钟，已被市场缓存替代，保留用于兼容）
+    # 3. 全市场技术信号扫描（收盘后全量扫描，盘中定时更新当日信号）
+    scheduler.add_job(
+        scan_universe_signals,
+        CronTrigger(hour=15, minute=45, day_of_week='mon-fri'),
+        id='scan_signals_close',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        scan_universe_signals_intraday,
+        IntervalTrigger(minutes=get_settings().UNIVERSE_SCAN_INTERVAL),
+        id='scan_signals_intraday',
+        replace_existing=True
+    )
+    
+    # 4. 股票数据更新任务（每 5 分钟，已被市场缓存替代，保留用于兼容）
     # scheduler.add_job(
     #     update_stock_data,
     #     IntervalTrigger(minutes=5),
@@ -86,8 +117,28 @@ def start_scheduler():
     # 启动时立即刷新一次市场数据
     import asyncio
     asyncio.create_task(refresh_market_cache())
+    
+    # 事件驱动预警检查与定时任务一样只在主进程运行
+    from app.services.alert_watcher import alert_watcher
+    asyncio.create_task(alert_watcher.start())
+    
+    # 通知投递（发件箱）同样只在主进程运行
+    from app.services.notification_outbox import notification_outbox
+    asyncio.create_task(notification_outbox.start())
+
+    # 活跃监测股票的推送订阅只在主进程建立，其他 worker 只推送各自 WebSocket 订阅的股票
+    from app.services.quote_stream import quote_stream
+    asyncio.create_task(quote_stream.start_monitors())
 
 
-def shutdown_scheduler():
+async def shutdown_scheduler():
+    from app.services.alert_watcher import alert_watcher
+    from app.services.notification_outbox import notification_outbox
+    from app.services.quote_stream import quote_stream
+    await alert_watcher.stop()
+    await notification_outbox.stop()
+    await quote_stream.stop_monitors()
+    if not scheduler.running:
+        return
     scheduler.shutdown()
     print("定时任务调度器已关闭")
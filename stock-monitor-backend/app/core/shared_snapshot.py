@@ -0,0 +1,195 @@
+"""
+共享内存行情快照
+多个 uvicorn worker 共用一份全市场行情：
+1. 负责刷新的进程把行情写入 POSIX 共享内存中的结构化数组，并发布一个递增的版本号
+2. 其余 worker 以只读方式映射同一段内存，直接在映射上读取，不再各自下载、各自保存
+3. 内存中有两个数据槽轮流写入（双缓冲），头部用序号（seqlock）保证读到的元数据一致
+
+内存布局：
+    头部 128 字节：magic | seq | active_slot | 两个槽的 (version, count, published_at)
+    槽 0：capacity 条记录
+    槽 1：capacity 条记录
+非 POSIX 平台（无 _posixshmem / fcntl）时 available 为 False，调用方退回进程内缓存。
+"""
+import mmap
+import os
+import struct
+import time
+from typing import Optional, Tuple
+import numpy as np
+
+from app.core.logging import get_logger
+
+try:
+    import _posixshmem
+except ImportError:  # Windows 等平台
+    _posixshmem = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# 快照数值字段（与 market_cache 返回的行情字段同名）
+SNAPSHOT_FIELDS = (
+    "price", "change", "change_percent", "open", "high", "low", "pre_close",
+    "volume", "amount", "amplitude", "turnover_rate", "pe_ratio", "pb_ratio",
+    "total_value", "circulating_value", "volume_ratio", "rise_speed",
+    "change_5min", "change_60day", "change_ytd",
+)
+SNAPSHOT_DTYPE = np.dtype(
+    [("code", "S6"), ("name", "S32")] + [(field, "<f8") for field in SNAPSHOT_FIELDS]
+)
+
+_MAGIC = b"SMSNAP01"
+_HEADER = struct.Struct("<8sQI4x")   # magic, seq, active_slot
+_SLOT_META = struct.Struct("<QId4x")  # version, count, published_at
+_HEADER_SIZE = 128  # 头部 + 两个槽的元数据，预留对齐空间
+
+
+class SharedSnapshot:
+    """共享内存快照（单写多读）"""
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name if name.startswith("/") else f"/{name}"
+        self.capacity = capacity
+        self.slot_size = capacity * SNAPSHOT_DTYPE.itemsize
+        self.size = _HEADER_SIZE + 2 * self.slot_size
+        self._mm: Optional[mmap.mmap] = None
+        self._writable = False
+        self._lock_fd: Optional[int] = None
+
+    @property
+    def available(self) -> bool:
+        """当前平台是否支持 POSIX 共享内存"""
+        return _posixshmem is not None and fcntl is not None
+
+    # ==================== 映射 ====================
+
+    def _map(self, writable: bool) -> bool:
+        if self._mm is not None and (self._writable or not writable):
+            return True
+        self.close()
+        flags = os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY
+        try:
+            fd = _posixshmem.shm_open(self.name, flags, mode=0o600)
+        except FileNotFoundError:
+            return False  # 还没有进程发布过快照
+        try:
+            if writable and os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            if os.fstat(fd).st_size < self.size:
+                return False
+            prot = mmap.PROT_READ | mmap.PROT_WRITE if writable else mmap.PROT_READ
+            self._mm = mmap.mmap(fd, self.size, mmap.MAP_SHARED, prot)
+        finally:
+            os.close(fd)
+        self._writable = writable
+        if writable and self._mm[:len(_MAGIC)] != _MAGIC:
+            _HEADER.pack_into(self._mm, 0, _MAGIC, 0, 0)
+        return True
+
+    def close(self) -> None:
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # 仍有数组视图引用该映射，交给垃圾回收
+            self._mm = None
+
+    def unlink(self) -> None:
+        """删除共享内存段（部署下线时使用，正常关闭不删除，保证故障切换后仍有数据可读）"""
+        self.close()
+        try:
+            _posixshmem.shm_unlink(self.name)
+        except FileNotFoundError:
+            pass
+
+    # ==================== 读写 ====================
+
+    def _slot_offset(self, slot: int) -> int:
+        return _HEADER_SIZE + slot * self.slot_size
+
+    def _meta_offset(self, slot: int) -> int:
+        return _HEADER.size + slot * _SLOT_META.size
+
+    def publish(self, rows: np.ndarray) -> int:
+        """
+        发布新快照：写入非活动槽，再切换活动槽
+
+        Args:
+            rows: SNAPSHOT_DTYPE 结构化数组
+
+        Returns:
+            新版本号
+        """
+        if not self._map(writable=True):
+            raise RuntimeError(f"无法创建共享内存: {self.name}")
+        if rows.dtype != SNAPSHOT_DTYPE:
+            raise ValueError("快照数据格式不正确")
+        rows = rows[:self.capacity]
+
+        mm = self._mm
+        _, seq, active = _HEADER.unpack_from(mm, 0)
+        target = 1 - active
+        versions = [_SLOT_META.unpack_from(mm, self._meta_offset(s))[0] for s in (0, 1)]
+        version = max(versions) + 1
+
+        offset = self._slot_offset(target)
+        mm[offset:offset + rows.nbytes] = rows.tobytes()
+
+        # seqlock：写元数据期间 seq 为奇数，读方发现 seq 变化或为奇数时重读
+        _HEADER.pack_into(mm, 0, _MAGIC, seq + 1, active)
+        _SLOT_META.pack_into(mm, self._meta_offset(target), version, len(rows), time.time())
+        _HEADER.pack_into(mm, 0, _MAGIC, seq + 2, target)
+        return version
+
+    def read(self) -> Optional[Tuple[int, float, np.ndarray]]:
+        """
+        读取当前快照
+
+        Returns:
+            (版本号, 发布时间戳, 只读结构化数组视图)，还没有快照时返回 None。
+            视图直接指向共享内存，要到再发布两次之后才会被覆盖。
+        """
+        if self._mm is None and not self._map(writable=False):
+            return None
+        mm = self._mm
+        for _ in range(100):
+            magic, seq, active = _HEADER.unpack_from(mm, 0)
+            if magic != _MAGIC:
+                return None
+            if seq % 2:
+                time.sleep(0)
+                continue
+            version, count, published_at = _SLOT_META.unpack_from(mm, self._meta_offset(active))
+            if _HEADER.unpack_from(mm, 0)[1] == seq:
+                break
+        else:
+            return None
+        if version == 0:
+            return None
+        view = np.frombuffer(mm, dtype=SNAPSHOT_DTYPE, count=count, offset=self._slot_offset(active))
+        if self._writable:
+            view = view.view()
+            view.flags.writeable = False
+        return version, published_at, view
+
+    # ==================== 刷新锁 ====================
+
+    def try_lock(self) -> bool:
+        """尝试获取刷新锁（非阻塞），保证同一时间只有一个进程下载全市场数据"""
+        if self._lock_fd is None:
+            path = os.path.join("/tmp", f"{self.name.lstrip('/')}.lock")
+            self._lock_fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def unlock(self) -> None:
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
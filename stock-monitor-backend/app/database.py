@@ -1,7 +1,12 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
 
 settings = get_settings()
 
@@ -20,6 +25,34 @@ AsyncSessionLocal = async_sessionmaker(
 
 Base = declarative_base()
 
+# 已有表上新增的列（create_all 不会修改已存在的表），启动时补齐
+# (表名, 列名, 列定义)，列定义与 init_mysql.sql 保持一致
+ADDED_COLUMNS = [
+    ("notification_configs", "digest_enabled",
+     "TINYINT(1) DEFAULT 0 COMMENT '是否合并发送（汇总窗口内的通知合并为一次请求）'"),
+    ("notification_configs", "digest_window", "INT DEFAULT 60 COMMENT '汇总窗口（秒）'"),
+]
+
+def upgrade_schema(connection) -> None:
+    """补齐旧数据库缺少的列（可重复执行，在 create_all 之后通过 run_sync 调用）"""
+    inspector = inspect(connection)
+    existing = {}
+    for table, column, definition in ADDED_COLUMNS:
+        if table not in existing:
+            if not inspector.has_table(table):
+                continue
+            existing[table] = {c["name"] for c in inspector.get_columns(table)}
+        if column in existing[table]:
+            continue
+        try:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            logger.info(f"数据库升级: {table} 新增列 {column}")
+        except OperationalError as e:
+            # 多个 worker 同时启动时其他进程可能已经添加（Duplicate column name）
+            if "Duplicate column" not in str(e):
+                raise
+        existing[table].add(column)
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
 from app.api import auth, stocks, monitors, charts, notifications, enhanced_stocks, users
@@ -50,20 +51,38 @@ app.include_router(ws_router, prefix="/ws")
 
 @app.on_event("startup")
 async def startup_event():
-    from app.core.scheduler import start_scheduler
+    from app.core.scheduler import start_scheduler, shutdown_scheduler
+    from app.core.http_client import http_client
+    from app.core.leader import leader_election
+    from app.services.quote_stream import quote_stream
+    from app.database import upgrade_schema
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    start_scheduler()
+        await conn.run_sync(upgrade_schema)
+    await http_client.start()
+    # 多 worker 部署时只有主进程运行定时任务，主进程退出后由其他进程接管
+    await leader_election.start(on_elected=start_scheduler, on_resigned=shutdown_scheduler)
+    await quote_stream.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    from app.core.scheduler import shutdown_scheduler
-    shutdown_scheduler()
+    from app.core.http_client import http_client
+    from app.core.leader import leader_election
+    from app.services.quote_stream import quote_stream
+    await quote_stream.stop()
+    await leader_election.stop()
+    await http_client.close()
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """运行指标（Prometheus 文本格式，每个 worker 进程单独统计）"""
+    from app.core.metrics import metrics
+    return metrics.render_prometheus()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
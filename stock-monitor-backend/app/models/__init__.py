@@ -1,6 +1,6 @@
 from app.models.user import User
-from app.models.stock import Stock, StockDaily
-from app.models.monitor import Monitor, Notification, NotificationConfig
+from app.models.stock import Stock, StockDaily, IndicatorSignal
+from app.models.monitor import Monitor, MonitorAlertState, Notification, NotificationOutbox, NotificationConfig
 from app.database import Base
 
-__all__ = ["User", "Stock", "StockDaily", "Monitor", "Notification", "NotificationConfig", "Base"]
+__all__ = ["User", "Stock", "StockDaily", "IndicatorSignal", "Monitor", "MonitorAlertState", "Notification", "NotificationOutbox", "NotificationConfig", "Base"]
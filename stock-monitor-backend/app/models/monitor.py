@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Numeric, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Numeric, Boolean, DateTime, ForeignKey, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -21,6 +21,22 @@ class Monitor(Base):
     stock = relationship("Stock", back_populates="monitors")
     notifications = relationship("Notification", back_populates="monitor", cascade="all, delete-orphan")
 
+class MonitorAlertState(Base):
+    """监测预警状态（每个监测每种条件一行，没有记录视为 armed）"""
+    __tablename__ = "monitor_alert_states"
+    __table_args__ = (
+        UniqueConstraint("monitor_id", "alert_type", name="uk_monitor_type"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    monitor_id = Column(Integer, ForeignKey("monitors.id", ondelete="CASCADE"), nullable=False)
+    alert_type = Column(String(20), nullable=False)
+    state = Column(String(16), nullable=False, default="armed", index=True)
+    triggered_at = Column(DateTime)
+    last_value = Column(Numeric(10, 2))
+    trigger_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
 class Notification(Base):
     __tablename__ = "notifications"
 
@@ -36,6 +52,22 @@ class Notification(Base):
 
     monitor = relationship("Monitor", back_populates="notifications")
 
+class NotificationOutbox(Base):
+    """通知发件箱（待投递的通知，投递成功后删除，超过重试次数标记为 failed）"""
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("idx_status_next", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(Integer, ForeignKey("notifications.id", ondelete="CASCADE"), nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(16), nullable=False, default="pending")
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, server_default=func.now())
+    last_error = Column(String(500))
+    created_at = Column(DateTime, server_default=func.now())
+
 class NotificationConfig(Base):
     __tablename__ = "notification_configs"
 
@@ -46,5 +78,7 @@ class NotificationConfig(Base):
     api_method = Column(String(10), default="POST")
     api_body_template = Column(Text)
     is_enabled = Column(Boolean, default=True)
+    digest_enabled = Column(Boolean, default=False)
+    digest_window = Column(Integer, default=60)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Numeric, BigInteger, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, Numeric, BigInteger, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -30,3 +30,18 @@ class StockDaily(Base):
     volume = Column(BigInteger)
     amount = Column(Numeric(20, 2))
     turnover_rate = Column(Numeric(5, 2))
+
+class IndicatorSignal(Base):
+    """全市场技术信号（每个交易日每种信号一张表）"""
+    __tablename__ = "indicator_signals"
+    __table_args__ = (
+        UniqueConstraint("trade_date", "signal_type", "stock_code", name="uk_date_signal_stock"),
+        Index("idx_date_signal", "trade_date", "signal_type"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    trade_date = Column(Date, nullable=False)
+    signal_type = Column(String(32), nullable=False)
+    stock_code = Column(String(10), nullable=False, index=True)
+    value = Column(Numeric(12, 4))
+    created_at = Column(DateTime, server_default=func.now())
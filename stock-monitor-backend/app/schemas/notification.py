@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 from datetime import datetime
 
@@ -7,7 +7,10 @@ class NotificationConfigResponse(BaseModel):
     user_id: int
     api_url: Optional[str] = None
     api_method: str
+    api_body_template: Optional[str] = None
     is_enabled: bool
+    digest_enabled: bool = False
+    digest_window: int = 60
 
     class Config:
         from_attributes = True
@@ -16,4 +19,7 @@ class NotificationConfigUpdate(BaseModel):
     api_url: Optional[str] = None
     api_headers: Optional[Dict[str, str]] = None
     api_method: Optional[str] = None
+    api_body_template: Optional[str] = None
     is_enabled: Optional[bool] = None
+    digest_enabled: Optional[bool] = None
+    digest_window: Optional[int] = Field(None, ge=0, le=3600)
@@ -8,7 +8,10 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 from functools import partial
 from concurrent.futures import ThreadPoolExecutor
+from app.config import get_settings
 from app.core.logging import get_logger
+from app.utils.cache import KNOWN_EMPTY, UpstreamError
+from app.utils.singleflight import SingleFlight
 
 logger = get_logger(__name__)
 
@@ -55,6 +58,7 @@ class AkShareService:
             "bid_ask": 5,         # 五档盘口缓存5秒
             "kline_min": 30,      # 分钟K线缓存30秒
             "kline_daily": 600,   # 日K线缓存10分钟
+            "adjust_factor": 43200,  # 复权因子缓存12小时
             "hot_rank": 300,      # 热门排名缓存5分钟
             "fund_flow": 300,     # 资金流向缓存5分钟
             "stock_list": 7200,   # 股票列表缓存2小时
@@ -63,7 +67,10 @@ class AkShareService:
             "financial": 7200,    # 财务数据缓存2小时
             "default": 120        # 默认缓存2分钟
         }
+        # 负缓存：数据源确认没有数据的查询，在该时间内直接返回空结果
+        self._empty_ttl = get_settings().CACHE_TTL_NEGATIVE
         self._cache_ttl = 120  # 默认缓存2分钟（兼容旧代码）
+        self._flight = SingleFlight("akshare")  # 合并相同的并发请求，避免重复占用线程池
     
     @property
     def ak(self):
@@ -103,6 +110,8 @@ class AkShareService:
         if key not in self._cache_time:
             return False
         elapsed = (datetime.now() - self._cache_time[key]).total_seconds()
+        if self._cache.get(key) is KNOWN_EMPTY:
+            return elapsed < self._empty_ttl
         ttl = self._cache_ttl_config.get(cache_type, self._cache_ttl_config["default"])
         return elapsed < ttl
     
@@ -111,8 +120,12 @@ class AkShareService:
         self._cache[key] = value
         self._cache_time[key] = datetime.now()
     
+    def _set_result(self, key: str, value: Any) -> None:
+        """缓存查询结果，空结果记为 KNOWN_EMPTY（使用负缓存TTL）"""
+        self._set_cache(key, value if value else KNOWN_EMPTY)
+    
     def _get_cache(self, key: str, cache_type: str = "default") -> Optional[Any]:
-        """获取缓存，如果有效则返回，否则返回None"""
+        """获取缓存，如果有效则返回，否则返回None；已确认无数据时返回 KNOWN_EMPTY"""
         if self._is_cache_valid(key, cache_type):
             return self._cache.get(key)
         return None
@@ -139,11 +152,16 @@ class AkShareService:
             stock_code: 股票代码 (如 "000001")
 
         Returns:
-            行情数据字典
+            行情数据字典；接口正常返回但没有该股票时返回 None
+
+        Raises:
+            UpstreamError: 接口请求失败
         """
         # 检查缓存
         cache_key = f"realtime_{stock_code}"
         cached = self._get_cache(cache_key, "realtime")
+        if cached is KNOWN_EMPTY:
+            return None
         if cached:
             return cached
         
@@ -175,13 +193,12 @@ class AkShareService:
                     "timestamp": datetime.now().isoformat(),
                 }
             
-            result = await self._run_in_executor(_get_quote)
-            if result:
-                self._set_cache(cache_key, result)
+            result = await self._flight.do(cache_key, self._run_in_executor, _get_quote)
+            self._set_result(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"AkShare 获取实时行情失败: {stock_code}, 错误: {str(e)}")
-            return None
+            raise UpstreamError(str(e)) from e
 
     async def get_realtime_quote_individual(self, stock_code: str) -> Optional[Dict[str, Any]]:
         """
@@ -194,11 +211,16 @@ class AkShareService:
             stock_code: 股票代码 (如 "000672")
 
         Returns:
-            行情数据字典
+            行情数据字典；接口正常返回但没有数据时返回 None
+
+        Raises:
+            UpstreamError: 接口请求失败（失败结果不写入负缓存）
         """
         # 检查缓存（实时行情缓存时间短）
         cache_key = f"realtime_individual_{stock_code}"
         cached = self._get_cache(cache_key, "realtime")
+        if cached is KNOWN_EMPTY:
+            return None
         if cached:
             return cached
         
@@ -254,15 +276,14 @@ class AkShareService:
                     }
                 except Exception as inner_e:
                     logger.warning(f"stock_bid_ask_em 接口失败: {stock_code}, 错误: {str(inner_e)}")
-                    return None
+                    raise
             
-            result = await self._run_in_executor(_get_quote)
-            if result:
-                self._set_cache(cache_key, result)
+            result = await self._flight.do(cache_key, self._run_in_executor, _get_quote)
+            self._set_result(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"AkShare 获取个股实时行情失败: {stock_code}, 错误: {str(e)}")
-            return None
+            raise UpstreamError(str(e)) from e
 
     # ==================== K线数据 ====================
 
@@ -290,9 +311,11 @@ class AkShareService:
             K线数据列表
         """
         # 检查缓存
-        cache_key = f"kline_{stock_code}_{period}_{start_date}_{end_date}_{limit}"
+        cache_key = f"kline_{stock_code}_{period}_{start_date}_{end_date}_{adjust}_{limit}"
         cache_type = "kline_daily" if period in ["daily", "weekly", "monthly"] else "kline_min"
         cached = self._get_cache(cache_key, cache_type)
+        if cached is KNOWN_EMPTY:
+            return []
         if cached:
             return cached
         
@@ -301,9 +324,9 @@ class AkShareService:
                 df = self.ak.stock_zh_a_hist(
                     symbol=stock_code,
                     period=period,
-                    start_date=start_date,
-                    end_date=end_date,
-                    adjust=adjust,
+                    start_date=start_date or "19700101",
+                    end_date=end_date or "20500101",
+                    adjust=adjust or "",
                 )
                 if df.empty:
                     return []
@@ -325,14 +348,54 @@ class AkShareService:
                     })
                 return klines
             
-            result = await self._run_in_executor(_get_kline)
-            if result:
-                self._set_cache(cache_key, result)
+            result = await self._flight.do(cache_key, self._run_in_executor, _get_kline)
+            self._set_result(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"AkShare 获取K线数据失败: {stock_code}, 错误: {str(e)}")
             return []
 
+    # ==================== 复权因子 ====================
+
+    async def get_adjust_factors(self, stock_code: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取个股后复权因子表（新浪数据源）
+
+        因子表只在除权除息日有记录，数据量很小，用于在本地由不复权K线计算前/后复权价格。
+
+        Args:
+            stock_code: 股票代码
+
+        Returns:
+            [{"date": "YYYY-MM-DD", "factor": float}, ...]，获取失败返回 None
+        """
+        cache_key = f"adjust_factor_{stock_code}"
+        cached = self._get_cache(cache_key, "adjust_factor")
+        if cached is not None:
+            return cached
+
+        try:
+            def _get_factors():
+                import pandas as pd
+                symbol = f"{self._get_market(stock_code)}{stock_code}"
+                df = self.ak.stock_zh_a_daily(symbol=symbol, adjust="hfq-factor")
+                if df is None or df.empty:
+                    return []
+                dates = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+                factors = pd.to_numeric(df["hfq_factor"], errors="coerce")
+                return [
+                    {"date": d, "factor": float(f)}
+                    for d, f in zip(dates, factors)
+                    if pd.notna(f) and f > 0
+                ]
+
+            result = await self._flight.do(cache_key, self._run_in_executor, _get_factors)
+            self._set_cache(cache_key, result)
+            return result
+        except Exception as e:
+            logger.error(f"AkShare 获取复权因子失败: {stock_code}, 错误: {str(e)}")
+            return None
+
     # ==================== 分钟K线数据 ====================
 
     async def get_minute_kline(
@@ -357,6 +420,8 @@ class AkShareService:
         # 检查缓存
         cache_key = f"kline_min_{stock_code}_{period}_{limit}"
         cached = self._get_cache(cache_key, "kline_min")
+        if cached is KNOWN_EMPTY:
+            return []
         if cached:
             return cached
         
@@ -384,9 +449,8 @@ class AkShareService:
                     })
                 return klines
             
-            result = await self._run_in_executor(_get_minute_kline)
-            if result:
-                self._set_cache(cache_key, result)
+            result = await self._flight.do(cache_key, self._run_in_executor, _get_minute_kline)
+            self._set_result(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"AkShare 获取分钟K线失败: {stock_code}, 错误: {str(e)}")
@@ -407,6 +471,8 @@ class AkShareService:
         # 检查缓存
         cache_key = f"bid_ask_{stock_code}"
         cached = self._get_cache(cache_key, "bid_ask")
+        if cached is KNOWN_EMPTY:
+            return None
         if cached:
             return cached
         
@@ -459,9 +525,8 @@ class AkShareService:
                 
                 return result
             
-            result = await self._run_in_executor(_get_bid_ask)
-            if result:
-                self._set_cache(cache_key, result)
+            result = await self._flight.do(cache_key, self._run_in_executor, _get_bid_ask)
+            self._set_result(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"AkShare 获取五档盘口失败: {stock_code}, 错误: {str(e)}")
@@ -482,6 +547,8 @@ class AkShareService:
         # 检查缓存
         cache_key = f"hot_rank_{limit}"
         cached = self._get_cache(cache_key, "hot_rank")
+        if cached is KNOWN_EMPTY:
+            return None
         if cached:
             return cached
         
@@ -503,9 +570,8 @@ class AkShareService:
                     })
                 return result
             
-            result = await self._run_in_executor(_get_hot_rank)
-            if result:
-                self._set_cache(cache_key, result)
+            result = await self._flight.do(cache_key, self._run_in_executor, _get_hot_rank)
+            self._set_result(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"AkShare 获取热门股票排名失败: {str(e)}")
@@ -523,6 +589,8 @@ class AkShareService:
         # 检查缓存
         cache_key = "hot_keywords"
         cached = self._get_cache(cache_key, "hot_rank")
+        if cached is KNOWN_EMPTY:
+            return None
         if cached:
             return cached
         
@@ -541,9 +609,8 @@ class AkShareService:
                     })
                 return result
             
-            result = await self._run_in_executor(_get_hot_keywords)
-            if result:
-                self._set_cache(cache_key, result)
+            result = await self._flight.do(cache_key, self._run_in_executor, _get_hot_keywords)
+            self._set_result(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"AkShare 获取热门关键词失败: {str(e)}")
@@ -902,9 +969,17 @@ class AkShareService:
         Returns:
             新闻列表
         """
+        cache_key = f"news_{stock_code}"
+        cached = self._get_cache(cache_key, "news")
+        if cached is KNOWN_EMPTY:
+            return None
+        if cached:
+            return cached
+
         try:
             df = self.ak.stock_news_em(symbol=stock_code)
             if df.empty:
+                self._set_result(cache_key, None)
                 return None
 
             result = []
@@ -916,6 +991,7 @@ class AkShareService:
                     "source": str(row.get("文章来源", "")),
                     "url": str(row.get("新闻链接", "")),
                 })
+            self._set_result(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"AkShare 获取个股新闻失败: {e}")
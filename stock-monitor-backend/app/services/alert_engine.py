@@ -0,0 +1,330 @@
+"""
+预警计算引擎
+把活跃监测的四个阈值（价格下限、价格上限、涨幅、跌幅）打包成数值数组，按股票分组，
+与行情数组一次向量化比较，得到每个监测触发了哪些条件。
+定时检查（check_and_notify）和实时监测接口共用同一套判定规则：
+- 阈值为空或 0 表示不启用该条件
+- 涨跌幅优先按 (最新价 - 昨收) / 昨收 计算，没有昨收时使用行情中的涨跌幅
+- 没有有效价格的股票不触发任何条件
+"""
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+
+logger = get_logger(__name__)
+
+# 条件类型，顺序即定时检查只取一个条件时的优先级
+ALERT_TYPES = ("price_min", "price_max", "rise", "fall")
+ALERT_LEVELS = {"price_min": "warning", "price_max": "warning", "rise": "info", "fall": "danger"}
+
+# 监测记录：(监测ID, 用户ID, 股票ID, 股票代码, 价格下限, 价格上限, 涨幅阈值, 跌幅阈值)
+MonitorRecord = Tuple[int, int, int, str, Any, Any, Any, Any]
+
+
+class MonitorTable:
+    """打包后的监测阈值表（按股票分组存放）"""
+
+    __slots__ = ("monitor_ids", "user_ids", "stock_ids", "codes", "stock_pos", "thresholds")
+
+    def __init__(
+        self,
+        monitor_ids: np.ndarray,
+        user_ids: np.ndarray,
+        stock_ids: np.ndarray,
+        codes: List[str],
+        stock_pos: np.ndarray,
+        thresholds: np.ndarray,
+    ):
+        self.monitor_ids = monitor_ids
+        self.user_ids = user_ids
+        self.stock_ids = stock_ids
+        self.codes = codes            # 去重后的股票代码
+        self.stock_pos = stock_pos    # 每个监测对应 codes 中的下标
+        self.thresholds = thresholds  # (监测数, 4)，列顺序同 ALERT_TYPES，未启用为 NaN
+
+    @classmethod
+    def from_records(cls, records: Iterable[MonitorRecord]) -> "MonitorTable":
+        """由监测记录构建阈值表"""
+        records = list(records)
+        if not records:
+            return cls(
+                np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.int64),
+                [], np.array([], dtype=np.int64), np.full((0, len(ALERT_TYPES)), np.nan),
+            )
+        monitor_ids, user_ids, stock_ids, stock_codes, *columns = zip(*records)
+        codes, stock_pos = np.unique(np.array(stock_codes, dtype=str), return_inverse=True)
+        order = np.argsort(stock_pos, kind="stable")
+
+        # None 转为 NaN；0 与原有的 "if monitor.price_min" 判断一致，视为未启用
+        thresholds = np.array([[float(v) if v is not None else np.nan for v in col] for col in columns]).T
+        thresholds[thresholds == 0] = np.nan
+
+        return cls(
+            np.array(monitor_ids, dtype=np.int64)[order],
+            np.array(user_ids, dtype=np.int64)[order],
+            np.array(stock_ids, dtype=np.int64)[order],
+            codes.tolist(),
+            stock_pos[order].astype(np.int64),
+            thresholds[order],
+        )
+
+    def __len__(self) -> int:
+        return len(self.monitor_ids)
+
+    def rows_for(self, stock_codes: Iterable[str]) -> np.ndarray:
+        """这些股票上的全部监测行号（同一股票的监测在表中是连续的）"""
+        wanted = np.isin(np.array(self.codes, dtype=str), list(stock_codes))
+        return np.flatnonzero(wanted[self.stock_pos])
+
+    def subset(self, rows: np.ndarray) -> "MonitorTable":
+        """取部分监测组成新表（保持按股票分组）"""
+        used, stock_pos = np.unique(self.stock_pos[rows], return_inverse=True)
+        return MonitorTable(
+            self.monitor_ids[rows], self.user_ids[rows], self.stock_ids[rows],
+            [self.codes[i] for i in used.tolist()], stock_pos.astype(np.int64), self.thresholds[rows],
+        )
+
+
+class AlertResult:
+    """一次计算的结果"""
+
+    __slots__ = ("table", "hits", "price", "change_percent")
+
+    def __init__(self, table: MonitorTable, hits: np.ndarray, price: np.ndarray, change_percent: np.ndarray):
+        self.table = table
+        self.hits = hits                      # (监测数, 4) 布尔矩阵
+        self.price = price                    # 每个监测对应股票的最新价
+        self.change_percent = change_percent  # 每个监测对应股票的涨跌幅
+
+    def triggered_rows(self) -> np.ndarray:
+        """触发了任一条件的监测行号"""
+        return np.flatnonzero(self.hits.any(axis=1))
+
+    def first_alerts(self, mask: Optional[np.ndarray] = None) -> Iterator[Tuple[int, str, float]]:
+        """
+        每个触发的监测只取优先级最高的一个条件
+
+        Args:
+            mask: 只考虑这些条件（如状态机本轮允许通知的条件），默认全部满足的条件
+
+        Yields:
+            (行号, 条件类型, 触发值)，价格类条件的触发值为最新价，涨跌幅类为涨跌幅
+        """
+        hits = self.hits if mask is None else mask
+        rows = np.flatnonzero(hits.any(axis=1))
+        first = hits[rows].argmax(axis=1)
+        for row, col in zip(rows.tolist(), first.tolist()):
+            yield row, ALERT_TYPES[col], self.value(row, ALERT_TYPES[col])
+
+    def value(self, row: int, alert_type: str) -> float:
+        if alert_type in ("price_min", "price_max"):
+            return float(self.price[row])
+        return float(self.change_percent[row])
+
+    def alerts(self, row: int) -> List[Dict[str, Any]]:
+        """某个监测触发的全部条件（实时监测接口的返回格式）"""
+        price = float(self.price[row])
+        change = float(self.change_percent[row])
+        result = []
+        for col in np.flatnonzero(self.hits[row]).tolist():
+            alert_type = ALERT_TYPES[col]
+            threshold = float(self.table.thresholds[row, col])
+            result.append({
+                "type": alert_type,
+                "message": alert_message(alert_type, price, change, threshold),
+                "level": ALERT_LEVELS[alert_type],
+            })
+        return result
+
+
+def alert_message(alert_type: str, price: float, change_percent: float, threshold: float) -> str:
+    """预警提示文案"""
+    if alert_type == "price_max":
+        return f"股价 {price:.2f} 已达到或超过预警价 {threshold:.2f}"
+    if alert_type == "price_min":
+        return f"股价 {price:.2f} 已达到或低于预警价 {threshold:.2f}"
+    if alert_type == "rise":
+        return f"涨幅 {change_percent:.2f}% 已达到或超过预警值 {threshold:.2f}%"
+    return f"跌幅 {abs(change_percent):.2f}% 已达到或超过预警值 {threshold:.2f}%"
+
+
+def quote_arrays(codes: Sequence[str], quotes: Dict[str, Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按股票代码顺序整理行情为数组
+
+    Returns:
+        (最新价, 涨跌幅)，没有行情或价格无效的位置为 NaN
+    """
+    price = np.full(len(codes), np.nan)
+    change = np.full(len(codes), np.nan)
+    for i, code in enumerate(codes):
+        quote = quotes.get(code)
+        if not quote:
+            continue
+        current = quote.get("price") or 0
+        if current <= 0:
+            continue
+        price[i] = current
+        pre_close = quote.get("pre_close") or 0
+        if pre_close > 0:
+            change[i] = (current - pre_close) / pre_close * 100
+        else:
+            change[i] = quote.get("change_percent") or 0
+    return price, change
+
+
+class ThresholdIndex:
+    """
+    按股票分组、按阈值排序的监测索引，用于逐笔行情触发
+
+    每个条件列按 (股票, 阈值) 排序，股票的价格/涨跌幅从 v0 变到 v1 时，
+    新满足条件的监测正好是阈值落在 v0 与 v1 之间的那一段，二分查找即可定位，
+    单次更新 O(log n + k)，不需要扫描该股票的全部监测。
+    条件统一表示为 "值 >= 键"（价格上限、涨幅）或 "值 <= 键"（价格下限、跌幅，跌幅键为 -阈值）。
+    """
+
+    # 列号 -> (使用的行情值, 满足条件的方向)
+    _COLUMNS = (
+        ("price", "down"),   # price_min：价格 <= 阈值
+        ("price", "up"),     # price_max：价格 >= 阈值
+        ("change", "up"),    # rise：涨跌幅 >= 阈值
+        ("change", "down"),  # fall：涨跌幅 <= -阈值
+    )
+
+    def __init__(self, table: MonitorTable):
+        self.table = table
+        self._stock_index = {code: i for i, code in enumerate(table.codes)}
+        n_stocks = len(table.codes)
+        self._keys: List[np.ndarray] = []
+        self._rows: List[np.ndarray] = []
+        self._offsets: List[np.ndarray] = []
+        for col in range(len(ALERT_TYPES)):
+            rows = np.flatnonzero(~np.isnan(table.thresholds[:, col]))
+            keys = table.thresholds[rows, col]
+            if ALERT_TYPES[col] == "fall":
+                keys = -keys
+            stocks = table.stock_pos[rows]
+            order = np.lexsort((keys, stocks))
+            self._keys.append(keys[order])
+            self._rows.append(rows[order])
+            self._offsets.append(np.searchsorted(stocks[order], np.arange(n_stocks + 1)))
+        # 每只股票上一次的价格与涨跌幅（NaN 表示还没有收到行情）
+        self._last_price = np.full(n_stocks, np.nan)
+        self._last_change = np.full(n_stocks, np.nan)
+
+    def _crossed(self, col: int, stock: int, before: float, after: float) -> np.ndarray:
+        """值从 before 变为 after 时新满足某列条件的监测行号"""
+        lo, hi = self._offsets[col][stock], self._offsets[col][stock + 1]
+        if lo == hi or after != after:
+            return self._rows[col][:0]
+        keys = self._keys[col][lo:hi]
+        rows = self._rows[col][lo:hi]
+        fresh = before != before
+        if self._COLUMNS[col][1] == "up":
+            # 新满足：before < 键 <= after
+            if not fresh and after <= before:
+                return rows[:0]
+            start = 0 if fresh else np.searchsorted(keys, before, side="right")
+            return rows[start:np.searchsorted(keys, after, side="right")]
+        # 新满足：after <= 键 < before
+        if not fresh and after >= before:
+            return rows[:0]
+        end = len(keys) if fresh else np.searchsorted(keys, before, side="left")
+        return rows[np.searchsorted(keys, after, side="left"):end]
+
+    def update(self, stock_code: str, price: float, change_percent: float) -> List[Tuple[int, str]]:
+        """
+        收到一只股票的新行情
+
+        Returns:
+            新满足条件的 (行号, 条件类型)；该股票第一次收到行情时返回当前满足的全部条件
+        """
+        stock = self._stock_index.get(stock_code)
+        if stock is None or not price or price <= 0:
+            return []
+        values = {
+            "price": (self._last_price[stock], price),
+            "change": (self._last_change[stock], change_percent),
+        }
+        triggered = []
+        for col, (field, _) in enumerate(self._COLUMNS):
+            before, after = values[field]
+            for row in self._crossed(col, stock, before, after).tolist():
+                triggered.append((row, ALERT_TYPES[col]))
+        self._last_price[stock] = price
+        self._last_change[stock] = change_percent
+        return triggered
+
+
+class AlertEngine:
+    """预警计算引擎"""
+
+    def evaluate_arrays(self, table: MonitorTable, price: np.ndarray, change_percent: np.ndarray) -> AlertResult:
+        """
+        用与 table.codes 对齐的行情数组计算所有监测
+
+        Args:
+            table: 监测阈值表
+            price: 每只股票的最新价（NaN 表示无行情）
+            change_percent: 每只股票的涨跌幅
+        """
+        start = time.perf_counter()
+        p = price[table.stock_pos]
+        c = change_percent[table.stock_pos]
+        t = table.thresholds
+        hits = np.empty(t.shape, dtype=bool)
+        # NaN 参与比较结果为 False：未启用的条件和没有行情的股票都不会触发
+        with np.errstate(invalid="ignore"):
+            np.less_equal(p, t[:, 0], out=hits[:, 0])
+            np.greater_equal(p, t[:, 1], out=hits[:, 1])
+            np.greater_equal(c, t[:, 2], out=hits[:, 2])
+            np.less_equal(c, -t[:, 3], out=hits[:, 3])
+        metrics.observe("alert_evaluate_seconds", time.perf_counter() - start)
+        return AlertResult(table, hits, p, c)
+
+    def cleared(self, result: AlertResult, hysteresis: float = 0.0) -> np.ndarray:
+        """
+        条件是否已解除（越过阈值的回差之外），用于预警重新布防
+
+        Args:
+            result: 计算结果
+            hysteresis: 回差，价格条件为阈值的百分比，涨跌幅条件为百分点
+
+        Returns:
+            (监测数, 4) 布尔矩阵；没有行情的股票不视为解除
+        """
+        p, c, t = result.price, result.change_percent, result.table.thresholds
+        ratio = hysteresis / 100
+        cleared = np.empty(t.shape, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            np.greater(p, t[:, 0] * (1 + ratio), out=cleared[:, 0])
+            np.less(p, t[:, 1] * (1 - ratio), out=cleared[:, 1])
+            np.less(c, t[:, 2] - hysteresis, out=cleared[:, 2])
+            np.greater(c, -t[:, 3] + hysteresis, out=cleared[:, 3])
+        return cleared
+
+    def evaluate(self, table: MonitorTable, quotes: Dict[str, Dict[str, Any]]) -> AlertResult:
+        """用 股票代码 -> 行情 的映射计算所有监测"""
+        price, change = quote_arrays(table.codes, quotes)
+        return self.evaluate_arrays(table, price, change)
+
+    def on_quote(self, index: ThresholdIndex, stock_code: str, quote: Dict[str, Any]) -> List[Tuple[int, str]]:
+        """
+        逐笔行情触发：只返回这次价格变动新满足条件的监测
+
+        Returns:
+            [(行号, 条件类型)]，行号对应 index.table
+        """
+        start = time.perf_counter()
+        price, change = quote_arrays([stock_code], {stock_code: quote})
+        triggered = index.update(stock_code, float(price[0]), float(change[0]))
+        metrics.observe("alert_tick_seconds", time.perf_counter() - start)
+        return triggered
+
+
+# 全局单例
+alert_engine = AlertEngine()
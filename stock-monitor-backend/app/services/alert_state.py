@@ -0,0 +1,234 @@
+"""
+预警状态机
+每个监测的每种条件有一个持久化状态，只在状态转换时发送通知，条件持续满足不会重复通知：
+
+    armed      条件满足 -> triggered（发送通知）
+    triggered  条件解除（超出回差）-> 冷却已结束则 armed，否则 cooldown
+    cooldown   距上次通知超过冷却时间 -> armed
+
+重新布防策略 ALERT_REARM_POLICY=daily 时，triggered 只在下一个交易日回到 armed（每天最多通知一次）。
+状态转换对所有监测向量化计算，只有状态发生变化的行写回数据库；armed 状态的行不需要读取。
+"""
+import asyncio
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.models.monitor import Monitor, MonitorAlertState
+from app.services.alert_engine import ALERT_TYPES, AlertResult, MonitorTable, alert_engine
+from app.services.monitor_registry import monitor_registry
+
+logger = get_logger(__name__)
+
+STATE_ARMED = "armed"
+STATE_TRIGGERED = "triggered"
+STATE_COOLDOWN = "cooldown"
+STATES = (STATE_ARMED, STATE_TRIGGERED, STATE_COOLDOWN)
+
+REARM_CROSS = "cross"
+REARM_DAILY = "daily"
+
+_ARMED, _TRIGGERED, _COOLDOWN = range(3)
+_TYPE_COLUMN = {alert_type: col for col, alert_type in enumerate(ALERT_TYPES)}
+
+
+def transition(
+    states: np.ndarray,
+    triggered_at: np.ndarray,
+    holds: np.ndarray,
+    cleared: np.ndarray,
+    now: float,
+    cooldown: float,
+    policy: str = REARM_CROSS,
+    day_start: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算一轮状态转换
+
+    Args:
+        states: (监测数, 4) 当前状态编码
+        triggered_at: 上次触发时间戳，从未触发为 NaN
+        holds: 条件当前是否满足
+        cleared: 条件是否已解除（超出回差）
+        now: 当前时间戳
+        cooldown: 冷却时间（秒）
+        policy: 重新布防策略
+        day_start: 当天零点时间戳（daily 策略使用）
+
+    Returns:
+        (新状态, 本轮触发通知的布尔矩阵)
+    """
+    new_states = states.copy()
+    with np.errstate(invalid="ignore"):
+        cooled = ~(now - triggered_at < cooldown)  # 从未触发（NaN）视为已冷却
+        triggered = states == _TRIGGERED
+        if policy == REARM_DAILY:
+            new_day = ~(triggered_at >= (day_start if day_start is not None else now))
+            new_states[(triggered | (states == _COOLDOWN)) & new_day] = _ARMED
+        else:
+            release = triggered & cleared
+            new_states[release & cooled] = _ARMED
+            new_states[release & ~cooled] = _COOLDOWN
+            new_states[(states == _COOLDOWN) & cooled] = _ARMED
+
+    fired = (new_states == _ARMED) & holds
+    new_states[fired] = _TRIGGERED
+    return new_states, fired
+
+
+class AlertStateService:
+    """预警状态服务类"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.cooldown = settings.ALERT_COOLDOWN
+        self.hysteresis = settings.ALERT_HYSTERESIS
+        self.policy = settings.ALERT_REARM_POLICY if settings.ALERT_REARM_POLICY in (REARM_CROSS, REARM_DAILY) else REARM_CROSS
+        self.lock = asyncio.Lock()
+
+    async def load(
+        self, db: AsyncSession, table: MonitorTable, subset: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        读取非 armed 状态并按阈值表的行对齐
+
+        Args:
+            subset: 表只包含部分监测时只查询这些监测的状态
+
+        Returns:
+            (状态编码, 上次触发时间戳, 累计触发次数)
+        """
+        shape = table.thresholds.shape
+        states = np.full(shape, _ARMED, dtype=np.int8)
+        triggered_at = np.full(shape, np.nan)
+        counts = np.zeros(shape, dtype=np.int64)
+        if not len(table):
+            return states, triggered_at, counts
+
+        query = select(
+            MonitorAlertState.monitor_id, MonitorAlertState.alert_type, MonitorAlertState.state,
+            MonitorAlertState.triggered_at, MonitorAlertState.trigger_count
+        ).where(MonitorAlertState.state != STATE_ARMED)
+        if subset:
+            query = query.where(MonitorAlertState.monitor_id.in_(table.monitor_ids.tolist()))
+        result = await db.execute(query)
+        row_of = dict(zip(table.monitor_ids.tolist(), range(len(table))))
+        for monitor_id, alert_type, state, at, count in result.all():
+            row = row_of.get(monitor_id)
+            col = _TYPE_COLUMN.get(alert_type)
+            if row is None or col is None or state not in STATES:
+                continue
+            states[row, col] = STATES.index(state)
+            triggered_at[row, col] = at.timestamp() if at else np.nan
+            counts[row, col] = count or 0
+        return states, triggered_at, counts
+
+    async def apply(
+        self, db: AsyncSession, result: AlertResult, subset: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        根据本轮计算结果推进状态机，把变化写入当前事务（不提交）
+        调用方应持有 self.lock，避免定时检查与事件触发同时推进同一监测的状态；
+        调用方负责与本轮通知一起提交，保证状态变为 triggered 与通知写入发件箱同时生效；
+        注册表中已被其他进程删除或停用的监测不会写入状态，也不会触发通知
+
+        Args:
+            result: 计算结果
+            subset: result 只包含部分监测
+
+        Returns:
+            (本轮需要发送通知的条件, 状态不是 armed 的条件)，均为 (监测数, 4) 布尔矩阵
+        """
+        table = result.table
+        states, triggered_at, counts = await self.load(db, table, subset)
+        now = datetime.now()
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        cleared = alert_engine.cleared(result, self.hysteresis)
+        new_states, fired = transition(
+            states, triggered_at, result.hits, cleared,
+            now.timestamp(), self.cooldown, self.policy, day_start
+        )
+
+        changed = (new_states != states) | fired
+        stale = await self._stale_rows(db, table, changed.any(axis=1))
+        if stale.any():
+            # 已在其他进程删除或停用的监测：不写状态、不发通知，并移出注册表
+            new_states[stale] = states[stale]
+            fired[stale] = False
+            changed[stale] = False
+        rows, cols = np.nonzero(changed)
+        if len(rows):
+            values = []
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                did_fire = bool(fired[row, col])
+                at = triggered_at[row, col]
+                values.append({
+                    "monitor_id": int(table.monitor_ids[row]),
+                    "alert_type": ALERT_TYPES[col],
+                    "state": STATES[new_states[row, col]],
+                    "triggered_at": now if did_fire else (datetime.fromtimestamp(at) if at == at else None),
+                    "last_value": round(result.value(row, ALERT_TYPES[col]), 2) if did_fire else None,
+                    "trigger_count": int(counts[row, col]) + (1 if did_fire else 0),
+                })
+            stmt = insert(MonitorAlertState).values(values)
+            await db.execute(stmt.on_duplicate_key_update(
+                state=stmt.inserted.state,
+                triggered_at=stmt.inserted.triggered_at,
+                last_value=func.coalesce(stmt.inserted.last_value, MonitorAlertState.last_value),
+                trigger_count=stmt.inserted.trigger_count,
+            ))
+
+        fired_count = int(fired.sum())
+        if fired_count:
+            metrics.inc("alert_transitions_total", fired_count, transition="fired")
+        rearmed = int(((new_states == _ARMED) & (states != _ARMED)).sum())
+        if rearmed:
+            metrics.inc("alert_transitions_total", rearmed, transition="rearmed")
+        suppressed = int((result.hits & ~fired).sum())
+        if suppressed:
+            metrics.inc("alert_transitions_total", suppressed, transition="suppressed")
+        return fired, new_states != _ARMED
+
+    @staticmethod
+    async def _stale_rows(db: AsyncSession, table: MonitorTable, candidates: np.ndarray) -> np.ndarray:
+        """
+        找出本轮要写状态的行中已被删除或停用的监测
+
+        注册表最多在 MONITOR_REGISTRY_RECONCILE 秒后才发现其他进程的删除和停用，
+        期间写入已删除监测的状态或通知会违反外键，使整轮事务回滚。
+        查询加共享锁，提交前其他进程无法删除这些监测
+        """
+        stale = np.zeros(len(table), dtype=bool)
+        rows = np.flatnonzero(candidates)
+        if not len(rows):
+            return stale
+        monitor_ids = table.monitor_ids[rows].tolist()
+        result = await db.execute(
+            select(Monitor.id)
+            .where(Monitor.id.in_(monitor_ids), Monitor.is_active == True)
+            .with_for_update(read=True)
+        )
+        alive = {row[0] for row in result.all()}
+        for row, monitor_id in zip(rows.tolist(), monitor_ids):
+            if monitor_id not in alive:
+                stale[row] = True
+                monitor_registry.remove(monitor_id)
+        if stale.any():
+            metrics.inc("alert_stale_monitors_total", int(stale.sum()))
+            logger.info(f"跳过已删除或停用的监测: {table.monitor_ids[stale].tolist()}")
+        return stale
+
+    async def reset(self, db: AsyncSession, monitor_id: int) -> None:
+        """监测条件修改后重新布防（删除该监测的全部状态）"""
+        await db.execute(delete(MonitorAlertState).where(MonitorAlertState.monitor_id == monitor_id))
+
+
+# 全局单例
+alert_state = AlertStateService()
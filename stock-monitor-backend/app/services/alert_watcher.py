@@ -0,0 +1,239 @@
+"""
+事件驱动的预警检查
+行情一到就检查相关监测，不再等待定时任务：
+- 行情来源：单只/批量行情获取、推送行情（data_fetcher 行情监听），以及全市场快照刷新（market_cache 快照监听）
+- 推送行情未连接时，交易时间内每 ALERT_POLL_INTERVAL 秒批量拉取一次监测股票行情（行情监听同样会触发）
+- 监听回调只做 O(log n) 的阈值索引查询：价格变动新满足条件的股票，以及有未布防（triggered/cooldown）监测的股票标记为待检查
+- 后台任务合并短时间内的多次更新，只对待检查股票上的监测推进状态机并发送通知
+- 只在主进程运行（与定时任务一起由选举启动/停止），定时全量检查保留为兜底
+- 活跃监测来自 monitor_registry，注册表变化（写穿或定期校验发现）时重建阈值索引
+预警延迟（从收到行情到发出通知）记录在 alert_latency_seconds 指标中。
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional, Set
+
+import numpy as np
+
+from app.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.database import AsyncSessionLocal
+from app.services.alert_engine import MonitorTable, ThresholdIndex, alert_engine
+from app.services.data_fetcher import data_fetcher
+from app.services.market_cache import market_cache
+from app.services.monitor_registry import monitor_registry
+
+logger = get_logger(__name__)
+
+
+class AlertWatcher:
+    """事件驱动预警检查服务类"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.enabled = settings.ALERT_EVENT_DRIVEN
+        self.debounce = settings.ALERT_EVENT_DEBOUNCE
+        self.reconcile_interval = settings.MONITOR_REGISTRY_RECONCILE
+        self.poll_interval = settings.ALERT_POLL_INTERVAL
+        self._table: Optional[MonitorTable] = None
+        self._index: Optional[ThresholdIndex] = None
+        self._table_version = -1
+        self._synced_at = 0.0
+        self._latest: Dict[str, Dict[str, Any]] = {}     # 股票代码 -> 最新行情
+        self._quote_time: Dict[str, float] = {}          # 股票代码 -> 最新行情的时间
+        self._dirty: Dict[str, float] = {}               # 待检查股票 -> 最早一条未处理行情的到达时间
+        self._active: Set[str] = set()                   # 有 triggered/cooldown 监测的股票（需要检查是否解除）
+        self._snapshot_dirty = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._registered = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        """开始监听行情（主进程当选时调用）"""
+        if not self.enabled or self._task is not None:
+            return
+        if not self._registered:
+            data_fetcher.add_quote_listener(self.on_quote)
+            market_cache.add_snapshot_listener(self.on_snapshot)
+            self._registered = True
+        self._wakeup = asyncio.Event()
+        await self.reload()
+        self._task = asyncio.create_task(self._run())
+        if self.poll_interval > 0:
+            self._poll_task = asyncio.create_task(self._poll())
+        logger.info("事件驱动预警检查已启动")
+
+    async def stop(self) -> None:
+        """停止监听（主进程卸任时调用）"""
+        if self._task is None:
+            return
+        tasks = [task for task in (self._task, self._poll_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._poll_task = None
+        self._table = None
+        self._index = None
+        self._table_version = -1
+        self._dirty.clear()
+
+    async def reload(self) -> None:
+        """从注册表获取活跃监测，有变化时重建阈值索引"""
+        from app.services.alert_state import alert_state
+        try:
+            async with AsyncSessionLocal() as db:
+                table = await monitor_registry.get_table(db)
+                if monitor_registry.version == self._table_version:
+                    return
+                states, _, _ = await alert_state.load(db, table)
+        except Exception as e:
+            logger.error(f"加载活跃监测失败: {str(e)}")
+            return
+        self._table = table
+        self._index = ThresholdIndex(table)
+        self._table_version = monitor_registry.version
+        active_rows = np.flatnonzero((states != 0).any(axis=1))
+        self._active = {table.codes[i] for i in np.unique(table.stock_pos[active_rows]).tolist()}
+        metrics.set_gauge("alert_watcher_monitors", len(table))
+        # 索引重建后上一次价格丢失，已有行情的股票全部重新检查一次（状态机保证不会重复通知）
+        now = time.monotonic()
+        for code in table.codes:
+            if code in self._latest:
+                self._mark(code, now)
+
+    # ==================== 行情监听（同步、O(log n)） ====================
+
+    def on_quote(self, stock_code: str, quote: Dict[str, Any]) -> None:
+        """单只股票的新行情"""
+        if self._index is None:
+            return
+        self._accept(stock_code, quote, time.monotonic())
+
+    def on_snapshot(self) -> None:
+        """全市场快照更新，在后台任务中批量读取监测股票的价格"""
+        if self._index is None:
+            return
+        self._snapshot_dirty = True
+        self._wakeup.set()
+
+    def _accept(self, stock_code: str, quote: Dict[str, Any], received_at: float) -> None:
+        self._latest[stock_code] = quote
+        self._quote_time[stock_code] = time.time()
+        if alert_engine.on_quote(self._index, stock_code, quote) or stock_code in self._active:
+            self._mark(stock_code, received_at)
+
+    def _mark(self, stock_code: str, received_at: float) -> None:
+        self._dirty.setdefault(stock_code, received_at)
+        self._wakeup.set()
+
+    def _scan_snapshot(self) -> None:
+        """用全市场快照中比已有行情更新的价格更新阈值索引"""
+        self._snapshot_dirty = False
+        published = market_cache.snapshot_time
+        if published is None:
+            return
+        published_ts = published.timestamp()
+        codes = self._table.codes
+        prices = market_cache.get_field_column(codes, 'price')
+        pre_closes = market_cache.get_field_column(codes, 'pre_close')
+        changes = market_cache.get_field_column(codes, 'change_percent')
+        now = time.monotonic()
+        for code, price, pre_close, change in zip(codes, prices.tolist(), pre_closes.tolist(), changes.tolist()):
+            if not price > 0 or self._quote_time.get(code, 0) >= published_ts:
+                continue  # 没有价格，或单只行情比快照更新
+            self._accept(code, {"price": price, "pre_close": pre_close, "change_percent": change}, now)
+            self._quote_time[code] = published_ts
+
+    # ==================== 行情轮询 ====================
+
+    async def _poll(self) -> None:
+        """推送行情未连接时定时批量拉取监测股票行情，新行情经行情监听进入 on_quote"""
+        from app.services.quote_stream import quote_stream
+        while True:
+            try:
+                await asyncio.sleep(self.poll_interval)
+                if quote_stream.connected or self._table is None or not self._table.codes:
+                    continue
+                if not market_cache.is_trading_time():
+                    continue
+                # 轮询间隔可能短于监测缓存TTL，只接受本轮间隔内的缓存，保证按轮询间隔刷新
+                await data_fetcher.get_batch_quotes_for_monitor(self._table.codes, max_age=self.poll_interval)
+                metrics.inc("alert_watcher_polls_total")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"轮询监测行情失败: {str(e)}")
+
+    # ==================== 后台检查 ====================
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.reconcile_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await asyncio.sleep(self.debounce)  # 合并短时间内的多次更新
+
+                await self.reload()  # 注册表未变化且未到校验时间时不访问数据库
+                if time.monotonic() - self._synced_at >= self.reconcile_interval:
+                    self._synced_at = time.monotonic()
+                    market_cache.sync()  # 其他进程发布了新快照时触发快照监听
+                if self._snapshot_dirty and self._table is not None:
+                    self._scan_snapshot()
+                if self._dirty:
+                    dirty, self._dirty = self._dirty, {}
+                    await self._check(dirty)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"事件驱动预警检查失败: {str(e)}")
+
+    async def _check(self, dirty: Dict[str, float]) -> None:
+        """检查待检查股票上的全部监测"""
+        from app.services.monitor_service import notify_alerts
+
+        table = self._table
+        rows = table.rows_for(dirty)
+        if not len(rows):
+            return
+        sub = table.subset(rows)
+        quotes = {code: self._latest[code] for code in sub.codes if code in self._latest}
+        result = alert_engine.evaluate(sub, quotes)
+
+        async with AsyncSessionLocal() as db:
+            notified, active = await notify_alerts(db, result, quotes, subset=True)
+
+        now = time.monotonic()
+        for row in notified:
+            code = sub.codes[sub.stock_pos[row]]
+            metrics.observe("alert_latency_seconds", now - dirty[code], source="event")
+
+        active_codes = {sub.codes[i] for i in np.unique(sub.stock_pos[np.flatnonzero(active.any(axis=1))]).tolist()}
+        self._active = (self._active - set(sub.codes)) | active_codes
+        metrics.inc("alert_watcher_checks_total")
+        metrics.observe("alert_watcher_batch_stocks", len(sub.codes))
+
+    def get_status(self) -> Dict[str, Any]:
+        """事件驱动检查状态"""
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "polling": self._poll_task is not None,
+            "monitors": len(self._table) if self._table is not None else 0,
+            "pending_stocks": len(self._dirty),
+            "active_stocks": len(self._active),
+            "registry": monitor_registry.get_stats(),
+        }
+
+
+# 全局单例
+alert_watcher = AlertWatcher()
@@ -3,11 +3,18 @@
 统一管理多个数据源，提供数据获取的统一接口
 """
 import asyncio
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from app.services.stock_api import stock_api_service
 from app.services.akshare_api import akshare_service
+from app.services.kline_store import (
+    kline_store, normalize_adjust, KlineSeries, AdjustFactors, ADJUST_NONE
+)
+from app.config import get_settings
+from app.core.http_client import http_client
 from app.core.logging import get_logger
+from app.utils.cache import KNOWN_EMPTY, UpstreamError
+from app.utils.singleflight import SingleFlight
 
 logger = get_logger(__name__)
 
@@ -21,13 +28,17 @@ class DataFetcher:
         self.cache = {}
         self.cache_ttl = 60  # 通用缓存60秒
         self.monitor_cache_ttl = 10  # 监测行情缓存10秒（更实时）
+        self.negative_cache_ttl = get_settings().CACHE_TTL_NEGATIVE  # 所有数据源都查不到的股票
+        self._flight = SingleFlight("data_fetcher")  # 合并相同的并发上游请求
+        self._quote_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
     
     def _is_cache_valid(self, key: str) -> bool:
         """检查缓存是否有效"""
         if key not in self.cache:
             return False
-        cache_time, _ = self.cache[key]
-        return (datetime.now() - cache_time).total_seconds() < self.cache_ttl
+        cache_time, data = self.cache[key]
+        ttl = self.negative_cache_ttl if data is KNOWN_EMPTY else self.cache_ttl
+        return (datetime.now() - cache_time).total_seconds() < ttl
     
     def _get_cache(self, key: str) -> Optional[Any]:
         """获取缓存数据"""
@@ -40,6 +51,31 @@ class DataFetcher:
         """设置缓存数据"""
         self.cache[key] = (datetime.now(), data)
     
+    def _get_monitor_cache(self, stock_code: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """
+        获取监测行情缓存
+        
+        Args:
+            stock_code: 股票代码
+            max_age: 可接受的行情最大延迟（秒），比监测缓存TTL短时以它为准（不影响负缓存）
+        
+        Returns:
+            行情数据；已确认无数据时返回 KNOWN_EMPTY；未命中返回 None
+        """
+        cached = self.cache.get(f"monitor_quote_{stock_code}")
+        if not cached:
+            return None
+        cache_time, data = cached
+        if data is KNOWN_EMPTY:
+            ttl = self.negative_cache_ttl
+        elif max_age is not None:
+            ttl = min(self.monitor_cache_ttl, max_age)
+        else:
+            ttl = self.monitor_cache_ttl
+        if (datetime.now() - cache_time).total_seconds() < ttl:
+            return data
+        return None
+    
     async def get_realtime_quote(self, stock_code: str) -> Optional[Dict[str, Any]]:
         """
         获取实时行情 - 优先使用市场缓存
@@ -62,91 +98,229 @@ class DataFetcher:
         # 2. 检查本地缓存
         cache_key = f"quote_{stock_code}"
         cached_data = self._get_cache(cache_key)
+        if cached_data is KNOWN_EMPTY:
+            return None
         if cached_data:
             return cached_data
         
+        return await self._flight.do(("quote", stock_code), self._fetch_realtime_quote, stock_code)
+    
+    async def _fetch_realtime_quote(self, stock_code: str) -> Optional[Dict[str, Any]]:
+        """从上游获取实时行情（主数据源失败时使用备用数据源）"""
+        cache_key = f"quote_{stock_code}"
         try:
+            errors: List[str] = []
             # 3. 主数据源
-            quote = await self.primary_source.get_realtime_quote(stock_code)
+            quote = await self._try_source(self.primary_source.get_realtime_quote, stock_code, errors)
             if quote:
                 self._set_cache(cache_key, quote)
+                self._notify_quote(stock_code, quote)
                 return quote
             
             # 4. 备用数据源
             logger.info(f"主数据源失败，使用备用数据源: {stock_code}")
-            quote = await self.backup_source.get_realtime_quote(stock_code)
+            quote = await self._try_source(self.backup_source.get_realtime_quote, stock_code, errors)
             if quote:
                 self._set_cache(cache_key, quote)
+                self._notify_quote(stock_code, quote)
                 return quote
             
+            if errors:
+                logger.warning(f"数据源请求失败，不缓存为无数据: {stock_code}, 错误: {errors}")
+                return None
             logger.warning(f"所有数据源都无法获取行情: {stock_code}")
+            self._set_cache(cache_key, KNOWN_EMPTY)
             return None
             
         except Exception as e:
             logger.error(f"获取实时行情异常: {stock_code}, 错误: {str(e)}")
             return None
     
-    async def get_realtime_quote_for_monitor(self, stock_code: str) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    async def _try_source(fetch: Callable, stock_code: str, errors: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        请求一个数据源
+        
+        请求失败时记录到 errors 并返回 None，调用方据此区分"确认无数据"和"请求失败"，
+        只有所有数据源都正常返回且都没有数据时才写入负缓存
+        """
+        try:
+            return await fetch(stock_code)
+        except UpstreamError as e:
+            errors.append(str(e))
+            return None
+    
+    async def get_realtime_quote_for_monitor(
+        self, stock_code: str, max_age: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
         """
         获取监测个股的实时行情 - 优化版本
         
         数据获取优先级（按速度排序）：
-        1. 本地缓存（10秒TTL）
+        1. 本地缓存（10秒TTL；所有数据源都查不到的股票按负缓存TTL直接返回 None）
         2. 东方财富 API（异步 HTTP，最快）
         3. 新浪 API（东方财富内置备用）
         4. AkShare 个股接口（同步阻塞，较慢，最后备用）
         
         Args:
             stock_code: 股票代码
+            max_age: 可接受的行情最大延迟（秒），为空时使用监测缓存TTL
             
         Returns:
             实时行情数据
         """
         # 检查本地缓存
-        cache_key = f"monitor_quote_{stock_code}"
-        if cache_key in self.cache:
-            cache_time, data = self.cache[cache_key]
-            if (datetime.now() - cache_time).total_seconds() < self.monitor_cache_ttl:
-                return data
+        cached = self._get_monitor_cache(stock_code, max_age)
+        if cached is KNOWN_EMPTY:
+            return None
+        if cached is not None:
+            return cached
         
+        return await self._flight.do(("monitor_quote", stock_code), self._fetch_monitor_quote, stock_code)
+    
+    async def _fetch_monitor_quote(self, stock_code: str) -> Optional[Dict[str, Any]]:
+        """按降级链路从上游获取监测行情"""
+        cache_key = f"monitor_quote_{stock_code}"
         try:
+            errors: List[str] = []
             # 优先使用东方财富 API（异步 HTTP，速度快）
-            quote = await self.primary_source.get_realtime_quote(stock_code)
+            quote = await self._try_source(self.primary_source.get_realtime_quote, stock_code, errors)
             if quote and quote.get("price", 0) > 0:
-                self._set_cache(cache_key, quote)
+                self.put_monitor_quote(stock_code, quote)
                 return quote
             
             # 东方财富失败，尝试 AkShare 个股接口
             logger.info(f"东方财富API失败，尝试AkShare个股接口: {stock_code}")
-            quote = await self.backup_source.get_realtime_quote_individual(stock_code)
+            quote = await self._try_source(self.backup_source.get_realtime_quote_individual, stock_code, errors)
             if quote and quote.get("price", 0) > 0:
-                self._set_cache(cache_key, quote)
+                self.put_monitor_quote(stock_code, quote)
                 return quote
             
             # 最后尝试 AkShare 全市场接口
             logger.info(f"AkShare个股接口失败，尝试全市场接口: {stock_code}")
-            quote = await self.backup_source.get_realtime_quote(stock_code)
+            quote = await self._try_source(self.backup_source.get_realtime_quote, stock_code, errors)
             if quote:
-                self._set_cache(cache_key, quote)
+                self.put_monitor_quote(stock_code, quote)
                 return quote
             
+            if errors:
+                logger.warning(f"数据源请求失败，不缓存为无数据: {stock_code}, 错误: {errors}")
+                return None
             logger.warning(f"所有数据源都无法获取监测行情: {stock_code}")
+            self._set_cache(cache_key, KNOWN_EMPTY)
             return None
             
         except Exception as e:
             logger.error(f"获取监测行情异常: {stock_code}, 错误: {str(e)}")
             return None
     
+    async def get_batch_quotes_for_monitor(
+        self, stock_codes: List[str], max_age: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取监测个股的实时行情
+        
+        先查10秒监测缓存，剩余股票通过东方财富批量接口一次性获取，
+        批量接口仍未拿到有效价格的股票再走 get_realtime_quote_for_monitor 的逐只降级链路。
+        
+        Args:
+            stock_codes: 股票代码列表
+            max_age: 可接受的行情最大延迟（秒）。定时轮询的间隔比监测缓存TTL短时传入轮询间隔，
+                否则缓存会让轮询按缓存TTL而不是轮询间隔刷新
+            
+        Returns:
+            股票代码到行情数据的映射
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        missing_codes = []
+        
+        for code in dict.fromkeys(stock_codes):
+            cached = self._get_monitor_cache(code, max_age)
+            if cached is KNOWN_EMPTY:
+                continue
+            if cached is not None:
+                results[code] = cached
+            else:
+                missing_codes.append(code)
+        
+        if not missing_codes:
+            return results
+        
+        try:
+            quotes = await self._fetch_primary_batch(missing_codes)
+        except Exception as e:
+            logger.error(f"批量获取监测行情异常: {str(e)}")
+            quotes = {}
+        
+        failed_codes = []
+        for code in missing_codes:
+            quote = quotes.get(code)
+            if quote and quote.get("price", 0) > 0:
+                self.put_monitor_quote(code, quote)
+                results[code] = quote
+            else:
+                failed_codes.append(code)
+        
+        if failed_codes:
+            logger.info(f"批量接口未获取到有效行情，逐只降级: {failed_codes}")
+            semaphore = asyncio.Semaphore(10)
+            
+            async def fetch_one(code: str):
+                async with semaphore:
+                    quote = await self.get_realtime_quote_for_monitor(code, max_age)
+                    if quote:
+                        results[code] = quote
+            
+            await asyncio.gather(*[fetch_one(code) for code in failed_codes])
+        
+        return results
+    
+    async def _fetch_primary_batch(self, stock_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        主数据源批量行情
+        
+        与其他批量请求重叠的股票等待已在进行的请求，只有剩余股票发起新请求
+        """
+        quotes = await self._flight.do_many(
+            "primary_batch", stock_codes, self.primary_source.get_batch_quotes
+        )
+        return {code: quote for code, quote in quotes.items() if quote}
+    
+    def put_monitor_quote(self, stock_code: str, quote: Dict[str, Any]) -> None:
+        """写入监测行情缓存并通知行情监听者（推送行情收到更新时直接调用）"""
+        self._set_cache(f"monitor_quote_{stock_code}", quote)
+        self._notify_quote(stock_code, quote)
+    
+    def _notify_quote(self, stock_code: str, quote: Dict[str, Any]) -> None:
+        """通知行情监听者"""
+        for listener in self._quote_listeners:
+            try:
+                listener(stock_code, quote)
+            except Exception as e:
+                logger.error(f"行情监听处理失败: {stock_code}, 错误: {str(e)}")
+    
+    def add_quote_listener(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        """
+        注册行情监听者：每次从上游拿到新行情（监测行情、推送行情、单只实时行情）时同步调用 listener(stock_code, quote)
+        
+        监听者应当只做 O(1) 的内存更新，耗时操作自行放到任务中执行
+        """
+        self._quote_listeners.append(listener)
+    
     async def get_kline_data(
         self,
         stock_code: str,
         period: str = "daily",
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        limit: int = 100
+        limit: int = 100,
+        adjust: str = "qfq"
     ) -> List[Dict[str, Any]]:
         """
-        获取K线数据 - 多数据源容错
+        获取K线数据 - 多数据源容错，本地复权
+        
+        原始K线只下载一次并缓存在 kline_store 中，前复权/后复权/不复权
+        序列都由原始K线乘以复权因子得到，不同复权类型共享同一份缓存。
         
         Args:
             stock_code: 股票代码
@@ -154,71 +328,172 @@ class DataFetcher:
             start_date: 开始日期
             end_date: 结束日期
             limit: 数据条数
+            adjust: 复权类型 qfq/hfq/空字符串（不复权）
             
         Returns:
             K线数据列表
         """
-        cache_key = f"kline_{stock_code}_{period}_{start_date}_{end_date}_{limit}"
-        cached_data = self._get_cache(cache_key)
-        if cached_data:
-            return cached_data
+        adjust = normalize_adjust(adjust)
         
         try:
-            # 主数据源
-            klines = await self.primary_source.get_kline_data(
-                stock_code, period, start_date, end_date, limit
-            )
-            if klines:
-                self._set_cache(cache_key, klines)
-                return klines
-            
-            # 备用数据源 - 需要转换参数格式
-            logger.info(f"主数据源失败，使用备用数据源获取K线: {stock_code}")
-            
-            # 转换周期格式
-            period_map = {
-                "1min": "1", "5min": "5", "15min": "15",
-                "30min": "30", "60min": "60",
-                "daily": "daily", "weekly": "weekly", "monthly": "monthly"
-            }
-            ak_period = period_map.get(period, "daily")
-            
-            # 转换日期格式
-            ak_start = start_date.replace("-", "") if start_date else None
-            ak_end = end_date.replace("-", "") if end_date else None
-            
-            klines = await self.backup_source.get_kline_data(
-                stock_code, ak_period, ak_start, ak_end, limit=limit
-            )
-            if klines:
-                self._set_cache(cache_key, klines)
-                return klines
-            
-            logger.warning(f"所有数据源都无法获取K线数据: {stock_code}")
-            return []
+            series = kline_store.get_raw(stock_code, period, limit)
+            if series is None:
+                series = await self._fetch_kline(stock_code, period, limit, ADJUST_NONE)
+                if series is None:
+                    logger.warning(f"所有数据源都无法获取K线数据: {stock_code}")
+                    return []
+                kline_store.put_raw(stock_code, period, series)
+            
+            factors = None
+            if adjust != ADJUST_NONE:
+                factors = await self._get_adjust_factors(stock_code)
+                if factors is None:
+                    # 因子表不可用时退回到直接下载上游复权数据
+                    return await self._get_upstream_adjusted_kline(
+                        stock_code, period, start_date, end_date, limit, adjust
+                    )
+            
+            return kline_store.build(series, factors, adjust, start_date, end_date, limit)
             
         except Exception as e:
             logger.error(f"获取K线数据异常: {stock_code}, 错误: {str(e)}")
             return []
     
-    async def get_batch_quotes(self, stock_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+    async def get_adjusted_kline_series(
+        self,
+        stock_code: str,
+        period: str = "daily",
+        limit: int = 100,
+        adjust: str = "qfq"
+    ) -> Optional[KlineSeries]:
+        """
+        直接下载上游复权后的K线序列（不获取复权因子）
+        
+        全市场批量计算使用：每只股票只有一次东方财富K线请求，
+        不会为几千只股票逐只下载新浪复权因子
+        """
+        return await self._fetch_kline(stock_code, period, limit, normalize_adjust(adjust))
+    
+    async def _fetch_kline(
+        self,
+        stock_code: str,
+        period: str,
+        limit: int,
+        adjust: str
+    ) -> Optional[KlineSeries]:
+        """从上游下载最近 limit 条K线（相同的并发请求只下载一次）"""
+        return await self._flight.do(
+            ("kline", stock_code, period, limit, adjust),
+            self._download_kline, stock_code, period, limit, adjust
+        )
+    
+    async def _download_kline(
+        self,
+        stock_code: str,
+        period: str,
+        limit: int,
+        adjust: str
+    ) -> Optional[KlineSeries]:
+        """从上游下载最近 limit 条K线（主数据源失败时使用备用数据源）"""
+        series = await self.primary_source.get_kline_series(
+            stock_code, period, limit=limit, adjust=adjust
+        )
+        if series is not None and len(series):
+            return series
+        
+        # 备用数据源 - 需要转换参数格式
+        logger.info(f"主数据源失败，使用备用数据源获取K线: {stock_code}")
+        
+        # 转换周期格式
+        period_map = {
+            "1min": "1", "5min": "5", "15min": "15",
+            "30min": "30", "60min": "60",
+            "daily": "daily", "weekly": "weekly", "monthly": "monthly"
+        }
+        ak_period = period_map.get(period, "daily")
+        
+        klines = await self.backup_source.get_kline_data(
+            stock_code, ak_period, adjust=adjust, limit=limit
+        )
+        if not klines:
+            return None
+        return KlineSeries.from_records(klines, limit)
+    
+    async def _get_adjust_factors(self, stock_code: str) -> Optional[AdjustFactors]:
+        """获取复权因子表（优先使用本地缓存）"""
+        factors = kline_store.get_factors(stock_code)
+        if factors is not None:
+            return factors
+        
+        return await self._flight.do(("factors", stock_code), self._download_adjust_factors, stock_code)
+    
+    async def _download_adjust_factors(self, stock_code: str) -> Optional[AdjustFactors]:
+        records = await self.backup_source.get_adjust_factors(stock_code)
+        if records is None:
+            return None
+        return kline_store.put_factors(stock_code, records)
+    
+    async def _get_upstream_adjusted_kline(
+        self,
+        stock_code: str,
+        period: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        limit: int,
+        adjust: str
+    ) -> List[Dict[str, Any]]:
+        """直接下载上游复权后的K线（复权因子不可用时的降级路径）"""
+        cache_key = f"kline_{stock_code}_{period}_{start_date}_{end_date}_{adjust}_{limit}"
+        cached_data = self._get_cache(cache_key)
+        if cached_data:
+            return cached_data
+        
+        logger.info(f"复权因子不可用，直接获取上游复权K线: {stock_code}")
+        series = await self._fetch_kline(stock_code, period, limit, adjust)
+        if series is None:
+            return []
+        klines = series.to_records(start_date, end_date)
+        if klines:
+            self._set_cache(cache_key, klines)
+        return klines
+    
+    async def get_batch_quotes(
+        self, stock_codes: List[str], max_age: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
         """
         批量获取实时行情
         
+        数据获取优先级：
+        1. 全市场快照（按代码索引定位，不产生网络请求）
+        2. 本地缓存
+        3. 主数据源批量接口，仍失败的再逐只走主数据源 + 备用数据源的降级链路
+        
         Args:
             stock_codes: 股票代码列表
+            max_age: 可接受的行情最大延迟（秒）。快照比它旧时不使用快照；
+                为空时快照在缓存 TTL 内即可使用
             
         Returns:
             股票代码到行情数据的映射
         """
         try:
-            # 检查缓存
+            # 1. 优先从全市场快照获取
             results = {}
-            uncached_codes = []
+            try:
+                from app.services.market_cache import market_cache
+                results = market_cache.get_stocks_realtime(stock_codes, max_age=max_age)
+            except Exception as e:
+                logger.debug(f"市场缓存批量获取失败: {e}")
             
-            for code in stock_codes:
+            # 2. 检查本地缓存
+            uncached_codes = []
+            for code in dict.fromkeys(stock_codes):
+                if code in results:
+                    continue
                 cache_key = f"quote_{code}"
                 cached_data = self._get_cache(cache_key)
+                if cached_data is KNOWN_EMPTY:
+                    continue
                 if cached_data:
                     results[code] = cached_data
                 else:
@@ -228,7 +503,7 @@ class DataFetcher:
                 return results
             
             # 主数据源批量获取
-            quotes = await self.primary_source.get_batch_quotes(uncached_codes)
+            quotes = await self._fetch_primary_batch(uncached_codes)
             
             # 缓存成功获取的数据
             for code, quote in quotes.items():
@@ -236,24 +511,20 @@ class DataFetcher:
                 self._set_cache(cache_key, quote)
                 results[code] = quote
             
-            # 对于失败的股票，尝试备用数据源单独获取
+            # 对于失败的股票，逐只走主数据源 + 备用数据源的降级链路：
+            # 批量接口无法区分"没有数据"和"请求失败"，由逐只链路判断是否写入负缓存
             failed_codes = [code for code in uncached_codes if code not in quotes]
             if failed_codes:
-                logger.info(f"部分股票主数据源失败，使用备用数据源: {failed_codes}")
+                logger.info(f"部分股票主数据源失败，逐只降级: {failed_codes}")
                 
                 # 限制并发数，避免过多请求
                 semaphore = asyncio.Semaphore(5)
                 
                 async def fetch_one(code: str):
                     async with semaphore:
-                        try:
-                            quote = await self.backup_source.get_realtime_quote(code)
-                            if quote:
-                                cache_key = f"quote_{code}"
-                                self._set_cache(cache_key, quote)
-                                results[code] = quote
-                        except Exception as e:
-                            logger.warning(f"备用数据源获取失败: {code}, 错误: {str(e)}")
+                        quote = await self._flight.do(("quote", code), self._fetch_realtime_quote, code)
+                        if quote:
+                            results[code] = quote
                 
                 await asyncio.gather(*[fetch_one(code) for code in failed_codes])
             
@@ -274,6 +545,9 @@ class DataFetcher:
         Returns:
             匹配的股票列表
         """
+        return await self._flight.do(("search", keyword, limit), self._search_stock, keyword, limit)
+    
+    async def _search_stock(self, keyword: str, limit: int) -> List[Dict[str, str]]:
         try:
             # 主数据源搜索
             results = await self.primary_source.search_stock(keyword, limit)
@@ -305,6 +579,11 @@ class DataFetcher:
         if cached_data:
             return cached_data
         
+        return await self._flight.do(("fund_flow", stock_code, days), self._fetch_fund_flow, stock_code, days)
+    
+    async def _fetch_fund_flow(self, stock_code: str, days: int) -> List[Dict[str, Any]]:
+        """从上游获取资金流向"""
+        cache_key = f"fund_flow_{stock_code}_{days}"
         try:
             # 主数据源
             flow_data = await self.primary_source.get_fund_flow(stock_code, days)
@@ -379,9 +658,9 @@ class DataFetcher:
     async def close(self):
         """关闭数据获取服务"""
         try:
-            await self.primary_source.close()
+            await http_client.close()
         except Exception as e:
-            logger.error(f"关闭主数据源失败: {str(e)}")
+            logger.error(f"关闭HTTP客户端失败: {str(e)}")
 
 
 # 创建全局数据获取服务实例
@@ -0,0 +1,106 @@
+"""
+技术指标结果缓存
+热门股票会被很多用户同时查看，指标接口不再每次重新计算：
+- 缓存键：(股票代码, 周期, 复权类型, 指标组合)
+- 每条缓存记录计算时K线序列的版本（条数、首尾日期、首尾收盘价、最后成交量）
+- K线新增一根或盘中最后一根变化时版本不同，自动重新计算并覆盖旧结果
+按最近使用淘汰，容量由 INDICATOR_CACHE_SIZE 配置。
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+
+logger = get_logger(__name__)
+
+SeriesVersion = Tuple[Any, ...]
+
+
+def series_version(klines: List[Dict[str, Any]], date_field: str = "date") -> Optional[SeriesVersion]:
+    """
+    K线序列的版本标识（O(1)）
+
+    新增K线会改变条数和最后日期，盘中修正会改变最后收盘价/成交量，
+    复权因子变化会改变首根收盘价
+    """
+    if not klines:
+        return None
+    first, last = klines[0], klines[-1]
+    return (
+        len(klines),
+        str(first.get(date_field)), str(last.get(date_field)),
+        first.get("close"), last.get("close"), last.get("volume"),
+    )
+
+
+class IndicatorCache:
+    """技术指标结果缓存类"""
+
+    def __init__(self):
+        self.max_size = get_settings().INDICATOR_CACHE_SIZE
+        self._entries: "OrderedDict[Hashable, Tuple[SeriesVersion, Any]]" = OrderedDict()
+
+    def get(
+        self,
+        stock_code: str,
+        period: str,
+        adjust: str,
+        indicator: str,
+        klines: Any,
+        compute: Callable[[Any], Any],
+        date_field: str = "date",
+        version: Optional[SeriesVersion] = None,
+    ) -> Any:
+        """
+        获取指标结果，序列版本未变时直接返回缓存
+
+        Args:
+            stock_code: 股票代码
+            period: K线周期
+            adjust: 复权类型
+            indicator: 指标组合标识（含参数，如 "ma:5,10,20"）
+            klines: 当前K线序列（传给 compute）
+            compute: 计算函数，接收 klines 返回指标结果
+            date_field: K线时间字段名
+            version: 调用方已算好的序列版本（K线不是字典列表时使用）
+        """
+        if version is None:
+            version = series_version(klines, date_field)
+        key = (stock_code, period, adjust, indicator)
+        entry = self._entries.get(key)
+        if entry is not None and version is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            metrics.inc("indicator_cache_requests_total", result="hit")
+            return entry[1]
+
+        metrics.inc("indicator_cache_requests_total", result="miss")
+        result = compute(klines)
+        if version is not None:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, stock_code: Optional[str] = None) -> None:
+        """清除某只股票（或全部）的指标缓存"""
+        if stock_code is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == stock_code]:
+            del self._entries[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": metrics.get("indicator_cache_requests_total", result="hit"),
+            "misses": metrics.get("indicator_cache_requests_total", result="miss"),
+        }
+
+
+# 全局单例
+indicator_cache = IndicatorCache()
@@ -0,0 +1,245 @@
+"""
+K线存储与复权服务
+原始（不复权）K线每只股票每个周期只下载、缓存一份，另外为每只股票维护一张很小的复权因子表，
+前复权/后复权/不复权序列都在请求时通过向量化乘法计算得出。
+发生除权除息时只需要让因子表失效，而不必丢弃整段缓存的历史K线。
+"""
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime
+import numpy as np
+
+from app.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 复权类型
+ADJUST_NONE = ""      # 不复权
+ADJUST_QFQ = "qfq"    # 前复权
+ADJUST_HFQ = "hfq"    # 后复权
+
+# K线数值字段（与接口返回的字段保持一致）
+KLINE_FIELDS = (
+    "open", "close", "high", "low", "volume", "amount",
+    "amplitude", "change_percent", "change", "turnover_rate",
+)
+# 复权时需要乘以因子的价格类字段
+PRICE_FIELDS = ("open", "close", "high", "low", "change")
+# 整数字段
+INT_FIELDS = ("volume",)
+
+MINUTE_PERIODS = ("1min", "5min", "15min", "30min", "60min")
+
+
+def normalize_adjust(adjust: Optional[str]) -> str:
+    """统一复权参数：qfq/hfq 原样返回，其余（None、none、raw、空字符串）视为不复权"""
+    value = (adjust or "").strip().lower()
+    if value in (ADJUST_QFQ, ADJUST_HFQ):
+        return value
+    return ADJUST_NONE
+
+
+class KlineSeries:
+    """单只股票某一周期的原始K线（列式存储，按日期升序）"""
+
+    __slots__ = ("dates", "columns", "depth", "fetched_at")
+
+    def __init__(self, dates: np.ndarray, columns: Dict[str, np.ndarray], depth: int):
+        self.dates = dates
+        self.columns = columns
+        self.depth = depth  # 下载时请求的条数，决定能满足多大的 limit
+        self.fetched_at = datetime.now()
+
+    @classmethod
+    def from_records(cls, klines: List[Dict[str, Any]], depth: int) -> "KlineSeries":
+        """由K线字典列表构建列式序列"""
+        dates = np.array([str(k.get("date", "")) for k in klines])
+        columns = {}
+        for field in KLINE_FIELDS:
+            dtype = np.int64 if field in INT_FIELDS else np.float64
+            columns[field] = np.array([k.get(field, 0) or 0 for k in klines], dtype=dtype)
+        return cls(dates, columns, depth)
+
+    @classmethod
+    def from_arrays(cls, dates: np.ndarray, values: np.ndarray, depth: int) -> "KlineSeries":
+        """由日期列和二维数值矩阵（列顺序同 KLINE_FIELDS）构建列式序列"""
+        columns = {}
+        for i, field in enumerate(KLINE_FIELDS):
+            dtype = np.int64 if field in INT_FIELDS else np.float64
+            columns[field] = values[:, i].astype(dtype)
+        return cls(dates, columns, depth)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def window(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[int, int]:
+        """
+        计算切片区间：先取最近 limit 条，再按日期过滤（与上游接口的语义一致）
+
+        Returns:
+            (起始下标, 结束下标)
+        """
+        lo, hi = 0, len(self.dates)
+        if limit:
+            lo = max(0, hi - limit)
+        if start_date:
+            lo = max(lo, int(np.searchsorted(self.dates, start_date, side="left")))
+        if end_date:
+            # 分钟K线日期带时间，结束日期需要包含当天所有分钟
+            bound = end_date if len(end_date) > 10 else f"{end_date} 99"
+            hi = min(hi, int(np.searchsorted(self.dates, bound, side="right")))
+        return lo, max(lo, hi)
+
+    def to_records(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """按区间转换为K线字典列表（不复权）"""
+        lo, hi = self.window(start_date, end_date, limit)
+        return _to_records(self.dates[lo:hi], {field: col[lo:hi] for field, col in self.columns.items()})
+
+
+def _to_records(dates: np.ndarray, columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """列式数据转换为接口返回的K线字典列表"""
+    names = ("date",) + KLINE_FIELDS
+    values = [dates.tolist()] + [columns[field].tolist() for field in KLINE_FIELDS]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+class AdjustFactors:
+    """
+    单只股票的后复权因子表
+
+    因子为阶梯函数：某根K线使用日期不晚于它的最近一条因子记录。
+    后复权价 = 原始价 × 后复权因子；前复权价 = 原始价 × 后复权因子 / 最新后复权因子。
+    """
+
+    __slots__ = ("dates", "factors", "fetched_at")
+
+    def __init__(self, dates: np.ndarray, factors: np.ndarray):
+        order = np.argsort(dates, kind="stable")
+        self.dates = dates[order]
+        self.factors = factors[order]
+        self.fetched_at = datetime.now()
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "AdjustFactors":
+        dates = np.array([str(r["date"])[:10] for r in records])
+        factors = np.array([float(r["factor"]) for r in records], dtype=np.float64)
+        return cls(dates, factors)
+
+    @property
+    def latest(self) -> float:
+        return float(self.factors[-1]) if len(self.factors) else 1.0
+
+    def lookup(self, bar_dates: np.ndarray) -> np.ndarray:
+        """按K线日期查找对应的后复权因子（向量化二分查找）"""
+        if not len(self.factors):
+            return np.ones(len(bar_dates), dtype=np.float64)
+        day_keys = bar_dates.astype("<U10")  # 分钟K线只取日期部分
+        idx = np.searchsorted(self.dates, day_keys, side="right") - 1
+        # 早于第一条因子记录的K线视为因子 1
+        result = self.factors[np.clip(idx, 0, None)]
+        return np.where(idx >= 0, result, 1.0)
+
+
+class KlineStore:
+    """原始K线与复权因子的内存存储"""
+
+    def __init__(self):
+        settings = get_settings()
+        self._series: Dict[Tuple[str, str], KlineSeries] = {}
+        self._factors: Dict[str, AdjustFactors] = {}
+        self._series_ttl = settings.CACHE_TTL_KLINE
+        self._minute_series_ttl = settings.CACHE_TTL_KLINE_MINUTE
+        self._factor_ttl = settings.CACHE_TTL_ADJUST_FACTOR
+
+    # ==================== 原始K线 ====================
+
+    def get_raw(self, stock_code: str, period: str, limit: int) -> Optional[KlineSeries]:
+        """获取未过期且条数足够的原始K线"""
+        series = self._series.get((stock_code, period))
+        if series is None or series.depth < limit:
+            return None
+        ttl = self._minute_series_ttl if period in MINUTE_PERIODS else self._series_ttl
+        if (datetime.now() - series.fetched_at).total_seconds() >= ttl:
+            return None
+        return series
+
+    def put_raw(self, stock_code: str, period: str, series: KlineSeries) -> KlineSeries:
+        """保存原始K线（按日期升序）"""
+        self._series[(stock_code, period)] = series
+        return series
+
+    # ==================== 复权因子 ====================
+
+    def get_factors(self, stock_code: str) -> Optional[AdjustFactors]:
+        """获取未过期的复权因子表"""
+        factors = self._factors.get(stock_code)
+        if factors is None:
+            return None
+        if (datetime.now() - factors.fetched_at).total_seconds() >= self._factor_ttl:
+            return None
+        return factors
+
+    def put_factors(self, stock_code: str, records: List[Dict[str, Any]]) -> AdjustFactors:
+        """保存复权因子表，records 为 [{"date": "YYYY-MM-DD", "factor": float}, ...]"""
+        factors = AdjustFactors.from_records(records)
+        self._factors[stock_code] = factors
+        return factors
+
+    def invalidate_factors(self, stock_code: Optional[str] = None) -> None:
+        """除权除息后让因子表失效（不影响已缓存的原始K线）"""
+        if stock_code is None:
+            self._factors.clear()
+        else:
+            self._factors.pop(stock_code, None)
+
+    # ==================== 复权计算 ====================
+
+    def build(
+        self,
+        series: KlineSeries,
+        factors: Optional[AdjustFactors],
+        adjust: str = ADJUST_NONE,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        由原始K线生成指定复权类型的K线列表
+
+        Args:
+            series: 原始K线
+            factors: 复权因子表（不复权时可为 None）
+            adjust: 复权类型
+            start_date: 开始日期
+            end_date: 结束日期
+            limit: 返回数据条数
+
+        Returns:
+            K线数据列表
+        """
+        lo, hi = series.window(start_date, end_date, limit)
+        dates = series.dates[lo:hi]
+        columns = {field: col[lo:hi] for field, col in series.columns.items()}
+
+        if adjust != ADJUST_NONE and factors is not None and len(dates):
+            multiplier = factors.lookup(dates)
+            if adjust == ADJUST_QFQ:
+                multiplier = multiplier / factors.latest
+            for field in PRICE_FIELDS:
+                columns[field] = np.round(columns[field] * multiplier, 2)
+
+        return _to_records(dates, columns)
+
+
+# 全局单例
+kline_store = KlineStore()
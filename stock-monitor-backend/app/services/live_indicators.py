@@ -0,0 +1,105 @@
+"""
+实时指标服务
+为被查看过的股票保存日K指标的增量状态（IndicatorSet），行情更新时 O(1) 刷新当日这根K线的指标，
+最新指标值直接从内存读取，不再每次用 250 根K线重新计算。
+状态每个自然日用历史K线重新初始化一次（吸收收盘数据修正和除权除息带来的前复权价格变化）。
+行情来源：监测/推送行情和单只实时行情（data_fetcher 行情监听），以及读取时比上次更新更新的全市场快照价格
+（没有人监测的股票也能随快照刷新）。
+"""
+import time
+from datetime import date, datetime, time as dt_time
+from typing import Dict, Any, Optional, Tuple
+
+from app.core.logging import get_logger
+from app.services.data_fetcher import data_fetcher
+from app.utils.singleflight import SingleFlight
+from app.utils.streaming_indicators import IndicatorSet
+
+logger = get_logger(__name__)
+
+# 初始化使用的历史K线数量（与指标接口一致）
+_SEED_BARS = 250
+# 快照在开盘后发布才包含当日价格
+_MARKET_OPEN = dt_time(9, 30)
+
+
+class LiveIndicatorService:
+    """实时指标服务类"""
+
+    def __init__(self):
+        self._states: Dict[str, Tuple[date, IndicatorSet]] = {}  # 股票代码 -> (初始化日期, 指标状态)
+        self._updated: Dict[str, float] = {}                     # 股票代码 -> 最近一次计入行情的时间戳
+        self._flight = SingleFlight("live_indicators")
+        data_fetcher.add_quote_listener(self.on_quote)
+
+    async def get(self, stock_code: str) -> Optional[Dict[str, Any]]:
+        """
+        获取最新日K指标值（首次访问或跨日时用历史K线初始化）
+
+        Returns:
+            最新指标值，无法获取K线时返回 None
+        """
+        state = self._states.get(stock_code)
+        if state is None or state[0] != date.today():
+            indicators = await self._flight.do(stock_code, self._seed, stock_code)
+            if indicators is None:
+                return None
+        else:
+            indicators = state[1]
+        self._apply_snapshot(stock_code, indicators)
+        return indicators.snapshot()
+
+    def _apply_snapshot(self, stock_code: str, indicators: IndicatorSet) -> None:
+        """全市场快照比最近一次行情更新时，用快照价格刷新当日K线"""
+        from app.services.market_cache import market_cache
+
+        price, volume = (
+            float(market_cache.get_field_column([stock_code], field)[0]) for field in ("price", "volume")
+        )
+        published = market_cache.snapshot_time
+        if published is None or not price > 0 or not volume > 0:
+            return  # 没有快照、不在快照中或当日停牌
+        if published.date() != date.today() or published.time() < _MARKET_OPEN:
+            return  # 快照不是当日开盘后的数据
+        published_ts = published.timestamp()
+        if self._updated.get(stock_code, 0) >= published_ts:
+            return
+        indicators.on_bar(published.strftime("%Y-%m-%d"), price)
+        self._updated[stock_code] = published_ts
+
+    async def _seed(self, stock_code: str) -> Optional[IndicatorSet]:
+        klines = await data_fetcher.get_kline_data(stock_code, "daily", limit=_SEED_BARS)
+        if not klines:
+            return None
+        indicators = IndicatorSet().seed(klines)
+        self._states[stock_code] = (date.today(), indicators)
+        self._updated.pop(stock_code, None)
+        return indicators
+
+    def on_quote(self, stock_code: str, quote: Dict[str, Any]) -> None:
+        """行情监听：只更新已初始化的股票，交易时间外的行情不计入K线"""
+        state = self._states.get(stock_code)
+        if state is None:
+            return
+        price = quote.get("price") or 0
+        if price <= 0:
+            return
+
+        from app.services.market_cache import market_cache
+        if not market_cache.is_trading_time():
+            return
+        state[1].on_bar(datetime.now().strftime("%Y-%m-%d"), float(price))
+        self._updated[stock_code] = time.time()
+
+    def clear(self, stock_code: Optional[str] = None) -> None:
+        """清除指标状态"""
+        if stock_code is None:
+            self._states.clear()
+            self._updated.clear()
+        else:
+            self._states.pop(stock_code, None)
+            self._updated.pop(stock_code, None)
+
+
+# 全局单例
+live_indicators = LiveIndicatorService()
@@ -5,8 +5,9 @@
 """
 import asyncio
 from datetime import datetime, time, timedelta
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Callable
 import akshare as ak
+import numpy as np
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,6 +15,7 @@ from sqlalchemy import text
 import json
 
 from app.core.logging import get_logger
+from app.core.shared_snapshot import SharedSnapshot, SNAPSHOT_DTYPE, SNAPSHOT_FIELDS
 from app.config import get_settings
 
 logger = get_logger(__name__)
@@ -21,13 +23,39 @@ logger = get_logger(__name__)
 # 线程池用于执行同步的 AkShare 调用
 executor = ThreadPoolExecutor(max_workers=2)
 
+# 快照字段与 AkShare 全市场行情列名的对应关系
+_SNAPSHOT_COLUMNS = {
+    'price': '最新价',
+    'change': '涨跌额',
+    'change_percent': '涨跌幅',
+    'open': '今开',
+    'high': '最高',
+    'low': '最低',
+    'pre_close': '昨收',
+    'volume': '成交量',
+    'amount': '成交额',
+    'amplitude': '振幅',
+    'turnover_rate': '换手率',
+    'pe_ratio': '市盈率-动态',
+    'pb_ratio': '市净率',
+    'total_value': '总市值',
+    'circulating_value': '流通市值',
+    'volume_ratio': '量比',
+    'rise_speed': '涨速',
+    'change_5min': '5分钟涨跌',
+    'change_60day': '60日涨跌幅',
+    'change_ytd': '年初至今涨跌幅',
+}
+
 
 class MarketCacheService:
     """市场数据缓存服务"""
     
     def __init__(self):
-        # 内存缓存
-        self._realtime_cache: Dict[str, Any] = {}
+        # 全市场行情快照（SNAPSHOT_DTYPE 结构化数组，多进程时为共享内存的只读视图）
+        self._snapshot: Optional[np.ndarray] = None
+        self._snapshot_version = 0
+        self._index: Dict[str, int] = {}  # 股票代码 -> 快照行号
         self._cache_time: Optional[datetime] = None
         
         # 从配置获取缓存时间
@@ -35,9 +63,16 @@ class MarketCacheService:
         self._cache_ttl_trading = settings.CACHE_TTL_MARKET_TRADING  # 交易时间缓存（默认5分钟）
         self._cache_ttl_non_trading = settings.CACHE_TTL_MARKET_NON_TRADING  # 非交易时间缓存（默认2小时）
         
-        # 全市场数据缓存
-        self._market_data: Optional[pd.DataFrame] = None
-        self._market_data_time: Optional[datetime] = None
+        # 多进程共享快照：一个进程下载并发布，其余 worker 只读映射
+        self._shared: Optional[SharedSnapshot] = None
+        if settings.MARKET_SNAPSHOT_SHARED:
+            shared = SharedSnapshot(settings.MARKET_SNAPSHOT_NAME, settings.MARKET_SNAPSHOT_CAPACITY)
+            if shared.available:
+                self._shared = shared
+            else:
+                logger.info("当前平台不支持共享内存，全市场快照使用进程内缓存")
+        self._min_refresh_interval = settings.MARKET_SNAPSHOT_MIN_INTERVAL
+        self._snapshot_listeners: List[Callable[[], None]] = []
         
         # 板块数据缓存
         self._sectors_cache: Dict[str, Any] = {}
@@ -80,126 +115,237 @@ class MarketCacheService:
         - 开盘前 9:00
         - 盘中每 5 分钟（如果需要实时数据）
         - 收盘后 15:30
+        
+        启用共享快照时，同一时间只有一个进程下载；其他进程等待其完成，
+        发现快照刚刚发布过就直接使用，不再重复下载。
         """
+        if self._shared is None:
+            return await self._download_and_publish()
+        
+        # 等待其他进程的刷新完成
+        for _ in range(120):
+            if self._shared.try_lock():
+                break
+            await asyncio.sleep(0.5)
+        else:
+            logger.warning("等待全市场数据刷新锁超时，使用现有快照")
+            return self._sync_snapshot()
+        
+        try:
+            if self._sync_snapshot() and self._cache_time and \
+                    (datetime.now() - self._cache_time).total_seconds() < self._min_refresh_interval:
+                logger.info(f"全市场快照刚由其他进程刷新（版本 {self._snapshot_version}），跳过下载")
+                return True
+            return await self._download_and_publish()
+        finally:
+            self._shared.unlock()
+    
+    async def _download_and_publish(self) -> bool:
+        """下载全市场数据，清洗后写入快照"""
         try:
             logger.info("开始刷新全市场数据...")
             start_time = datetime.now()
             
             # 获取全市场实时数据
             raw_data = await self._run_in_executor(ak.stock_zh_a_spot_em)
-            self._market_data_time = datetime.now()
             
-            # 更新内存缓存
             if raw_data is not None and not raw_data.empty:
-                self._realtime_cache = {}
-                
-                # 数据清洗：将 '-' 和 NaN 替换为 0
-                df = raw_data.copy()
-                numeric_columns = ['最新价', '涨跌额', '涨跌幅', '今开', '最高', '最低', '昨收', 
-                                   '成交量', '成交额', '振幅', '换手率', '市盈率-动态', '市净率',
-                                   '总市值', '流通市值', '量比', '涨速', '5分钟涨跌', '60日涨跌幅', '年初至今涨跌幅']
-                
-                for col in numeric_columns:
-                    if col in df.columns:
-                        # 将 '-' 替换为 NaN，然后填充为 0
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-                
-                # 非交易时间处理：如果最新价为0但昨收有值，使用昨收作为最新价
-                mask = (df['最新价'] == 0) & (df['昨收'] > 0)
-                df.loc[mask, '最新价'] = df.loc[mask, '昨收']
-                df.loc[mask, '涨跌幅'] = 0  # 非交易时间涨跌幅为0
-                df.loc[mask, '涨跌额'] = 0
-                
-                # 保存清洗后的数据
-                self._market_data = df
-                
-                for _, row in df.iterrows():
-                    code = row['代码']
-                    self._realtime_cache[code] = {
-                        'code': code,
-                        'name': row['名称'],
-                        'price': float(row.get('最新价', 0) or 0),
-                        'change': float(row.get('涨跌额', 0) or 0),
-                        'change_percent': float(row.get('涨跌幅', 0) or 0),
-                        'open': float(row.get('今开', 0) or 0),
-                        'high': float(row.get('最高', 0) or 0),
-                        'low': float(row.get('最低', 0) or 0),
-                        'pre_close': float(row.get('昨收', 0) or 0),
-                        'volume': int(row.get('成交量', 0) or 0),
-                        'amount': float(row.get('成交额', 0) or 0),
-                        'amplitude': float(row.get('振幅', 0) or 0),
-                        'turnover_rate': float(row.get('换手率', 0) or 0),
-                        'pe_ratio': float(row.get('市盈率-动态', 0) or 0),
-                        'pb_ratio': float(row.get('市净率', 0) or 0),
-                        'total_value': float(row.get('总市值', 0) or 0),
-                        'circulating_value': float(row.get('流通市值', 0) or 0),
-                        'volume_ratio': float(row.get('量比', 0) or 0),
-                        'rise_speed': float(row.get('涨速', 0) or 0),
-                        'change_5min': float(row.get('5分钟涨跌', 0) or 0),
-                        'change_60day': float(row.get('60日涨跌幅', 0) or 0),
-                        'change_ytd': float(row.get('年初至今涨跌幅', 0) or 0),
-                    }
-                self._cache_time = datetime.now()
+                rows = self._build_snapshot(raw_data)
+                if self._shared is not None:
+                    version = self._shared.publish(rows)
+                    self._sync_snapshot()
+                    logger.info(f"全市场快照已发布到共享内存，版本 {version}")
+                else:
+                    self._set_snapshot(rows, self._snapshot_version + 1, datetime.now())
             
             elapsed = (datetime.now() - start_time).total_seconds()
-            logger.info(f"全市场数据刷新完成，共 {len(self._realtime_cache)} 只股票，耗时 {elapsed:.2f} 秒")
+            logger.info(f"全市场数据刷新完成，共 {len(self._index)} 只股票，耗时 {elapsed:.2f} 秒")
             return True
             
         except Exception as e:
             logger.error(f"刷新全市场数据失败: {e}")
             return False
     
+    @staticmethod
+    def _build_snapshot(raw_data: pd.DataFrame) -> np.ndarray:
+        """AkShare 全市场行情转换为快照结构化数组"""
+        df = raw_data
+        rows = np.zeros(len(df), dtype=SNAPSHOT_DTYPE)
+        rows['code'] = df['代码'].astype(str).str.encode('ascii', errors='ignore').to_numpy()
+        rows['name'] = [str(name).encode('utf-8')[:32] for name in df['名称']]
+        
+        # 数据清洗：将 '-' 和 NaN 替换为 0
+        for field, column in _SNAPSHOT_COLUMNS.items():
+            if column in df.columns:
+                values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+                rows[field] = np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+        
+        # 非交易时间处理：如果最新价为0但昨收有值，使用昨收作为最新价
+        mask = (rows['price'] == 0) & (rows['pre_close'] > 0)
+        rows['price'][mask] = rows['pre_close'][mask]
+        rows['change_percent'][mask] = 0  # 非交易时间涨跌幅为0
+        rows['change'][mask] = 0
+        return rows
+    
+    def _set_snapshot(self, rows: np.ndarray, version: int, cache_time: datetime) -> None:
+        """切换到新快照，并重建代码索引"""
+        self._snapshot = rows
+        self._snapshot_version = version
+        self._index = {code.decode(): i for i, code in enumerate(rows['code'].tolist())}
+        self._cache_time = cache_time
+        for listener in self._snapshot_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"快照监听处理失败: {e}")
+    
+    def add_snapshot_listener(self, listener: Callable[[], None]) -> None:
+        """注册快照监听者：本进程切换到新版本快照时同步调用 listener()，监听者只应做 O(1) 的标记"""
+        self._snapshot_listeners.append(listener)
+    
+    @property
+    def snapshot_time(self) -> Optional[datetime]:
+        """当前快照的发布时间"""
+        return self._cache_time
+    
+    def sync(self) -> int:
+        """同步共享内存中的最新快照，返回当前快照版本"""
+        self._sync_snapshot()
+        return self._snapshot_version
+    
+    def _sync_snapshot(self) -> bool:
+        """共享内存中有新版本时切换到新版本（只读取头部，版本未变时开销很小）"""
+        if self._shared is None:
+            return self._snapshot is not None
+        try:
+            result = self._shared.read()
+        except Exception as e:
+            logger.debug(f"读取共享快照失败: {e}")
+            return self._snapshot is not None
+        if result is None:
+            return self._snapshot is not None
+        version, published_at, rows = result
+        if version != self._snapshot_version:
+            self._set_snapshot(rows, version, datetime.fromtimestamp(published_at))
+        return True
+    
+    def _row_to_quote(self, row: np.void) -> Dict[str, Any]:
+        """快照中的一行转换为行情字典"""
+        quote = {
+            'code': row['code'].decode(),
+            'name': row['name'].decode('utf-8', errors='ignore'),
+        }
+        for field in SNAPSHOT_FIELDS:
+            quote[field] = float(row[field])
+        quote['volume'] = int(quote['volume'])
+        return quote
+    
     def get_stock_realtime(self, stock_code: str) -> Optional[Dict[str, Any]]:
         """
         从缓存获取单只股票的实时数据
         如果缓存过期或不存在，返回 None
         """
-        if not self._realtime_cache:
+        self._sync_snapshot()
+        if self._snapshot is None:
             return None
         
         # 使用统一的缓存有效性检查
         if not self.is_cache_valid():
             return None
         
-        return self._realtime_cache.get(stock_code)
+        i = self._index.get(stock_code)
+        if i is None:
+            return None
+        return self._row_to_quote(self._snapshot[i])
     
-    def get_market_stats(self) -> Dict[str, Any]:
-        """获取市场统计数据"""
-        import numpy as np
+    def get_stocks_realtime(
+        self, stock_codes: List[str], max_age: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        从快照批量获取实时数据（按代码索引直接定位，不产生网络请求）
         
-        if self._market_data is None or self._market_data.empty:
+        Args:
+            stock_codes: 股票代码列表
+            max_age: 调用方可接受的快照最大年龄（秒），为空时按缓存 TTL 判断
+            
+        Returns:
+            股票代码到行情数据的映射；快照过期、代码不在快照中或没有有效价格的股票不返回
+        """
+        self._sync_snapshot()
+        if self._snapshot is None or self._cache_time is None:
             return {}
         
-        df = self._market_data.copy()
+        if max_age is None:
+            if not self.is_cache_valid():
+                return {}
+        elif (datetime.now() - self._cache_time).total_seconds() > max_age:
+            return {}
         
-        # 数据清洗
-        df['涨跌幅'] = pd.to_numeric(df['涨跌幅'], errors='coerce').fillna(0)
-        df['涨跌幅'] = df['涨跌幅'].replace([np.inf, -np.inf], 0)
-        df['最新价'] = pd.to_numeric(df['最新价'], errors='coerce').fillna(0)
+        rows = self._snapshot
+        results = {}
+        for code in stock_codes:
+            i = self._index.get(code)
+            if i is not None and rows[i]['price'] > 0:
+                results[code] = self._row_to_quote(rows[i])
+        return results
+    
+    def get_stock_codes(self) -> List[str]:
+        """快照中的全部股票代码（快照不存在时为空列表）"""
+        self._sync_snapshot()
+        return list(self._index)
+    
+    def get_field_column(self, stock_codes: List[str], field: str = 'price') -> np.ndarray:
+        """
+        按给定代码顺序取快照中的某个字段（向量化批量查询）
+        
+        Returns:
+            float64 数组，不在快照中的位置为 NaN
+        """
+        self._sync_snapshot()
+        values = np.full(len(stock_codes), np.nan)
+        if self._snapshot is None:
+            return values
+        rows = np.fromiter((self._index.get(code, -1) for code in stock_codes), dtype=np.int64, count=len(stock_codes))
+        found = rows >= 0
+        values[found] = self._snapshot[field][rows[found]]
+        return values
+    
+    def get_price_column(self, stock_codes: List[str]) -> np.ndarray:
+        """按给定代码顺序取快照最新价，没有有效价格的位置为 NaN"""
+        prices = self.get_field_column(stock_codes, 'price')
+        prices[prices <= 0] = np.nan
+        return prices
+    
+    def get_market_stats(self) -> Dict[str, Any]:
+        """获取市场统计数据"""
+        self._sync_snapshot()
+        if self._snapshot is None or not len(self._snapshot):
+            return {}
         
         # 过滤掉没有有效价格的股票
-        df = df[df['最新价'] > 0]
+        rows = self._snapshot
+        change_percent = rows['change_percent'][rows['price'] > 0]
         
-        if df.empty:
+        total = len(change_percent)
+        if total == 0:
             return {}
         
-        total = len(df)
-        up = len(df[df['涨跌幅'] > 0])
-        down = len(df[df['涨跌幅'] < 0])
+        up = int(np.count_nonzero(change_percent > 0))
+        down = int(np.count_nonzero(change_percent < 0))
         flat = total - up - down
         
         # 涨跌停统计（涨跌幅超过 9.5% 视为涨跌停）
-        limit_up = len(df[df['涨跌幅'] >= 9.5])
-        limit_down = len(df[df['涨跌幅'] <= -9.5])
+        limit_up = int(np.count_nonzero(change_percent >= 9.5))
+        limit_down = int(np.count_nonzero(change_percent <= -9.5))
         
         # 确保所有数值都是 Python 原生类型
         return {
             'total_stocks': int(total),
-            'up_stocks': int(up),
-            'down_stocks': int(down),
+            'up_stocks': up,
+            'down_stocks': down,
             'flat_stocks': int(flat),
-            'limit_up': int(limit_up),
-            'limit_down': int(limit_down),
+            'limit_up': limit_up,
+            'limit_down': limit_down,
             'up_ratio': float(round(up / total * 100, 2)) if total > 0 else 0.0,
             'down_ratio': float(round(down / total * 100, 2)) if total > 0 else 0.0,
             'cache_time': self._cache_time.isoformat() if self._cache_time else None
@@ -210,73 +356,59 @@ class MarketCacheService:
         获取排行榜数据
         by: amount(成交额), change(涨幅), turnover(换手率)
         """
-        import math
-        import numpy as np
-        
-        def clean_value(val):
-            """清理单个值中的 NaN 和 Inf"""
-            if isinstance(val, (float, np.floating)):
-                if math.isnan(val) or math.isinf(val):
-                    return 0
-                return float(val)
-            elif isinstance(val, np.integer):
-                return int(val)
-            return val
-        
-        def clean_record(record):
-            """清理记录中的所有值"""
-            return {k: clean_value(v) for k, v in record.items()}
-        
-        if self._market_data is None or self._market_data.empty:
+        self._sync_snapshot()
+        if self._snapshot is None or not len(self._snapshot):
             return []
         
-        df = self._market_data.copy()
-        
-        # 数据清洗
-        numeric_columns = ['成交额', '涨跌幅', '换手率', '成交量', '最新价', '总市值']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-                # 替换 inf 值
-                df[col] = df[col].replace([np.inf, -np.inf], 0)
-        
-        # 过滤掉没有有效价格的股票（价格为0或NaN的）
-        df = df[df['最新价'] > 0]
+        # 过滤掉没有有效价格的股票（价格为0的）
+        rows = self._snapshot
+        valid = np.flatnonzero(rows['price'] > 0)
         
-        if df.empty:
+        if not len(valid):
             return []
         
-        column_map = {
-            'amount': '成交额',
-            'change': '涨跌幅',
-            'turnover': '换手率',
-            'volume': '成交量'
+        field_map = {
+            'amount': 'amount',
+            'change': 'change_percent',
+            'turnover': 'turnover_rate',
+            'volume': 'volume'
         }
         
-        sort_column = column_map.get(by, '成交额')
+        sort_field = field_map.get(by, 'amount')
         ascending = False  # 默认降序
         
         if by == 'change_down':  # 跌幅榜
-            sort_column = '涨跌幅'
+            sort_field = 'change_percent'
             ascending = True
         
         # 非交易时间特殊处理：如果成交额全为0，按市值排序
         if not self.is_trading_time() and by == 'amount':
-            if df['成交额'].sum() == 0 and '总市值' in df.columns:
-                sort_column = '总市值'
+            if rows['amount'][valid].sum() == 0:
+                sort_field = 'total_value'
                 logger.info("非交易时间，成交额为0，改用市值排序")
         
         try:
-            sorted_df = df.nlargest(limit, sort_column) if not ascending else df.nsmallest(limit, sort_column)
-            records = sorted_df[['代码', '名称', '最新价', '涨跌幅', '成交额', '换手率']].to_dict('records')
-            # 清理每条记录中的 NaN 值
-            return [clean_record(r) for r in records]
+            values = rows[sort_field][valid]
+            order = np.argsort(values if ascending else -values, kind='stable')[:limit]
+            top = rows[valid[order]]
+            return [
+                {
+                    '代码': row['code'].decode(),
+                    '名称': row['name'].decode('utf-8', errors='ignore'),
+                    '最新价': float(row['price']),
+                    '涨跌幅': float(row['change_percent']),
+                    '成交额': float(row['amount']),
+                    '换手率': float(row['turnover_rate']),
+                }
+                for row in top
+            ]
         except Exception as e:
             logger.error(f"获取排行榜数据失败: {e}")
             return []
     
     def is_cache_valid(self) -> bool:
         """检查缓存是否有效"""
+        self._sync_snapshot()
         if not self._cache_time:
             return False
         
@@ -303,7 +435,9 @@ class MarketCacheService:
         
         return {
             'cache_time': self._cache_time.isoformat() if self._cache_time else None,
-            'stock_count': len(self._realtime_cache),
+            'stock_count': len(self._index),
+            'snapshot_version': self._snapshot_version,
+            'shared_snapshot': self._shared is not None,
             'is_valid': self.is_cache_valid(),
             'is_trading_time': is_trading,
             'cache_ttl': current_ttl,
@@ -0,0 +1,160 @@
+"""
+活跃监测注册表
+进程内保存全部活跃监测的阈值记录，预警检查直接使用打包好的阈值表，不再每轮查询数据库：
+- 首次使用时从数据库加载一次
+- 本进程内创建/修改/删除监测时同步更新（写穿）
+- 其他进程的修改通过定期校验发现：只查询活跃监测的聚合校验值（条数、id 之和、按 id 加权的阈值之和），
+  与本地记录算出的校验值不一致才重新加载。校验值由本地记录增量维护，本进程的写穿不会引起重新加载
+阈值表在记录变化后的第一次使用时重建，version 随之递增，调用方据此判断是否需要重建索引。
+"""
+import time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.models.monitor import Monitor
+from app.models.stock import Stock
+from app.services.alert_engine import MonitorRecord, MonitorTable
+
+logger = get_logger(__name__)
+
+# 校验值中四个阈值的权重（价格下限、价格上限、涨幅、跌幅），阈值互换也能发现
+_THRESHOLD_WEIGHTS = (1, 3, 7, 13)
+
+
+def _decimal(value: Any) -> Decimal:
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+def _contribution(record: MonitorRecord) -> Tuple[int, int, Decimal]:
+    """单条记录对校验值（条数、id 之和、加权阈值之和）的贡献"""
+    monitor_id = int(record[0])
+    weighted = sum((_decimal(v) * w for v, w in zip(record[4:], _THRESHOLD_WEIGHTS)), Decimal(0))
+    return 1, monitor_id, monitor_id * weighted
+
+
+class MonitorRegistry:
+    """活跃监测注册表类"""
+
+    def __init__(self):
+        self.reconcile_interval = get_settings().MONITOR_REGISTRY_RECONCILE
+        self._records: Optional[Dict[int, MonitorRecord]] = None  # 监测 id -> 阈值记录，未加载为 None
+        self._table: Optional[MonitorTable] = None
+        self._checksum: List[Any] = [0, 0, Decimal(0)]  # 由本地记录算出的校验值
+        self._reconciled_at = 0.0
+        self.version = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._records is not None
+
+    async def get_table(self, db: AsyncSession) -> MonitorTable:
+        """
+        获取活跃监测阈值表
+        未加载时加载；距上次校验超过 MONITOR_REGISTRY_RECONCILE 秒时先校验，其余情况不访问数据库
+        """
+        if self._records is None:
+            await self.load(db)
+        elif time.monotonic() - self._reconciled_at >= self.reconcile_interval:
+            await self.reconcile(db)
+        if self._table is None:
+            self._table = MonitorTable.from_records(self._records.values())
+            self.version += 1
+            metrics.set_gauge("monitor_registry_size", len(self._table))
+        return self._table
+
+    async def load(self, db: AsyncSession) -> None:
+        """从数据库加载全部活跃监测（只查询需要的列，不构建 ORM 对象）"""
+        result = await db.execute(
+            select(
+                Monitor.id, Monitor.user_id, Monitor.stock_id, Stock.code,
+                Monitor.price_min, Monitor.price_max, Monitor.rise_threshold, Monitor.fall_threshold
+            )
+            .join(Stock, Monitor.stock_id == Stock.id)
+            .where(Monitor.is_active == True)
+        )
+        self._records = {row[0]: tuple(row) for row in result.all()}
+        self._table = None
+        self._checksum = [0, 0, Decimal(0)]
+        for record in self._records.values():
+            self._add_checksum(record, 1)
+        self._reconciled_at = time.monotonic()
+        metrics.inc("monitor_registry_loads_total")
+
+    async def reconcile(self, db: AsyncSession) -> bool:
+        """
+        与数据库校验，不一致时重新加载
+
+        Returns:
+            是否重新加载
+        """
+        checksum = await self._query_checksum(db)
+        self._reconciled_at = time.monotonic()
+        if list(checksum) == self._checksum:
+            return False
+        logger.info("活跃监测已在其他进程修改，重新加载注册表")
+        await self.load(db)
+        return True
+
+    async def _query_checksum(self, db: AsyncSession) -> Tuple[Any, ...]:
+        """活跃监测的聚合校验值（一条聚合查询，与 _contribution 的计算方式一致）"""
+        columns = (Monitor.price_min, Monitor.price_max, Monitor.rise_threshold, Monitor.fall_threshold)
+        weighted = sum(func.coalesce(column, 0) * w for column, w in zip(columns, _THRESHOLD_WEIGHTS))
+        result = await db.execute(
+            select(
+                func.count(Monitor.id),
+                func.coalesce(func.sum(Monitor.id), 0),
+                func.coalesce(func.sum(Monitor.id * weighted), 0),
+            )
+            .join(Stock, Monitor.stock_id == Stock.id)
+            .where(Monitor.is_active == True)
+        )
+        return tuple(result.one())
+
+    def _add_checksum(self, record: MonitorRecord, sign: int) -> None:
+        for i, value in enumerate(_contribution(record)):
+            self._checksum[i] += sign * value
+
+    # ==================== 写穿 ====================
+
+    def put(self, monitor: Monitor, stock_code: str) -> None:
+        """监测创建或修改后同步更新（未激活的监测移出注册表）"""
+        if self._records is None:
+            return  # 本进程尚未加载，首次使用时会从数据库加载
+        self.remove(monitor.id)
+        if not monitor.is_active:
+            return
+        record = (
+            monitor.id, monitor.user_id, monitor.stock_id, stock_code,
+            monitor.price_min, monitor.price_max, monitor.rise_threshold, monitor.fall_threshold,
+        )
+        self._records[monitor.id] = record
+        self._add_checksum(record, 1)
+        self._table = None
+
+    def remove(self, monitor_id: int) -> None:
+        """监测删除后同步移除"""
+        if self._records is None:
+            return
+        record = self._records.pop(monitor_id, None)
+        if record is not None:
+            self._add_checksum(record, -1)
+            self._table = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """注册表状态"""
+        return {
+            "loaded": self.loaded,
+            "monitors": len(self._records) if self._records is not None else 0,
+            "version": self.version,
+            "loads": metrics.get("monitor_registry_loads_total"),
+        }
+
+
+# 全局单例
+monitor_registry = MonitorRegistry()
@@ -1,13 +1,18 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, func, insert
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from datetime import datetime
-from app.models.monitor import Monitor, Notification
+from typing import List, Optional, Tuple
+import numpy as np
+from app.models.monitor import Monitor, Notification, NotificationOutbox
 from app.models.stock import Stock
 from app.schemas.stock import MonitorCreate, MonitorUpdate
 from app.services.data_fetcher import data_fetcher
+from app.services.alert_engine import alert_engine, AlertResult
+from app.services.alert_state import alert_state
+from app.services.monitor_registry import monitor_registry
+from app.services.notification_outbox import notification_outbox
 from app.core.logging import get_logger
+from app.core.metrics import metrics
 
 logger = get_logger(__name__)
 
@@ -22,15 +27,12 @@ async def get_user_monitors(db: AsyncSession, user_id: int) -> List[Monitor]:
 
 async def get_user_monitors_with_realtime(db: AsyncSession, user_id: int) -> List[dict]:
     """
-    获取用户监测列表及实时行情（并发优化版本）
+    获取用户监测列表及实时行情（批量优化版本）
     
     优化策略：
-    1. 并发获取所有股票的实时行情，而非串行
-    2. 使用 asyncio.gather 并发执行，大幅提升响应速度
-    3. 限制并发数避免过载
+    1. 所有股票的行情通过东方财富批量接口一次请求获取
+    2. 批量接口缺失的股票再逐只降级获取
     """
-    import asyncio
-    
     monitors = await get_user_monitors(db, user_id)
     
     if not monitors:
@@ -39,22 +41,8 @@ async def get_user_monitors_with_realtime(db: AsyncSession, user_id: int) -> Lis
     # 收集所有需要获取行情的股票代码
     stock_codes = [m.stock.code for m in monitors if m.stock]
     
-    # 并发获取所有股票的实时行情（限制并发数为10）
-    semaphore = asyncio.Semaphore(10)
-    
-    async def fetch_quote(code: str):
-        async with semaphore:
-            try:
-                return code, await data_fetcher.get_realtime_quote_for_monitor(code)
-            except Exception as e:
-                logger.warning(f"获取行情失败: {code}, 错误: {e}")
-                return code, {}
-    
-    # 并发执行所有请求
-    quote_results = await asyncio.gather(*[fetch_quote(code) for code in stock_codes])
-    
-    # 构建代码到行情的映射
-    quotes_map = {code: quote for code, quote in quote_results}
+    # 批量获取所有股票的实时行情
+    quotes_map = await data_fetcher.get_batch_quotes_for_monitor(stock_codes)
     
     # 组装结果
     result = []
@@ -154,12 +142,13 @@ async def create_monitor(db: AsyncSession, user_id: int, data: MonitorCreate) ->
     db.add(monitor)
     await db.commit()
     await db.refresh(monitor)
+    monitor_registry.put(monitor, stock.code)
     logger.info(f"成功创建监测: 股票={stock_code}, 监测ID={monitor.id}")
     return monitor
 
 async def update_monitor(db: AsyncSession, user_id: int, monitor_id: int, data: MonitorUpdate) -> Monitor:
     result = await db.execute(
-        select(Monitor).where(
+        select(Monitor).options(selectinload(Monitor.stock)).where(
             and_(Monitor.id == monitor_id, Monitor.user_id == user_id)
         )
     )
@@ -172,8 +161,12 @@ async def update_monitor(db: AsyncSession, user_id: int, monitor_id: int, data:
     for key, value in update_data.items():
         setattr(monitor, key, value)
 
+    # 条件修改后重新布防
+    await alert_state.reset(db, monitor.id)
+    stock_code = monitor.stock.code
     await db.commit()
     await db.refresh(monitor)
+    monitor_registry.put(monitor, stock_code)
     return monitor
 
 async def delete_monitor(db: AsyncSession, user_id: int, monitor_id: int) -> None:
@@ -189,156 +182,119 @@ async def delete_monitor(db: AsyncSession, user_id: int, monitor_id: int) -> Non
 
     await db.delete(monitor)
     await db.commit()
+    monitor_registry.remove(monitor_id)
 
-async def create_and_send_notification(
-    db: AsyncSession,
-    user_id: int,
-    stock_id: int,
-    monitor_id: int,
-    notify_type: str,
-    notify_value: float,
-    current_data: dict
-):
-    stock_result = await db.execute(select(Stock).where(Stock.id == stock_id))
-    stock = stock_result.scalar_one_or_none()
-
-    type_names = {
-        'price_min': '价格下限',
-        'price_max': '价格上限',
-        'rise': '涨幅',
-        'fall': '跌幅'
-    }
+NOTIFY_TYPE_NAMES = {
+    'price_min': '价格下限',
+    'price_max': '价格上限',
+    'rise': '涨幅',
+    'fall': '跌幅'
+}
 
+def format_notification(stock_name: str, stock_code: str, notify_type: str, notify_value: float, current_data: dict) -> str:
+    """生成预警通知内容"""
     content = f"""股票预警通知
-股票: {stock.name} ({stock.code})
-类型: {type_names.get(notify_type, notify_type)}
+股票: {stock_name} ({stock_code})
+类型: {NOTIFY_TYPE_NAMES.get(notify_type, notify_type)}
 当前价格: {current_data.get('price', 0):.2f}
 """
     if notify_type in ['rise', 'fall']:
         content += f"涨跌幅: {notify_value:.2f}%\n"
     else:
         content += f"触发值: {notify_value:.2f}\n"
+    return content
 
-    notification = Notification(
-        user_id=user_id,
-        stock_id=stock_id,
-        monitor_id=monitor_id,
-        type=notify_type,
-        content=content
-    )
-    db.add(notification)
-    await db.commit()
-
-    await send_notification(db, user_id, content)
-
-async def send_notification(db: AsyncSession, user_id: int, content: str):
-    from app.models.monitor import NotificationConfig
-    import httpx
-
-    result = await db.execute(
-        select(NotificationConfig).where(NotificationConfig.user_id == user_id)
-    )
-    config = result.scalar_one_or_none()
-
-    if not config or not config.is_enabled or not config.api_url:
+async def create_notifications(db: AsyncSession, items: List[dict]) -> None:
+    """
+    批量保存一轮检查产生的通知并写入发件箱（数据库往返次数与通知条数无关，不提交，由调用方提交）
+    
+    Args:
+        items: 每条包含 user_id、stock_id、monitor_id、notify_type、notify_value、current_data
+    """
+    if not items:
         return
+    stock_ids = {item["stock_id"] for item in items}
+    stock_result = await db.execute(
+        select(Stock.id, Stock.name, Stock.code).where(Stock.id.in_(stock_ids))
+    )
+    stocks = {stock_id: (name, code) for stock_id, name, code in stock_result.all()}
 
-    try:
-        headers = config.api_headers or {}
-        async with httpx.AsyncClient() as client:
-            await client.request(
-                method=config.api_method or "POST",
-                url=config.api_url,
-                json={"content": content},
-                headers=headers,
-                timeout=10.0
-            )
+    values = []
+    for item in items:
+        name, code = stocks.get(item["stock_id"], ("", ""))
+        values.append({
+            "user_id": item["user_id"],
+            "stock_id": item["stock_id"],
+            "monitor_id": item["monitor_id"],
+            "type": item["notify_type"],
+            "content": format_notification(name, code, item["notify_type"], item["notify_value"], item["current_data"]),
+        })
 
-        notification_update = await db.execute(
-            select(Notification).order_by(Notification.id.desc()).limit(1)
+    # 插入前记录最大 id，新插入的通知 id 都大于该值；通知只由主进程在 alert_state.lock 内创建，
+    # 因此 id 大于水位且属于本轮监测的就是本轮的通知，用 INSERT ... SELECT 一次写入发件箱
+    watermark = (await db.execute(select(func.coalesce(func.max(Notification.id), 0)))).scalar()
+    await db.execute(insert(Notification).values(values))
+    await db.execute(
+        insert(NotificationOutbox).from_select(
+            ["notification_id", "user_id"],
+            select(Notification.id, Notification.user_id).where(
+                Notification.id > watermark,
+                Notification.monitor_id.in_([item["monitor_id"] for item in items])
+            ),
+            include_defaults=False  # status/attempts 使用表的默认值
         )
-        notif = notification_update.scalar_one_or_none()
-        if notif:
-            notif.is_sent = True
-            notif.sent_at = datetime.now()
-            await db.commit()
-    except Exception as e:
-        print(f"发送通知失败: {e}")
+    )
 
 async def check_and_notify(db: AsyncSession) -> None:
     """
-    检查所有活跃监测并发送通知（并发优化版本）
+    检查所有活跃监测并发送通知（批量行情 + 向量化计算）
+    条件持续满足时只在首次满足时通知（见 alert_state），
+    同一轮多个条件同时触发时只通知优先级最高的一个：价格下限、价格上限、涨幅、跌幅
     """
-    import asyncio
+    table = await monitor_registry.get_table(db)
     
-    result = await db.execute(
-        select(Monitor)
-        .options(selectinload(Monitor.stock))
-        .where(Monitor.is_active == True)
-    )
-    monitors = result.scalars().all()
-    
-    if not monitors:
+    if not len(table):
         return
     
-    # 收集所有股票代码
-    stock_codes = list(set(m.stock.code for m in monitors if m.stock))
-    
-    # 并发获取所有行情
-    semaphore = asyncio.Semaphore(10)
-    
-    async def fetch_quote(code: str):
-        async with semaphore:
-            try:
-                return code, await data_fetcher.get_realtime_quote_for_monitor(code)
-            except Exception as e:
-                logger.warning(f"获取行情失败: {code}, 错误: {e}")
-                return code, {}
+    # 批量获取所有行情
+    quotes_map = await data_fetcher.get_batch_quotes_for_monitor(table.codes)
     
-    quote_results = await asyncio.gather(*[fetch_quote(code) for code in stock_codes])
-    quotes_map = {code: quote for code, quote in quote_results}
-    
-    # 检查每个监测条件
-    for monitor in monitors:
-        if not monitor.stock:
-            continue
-            
-        realtime = quotes_map.get(monitor.stock.code, {})
-        if not realtime or 'price' not in realtime:
-            continue
-
-        current_price = realtime['price']
-        pre_close = realtime.get('pre_close', current_price)
-        change_pct = ((current_price - pre_close) / pre_close * 100) if pre_close > 0 else 0
-
-        should_notify = False
-        notify_type = None
-        notify_value = None
+    # 一次计算全部监测条件，状态机只放行从不满足变为满足的条件
+    alerts = alert_engine.evaluate(table, quotes_map)
+    await notify_alerts(db, alerts, quotes_map)
 
-        if monitor.price_min and current_price <= monitor.price_min:
-            should_notify = True
-            notify_type = 'price_min'
-            notify_value = current_price
-        elif monitor.price_max and current_price >= monitor.price_max:
-            should_notify = True
-            notify_type = 'price_max'
-            notify_value = current_price
-        elif monitor.rise_threshold and change_pct >= monitor.rise_threshold:
-            should_notify = True
-            notify_type = 'rise'
-            notify_value = change_pct
-        elif monitor.fall_threshold and change_pct <= -monitor.fall_threshold:
-            should_notify = True
-            notify_type = 'fall'
-            notify_value = change_pct
-
-        if should_notify:
-            await create_and_send_notification(
-                db=db,
-                user_id=monitor.user_id,
-                stock_id=monitor.stock_id,
-                monitor_id=monitor.id,
-                notify_type=notify_type,
-                notify_value=notify_value,
-                current_data=realtime
-            )
+async def notify_alerts(
+    db: AsyncSession, alerts: AlertResult, quotes_map: dict, subset: bool = False
+) -> Tuple[List[int], np.ndarray]:
+    """
+    推进预警状态机并为新触发的条件发送通知
+    同一监测同一轮多个条件同时触发时只通知优先级最高的一个；
+    状态变化、通知记录和发件箱记录在同一个事务中提交，失败时全部回滚，条件在下一轮重新触发
+    
+    Returns:
+        (发送了通知的监测行号, 状态不是 armed 的条件矩阵)
+    """
+    table = alerts.table
+    async with alert_state.lock:
+        fired, active = await alert_state.apply(db, alerts, subset)
+        notified, items = [], []
+        for row, notify_type, notify_value in alerts.first_alerts(fired):
+            items.append({
+                "user_id": int(table.user_ids[row]),
+                "stock_id": int(table.stock_ids[row]),
+                "monitor_id": int(table.monitor_ids[row]),
+                "notify_type": notify_type,
+                "notify_value": notify_value,
+                "current_data": quotes_map[table.codes[table.stock_pos[row]]],
+            })
+            notified.append(row)
+        try:
+            await create_notifications(db, items)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    if items:
+        metrics.inc("notifications_created_total", len(items))
+        notification_outbox.wake()
+    return notified, active
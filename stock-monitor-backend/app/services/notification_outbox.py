@@ -0,0 +1,390 @@
+"""
+通知发件箱投递
+预警检查只把通知写入 notification_outbox，不等待 Webhook 返回：
+- 主进程的调度协程扫描到期的待投递记录，放入队列，由固定数量的工作协程并发投递
+- 所有请求共用 http_client 的 Webhook 连接池；同一目标主机的并发数在入队前限制：
+  主机已满时投递留在该主机自己的等待队列中，不占用工作协程，单个慢接口不会阻塞其他主机的投递
+- 投递失败按指数退避重试，超过最大次数标记为 failed；投递成功删除发件箱记录并按通知 id 标记已发送
+- 投递结果先缓存，由写回协程按批更新（每批固定几条语句，与通知条数无关）
+- 记录保存在数据库中，进程重启或主进程切换后未投递的通知会继续投递（至少一次）
+- 用户开启汇总（digest_enabled）时，最早一条待投递通知等待 digest_window 秒后，把该用户全部待投递通知合并为一次请求
+- 请求体按用户的 api_body_template 渲染（{{content}}、{{count}} 占位符），未配置模板时发送 {"content": 内容}
+发件箱积压数量记录在 notification_outbox_depth 指标中。
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import case, delete, func, select, update
+
+from app.config import get_settings
+from app.core.http_client import ENDPOINT_WEBHOOK, UPSTREAM_WEBHOOK, http_client
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.database import AsyncSessionLocal
+from app.models.monitor import Notification, NotificationConfig, NotificationOutbox
+
+logger = get_logger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_FAILED = "failed"
+
+
+def render_body(template: Optional[str], content: str, count: int = 1) -> Optional[str]:
+    """
+    按模板生成请求体，未配置模板返回 None
+
+    模板一般是 JSON，占位符替换为 JSON 字符串转义后的内容，例如
+    {"msgtype": "text", "text": {"content": "{{content}}"}}
+    """
+    if not template:
+        return None
+    escaped = json.dumps(content, ensure_ascii=False)[1:-1]
+    return template.replace("{{content}}", escaped).replace("{{count}}", str(count))
+
+
+def digest_content(contents: List[str]) -> str:
+    """合并多条通知内容"""
+    return f"股票预警汇总（{len(contents)} 条）\n\n" + "\n".join(contents)
+
+
+class NotificationOutboxService:
+    """通知发件箱投递服务类"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.workers = max(1, settings.NOTIFY_WORKERS)
+        self.per_destination = max(1, settings.NOTIFY_PER_DESTINATION)
+        self.max_attempts = max(1, settings.NOTIFY_MAX_ATTEMPTS)
+        self.retry_base = settings.NOTIFY_RETRY_BASE
+        self.retry_max = settings.NOTIFY_RETRY_MAX
+        self.poll_interval = settings.NOTIFY_POLL_INTERVAL
+        self.batch_size = settings.NOTIFY_BATCH_SIZE
+        self.flush_interval = settings.NOTIFY_FLUSH_INTERVAL
+        self.digest_max = max(1, settings.NOTIFY_DIGEST_MAX)
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._inflight: Set[int] = set()                     # 已入队或正在投递的发件箱记录
+        self._waiting: Dict[str, Deque[Dict[str, Any]]] = {}  # 目标主机 -> 超出并发限制、等待放行的投递
+        self._active: Dict[str, int] = {}                    # 目标主机 -> 已放行（排队或发送中）的投递数
+        # 每次投递（job）包含一条或多条（汇总）发件箱记录：ids、notification_ids、attempts、content、count 及用户通知配置
+        self._sent: List[Dict[str, Any]] = []                # 待写回：投递成功
+        self._skipped: List[Dict[str, Any]] = []             # 待写回：未配置通知，直接移出发件箱
+        self._failed: List[Tuple[Dict[str, Any], str]] = []  # 待写回：投递失败及原因
+        self._results_ready: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """启动调度协程和工作协程（主进程当选时调用）"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._results_ready = asyncio.Event()
+        self._inflight.clear()
+        self._tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._write_back())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        logger.info(f"通知投递已启动，工作协程 {self.workers} 个")
+
+    async def stop(self) -> None:
+        """停止投递（主进程卸任时调用），未完成的记录由下一任主进程继续投递"""
+        if not self._tasks:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await self._flush()  # 已完成投递的结果写回，避免下一任主进程重复发送
+        except Exception as e:
+            logger.error(f"写回通知投递结果失败: {str(e)}")
+        self._queue = None
+        self._inflight.clear()
+        self._waiting.clear()
+        self._active.clear()
+
+    def wake(self) -> None:
+        """有新通知写入发件箱，立即扫描（非主进程调用时无效果，由主进程定时扫描）"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ==================== 调度 ====================
+
+    async def _dispatch(self) -> None:
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self._fill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"扫描通知发件箱失败: {str(e)}")
+
+    async def _fill(self) -> None:
+        """读取到期的待投递记录放入队列"""
+        async with AsyncSessionLocal() as db:
+            depth = (await db.execute(
+                select(func.count()).select_from(NotificationOutbox)
+                .where(NotificationOutbox.status == STATUS_PENDING)
+            )).scalar() or 0
+            metrics.set_gauge("notification_outbox_depth", depth)
+            free = self.batch_size - len(self._inflight)
+            if depth == 0 or free <= 0:
+                return
+            result = await db.execute(
+                select(
+                    NotificationOutbox.id, NotificationOutbox.notification_id, NotificationOutbox.user_id,
+                    NotificationOutbox.attempts, Notification.content, Notification.created_at,
+                    NotificationConfig.api_url, NotificationConfig.api_method, NotificationConfig.api_headers,
+                    NotificationConfig.api_body_template, NotificationConfig.is_enabled,
+                    NotificationConfig.digest_enabled, NotificationConfig.digest_window
+                )
+                .join(Notification, Notification.id == NotificationOutbox.notification_id)
+                .outerjoin(NotificationConfig, NotificationConfig.user_id == NotificationOutbox.user_id)
+                .where(
+                    NotificationOutbox.status == STATUS_PENDING,
+                    NotificationOutbox.next_attempt_at <= datetime.now()
+                )
+                .order_by(NotificationOutbox.id)
+                .limit(free + len(self._inflight))
+            )
+            rows = [row for row in result.mappings().all() if row["id"] not in self._inflight]
+
+        now = datetime.now()
+        digests: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for row in rows:
+            if row["digest_enabled"] and row["api_url"] and row["is_enabled"]:
+                digests[row["user_id"]].append(row)
+            else:
+                self._enqueue([row])
+        for user_rows in digests.values():
+            # 最早一条等待满汇总窗口后才投递，窗口内新增的通知一起合并
+            window = timedelta(seconds=user_rows[0]["digest_window"] or 0)
+            oldest = min(row["created_at"] or now for row in user_rows)
+            if oldest + window > now:
+                continue
+            for i in range(0, len(user_rows), self.digest_max):
+                self._enqueue(user_rows[i:i + self.digest_max])
+        metrics.set_gauge("notification_outbox_inflight", len(self._inflight))
+
+    def _enqueue(self, rows: List[Dict[str, Any]]) -> None:
+        """把一条或多条（同一用户）发件箱记录作为一次投递放入队列"""
+        first = rows[0]
+        contents = [row["content"] or "" for row in rows]
+        job = {
+            "ids": [row["id"] for row in rows],
+            "notification_ids": [row["notification_id"] for row in rows],
+            "attempts": max(row["attempts"] or 0 for row in rows),
+            "content": contents[0] if len(rows) == 1 else digest_content(contents),
+            "count": len(rows),
+            "api_url": first["api_url"],
+            "api_method": first["api_method"],
+            "api_headers": first["api_headers"],
+            "api_body_template": first["api_body_template"],
+            "is_enabled": first["is_enabled"],
+        }
+        url = job["api_url"]
+        # 不需要发送的投递没有目标主机，不受并发限制
+        job["destination"] = (urlsplit(url).netloc or url) if url and job["is_enabled"] else None
+        self._inflight.update(job["ids"])
+        self._admit(job)
+        if len(rows) > 1:
+            metrics.inc("notification_digests_total")
+            metrics.inc("notification_digest_items_total", len(rows))
+
+    # ==================== 投递 ====================
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._deliver(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"处理通知 {job['notification_ids']} 失败: {str(e)}")
+                self._failed.append((job, f"{type(e).__name__}: {e}"))
+                self._results_ready.set()
+            finally:
+                self._release(job["destination"])
+                self._queue.task_done()
+
+    def _admit(self, job: Dict[str, Any]) -> None:
+        """目标主机未满时放入工作队列，否则留在该主机的等待队列"""
+        destination = job["destination"]
+        if destination is None:
+            self._queue.put_nowait(job)
+            return
+        if self._active.get(destination, 0) < self.per_destination:
+            self._active[destination] = self._active.get(destination, 0) + 1
+            self._queue.put_nowait(job)
+        else:
+            self._waiting.setdefault(destination, deque()).append(job)
+
+    def _release(self, destination: Optional[str]) -> None:
+        """一次投递完成，放行该主机等待队列中的下一条"""
+        if destination is None:
+            return
+        waiting = self._waiting.get(destination)
+        if waiting:
+            self._queue.put_nowait(waiting.popleft())  # 名额直接转给下一条
+            if not waiting:
+                del self._waiting[destination]
+            return
+        remaining = self._active.get(destination, 0) - 1
+        if remaining > 0:
+            self._active[destination] = remaining
+        else:
+            self._active.pop(destination, None)
+
+    async def _deliver(self, job: Dict[str, Any]) -> None:
+        """投递一条通知，结果交给写回协程保存"""
+        url = job["api_url"]
+        if not url or not job["is_enabled"]:
+            # 用户未配置或关闭了通知，只保留站内通知记录
+            self._skipped.append(job)
+            self._results_ready.set()
+            return
+
+        headers = dict(job["api_headers"] or {})
+        body = render_body(job["api_body_template"], job["content"], job["count"])
+        if body is None:
+            payload = {"json": {"content": job["content"]}}
+        else:
+            payload = {"data": body.encode("utf-8")}
+            if not any(key.lower() == "content-type" for key in headers):
+                headers["Content-Type"] = "application/json; charset=utf-8"
+        started = time.monotonic()
+        try:
+            session = http_client.session(UPSTREAM_WEBHOOK)
+            metrics.inc("notification_webhook_requests_total")
+            async with session.request(
+                method=job["api_method"] or "POST",
+                url=url,
+                headers=headers,
+                timeout=http_client.timeout(ENDPOINT_WEBHOOK),
+                **payload
+            ) as response:
+                await response.read()
+                if response.status >= 400:
+                    raise RuntimeError(f"HTTP {response.status}")
+        except Exception as e:
+            metrics.observe("notification_delivery_seconds", time.monotonic() - started, result="error")
+            self._failed.append((job, f"{type(e).__name__}: {e}"))
+        else:
+            metrics.observe("notification_delivery_seconds", time.monotonic() - started, result="ok")
+            self._sent.append(job)
+        self._results_ready.set()
+
+    # ==================== 结果写回 ====================
+
+    async def _write_back(self) -> None:
+        while True:
+            try:
+                await self._results_ready.wait()
+                await asyncio.sleep(self.flush_interval)  # 合并一段时间内的投递结果
+                self._results_ready.clear()
+                await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"写回通知投递结果失败: {str(e)}")
+
+    async def _flush(self) -> None:
+        """
+        批量保存投递结果
+        成功：一条 UPDATE 按 id 标记通知已发送；成功和跳过：一条 DELETE 移出发件箱；
+        失败：按已尝试次数分组（同组的下次投递时间相同），每组一条 UPDATE
+        """
+        sent, self._sent = self._sent, []
+        skipped, self._skipped = self._skipped, []
+        failed, self._failed = self._failed, []
+        if not (sent or skipped or failed):
+            return
+
+        now = datetime.now()
+        retry_groups: Dict[int, Dict[int, str]] = defaultdict(dict)  # 尝试次数 -> {发件箱 id: 失败原因}
+        for job, error in failed:
+            for outbox_id in job["ids"]:
+                retry_groups[job["attempts"] + 1][outbox_id] = error[:500]
+        sent_ids = [nid for job in sent for nid in job["notification_ids"]]
+        done = [outbox_id for job in sent + skipped for outbox_id in job["ids"]]
+
+        try:
+            async with AsyncSessionLocal() as db:
+                if sent_ids:
+                    await db.execute(
+                        update(Notification)
+                        .where(Notification.id.in_(sent_ids))
+                        .values(is_sent=True, sent_at=now)
+                    )
+                if done:
+                    await db.execute(delete(NotificationOutbox).where(NotificationOutbox.id.in_(done)))
+                for attempts, errors in retry_groups.items():
+                    values = {
+                        "attempts": attempts,
+                        "last_error": case(errors, value=NotificationOutbox.id),
+                    }
+                    if attempts >= self.max_attempts:
+                        values["status"] = STATUS_FAILED
+                    else:
+                        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+                        values["next_attempt_at"] = now + timedelta(seconds=delay)
+                    await db.execute(
+                        update(NotificationOutbox).where(NotificationOutbox.id.in_(list(errors))).values(**values)
+                    )
+                await db.commit()
+        except Exception:
+            # 写回失败时放回缓存，下一次写回重试
+            self._sent = sent + self._sent
+            self._skipped = skipped + self._skipped
+            self._failed = failed + self._failed
+            self._results_ready.set()
+            raise
+
+        for job in sent + skipped + [job for job, _ in failed]:
+            self._inflight.difference_update(job["ids"])
+        metrics.set_gauge("notification_outbox_inflight", len(self._inflight))
+        if sent_ids:
+            metrics.inc("notification_deliveries_total", len(sent_ids), result="sent")
+        skipped_count = sum(job["count"] for job in skipped)
+        if skipped_count:
+            metrics.inc("notification_deliveries_total", skipped_count, result="skipped")
+        for attempts, errors in retry_groups.items():
+            if attempts >= self.max_attempts:
+                metrics.inc("notification_deliveries_total", len(errors), result="failed")
+                logger.warning(f"{len(errors)} 条通知投递失败 {attempts} 次，不再重试")
+            else:
+                metrics.inc("notification_deliveries_total", len(errors), result="retry")
+        metrics.inc("notification_flushes_total")
+
+    def get_status(self) -> Dict[str, Any]:
+        """投递状态"""
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "depth": metrics.get("notification_outbox_depth"),
+            "inflight": len(self._inflight),
+            "waiting": sum(len(waiting) for waiting in self._waiting.values()),
+            "sent": metrics.get("notification_deliveries_total", result="sent"),
+            "retries": metrics.get("notification_deliveries_total", result="retry"),
+            "failed": metrics.get("notification_deliveries_total", result="failed"),
+            "webhook_requests": metrics.get("notification_webhook_requests_total"),
+            "digests": metrics.get("notification_digests_total"),
+        }
+
+
+# 全局单例
+notification_outbox = NotificationOutboxService()
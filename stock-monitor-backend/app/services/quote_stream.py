@@ -0,0 +1,241 @@
+"""
+推送行情服务
+通过东方财富 push2 的 SSE 长连接接收监测股票的行情推送：
+1. 所有活跃监测股票和 WebSocket 订阅股票合并到一条连接中；
+   活跃监测只由主进程订阅，其他 worker 只订阅自己 WebSocket 客户端的股票，避免重复连接
+2. 股票列表变化时立即断开并按新列表重新订阅
+3. 断线后按指数退避自动重连
+4. 收到的更新直接写入监测行情缓存，轮询只作为兜底
+推送地址可通过 QUOTE_STREAM_URL 指向本地模拟服务进行测试
+"""
+import asyncio
+import json
+from typing import Dict, List, Optional, Any, Set
+from datetime import datetime
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.core.http_client import http_client, UPSTREAM_EASTMONEY_STREAM, ENDPOINT_STREAM
+from app.core.logging import get_logger
+from app.services.stock_api import stock_api_service
+
+logger = get_logger(__name__)
+
+# 订阅来源
+SOURCE_MONITORS = "monitors"    # 活跃监测
+SOURCE_WEBSOCKET = "websocket"  # WebSocket 客户端订阅
+
+
+class QuoteStreamService:
+    """推送行情服务类"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.enabled = settings.QUOTE_STREAM_ENABLED
+        self.url = settings.QUOTE_STREAM_URL
+        self.reconnect_min = settings.QUOTE_STREAM_RECONNECT_MIN
+        self.reconnect_max = settings.QUOTE_STREAM_RECONNECT_MAX
+        self.refresh_interval = settings.QUOTE_STREAM_REFRESH_INTERVAL
+        self._sources: Dict[str, Set[str]] = {}
+        self._streaming: List[str] = []  # 当前连接订阅的股票
+        self._rows: Dict[str, Dict[str, Any]] = {}  # 推送为增量字段，按位置合并出完整记录
+        self._changed: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._monitor_task: Optional[asyncio.Task] = None  # 主进程加载活跃监测股票的任务
+        self.connected = False
+        self.last_message_at: Optional[datetime] = None
+        self.reconnect_count = 0
+
+    @property
+    def codes(self) -> List[str]:
+        """所有来源订阅股票的并集"""
+        merged: Set[str] = set()
+        for codes in self._sources.values():
+            merged |= codes
+        return sorted(merged)
+
+    def set_codes(self, source: str, codes: List[str]) -> None:
+        """
+        更新某个来源的订阅股票
+
+        Args:
+            source: 订阅来源
+            codes: 该来源当前需要的全部股票代码
+        """
+        before = self.codes
+        self._sources[source] = set(codes)
+        if self.codes != before and self._changed is not None:
+            self._changed.set()
+
+    async def start(self) -> None:
+        """启动推送行情（未启用时直接返回），每个 worker 都会启动"""
+        if not self.enabled or self._tasks:
+            return
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run())]
+        logger.info(f"推送行情已启动: {self.url}")
+
+    async def stop(self) -> None:
+        """停止推送行情"""
+        await self.stop_monitors()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.connected = False
+
+    async def start_monitors(self) -> None:
+        """当选主进程后开始订阅活跃监测股票"""
+        if not self.enabled or self._monitor_task is not None:
+            return
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        self._monitor_task = asyncio.create_task(self._refresh_monitored_codes())
+
+    async def stop_monitors(self) -> None:
+        """卸任主进程后停止订阅活跃监测股票（由新的主进程接管）"""
+        if self._monitor_task is None:
+            return
+        self._monitor_task.cancel()
+        await asyncio.gather(self._monitor_task, return_exceptions=True)
+        self._monitor_task = None
+        self.set_codes(SOURCE_MONITORS, [])
+
+    def get_status(self) -> Dict[str, Any]:
+        """推送行情状态"""
+        return {
+            "enabled": self.enabled,
+            "connected": self.connected,
+            "codes": len(self._streaming),
+            "monitors": self._monitor_task is not None,
+            "last_message_at": self.last_message_at.isoformat() if self.last_message_at else None,
+            "reconnect_count": self.reconnect_count,
+        }
+
+    async def _refresh_monitored_codes(self) -> None:
+        """定期从数据库加载活跃监测的股票代码"""
+        from app.database import AsyncSessionLocal
+        from app.models.monitor import Monitor
+        from app.models.stock import Stock
+
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        select(Stock.code)
+                        .join(Monitor, Monitor.stock_id == Stock.id)
+                        .where(Monitor.is_active == True)
+                        .distinct()
+                    )
+                    self.set_codes(SOURCE_MONITORS, [row[0] for row in result.all()])
+            except Exception as e:
+                logger.error(f"加载监测股票列表失败: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _run(self) -> None:
+        """连接主循环：订阅、断线重连、列表变化时重新订阅"""
+        delay = self.reconnect_min
+        while True:
+            codes = self.codes
+            if not codes:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+
+            self._changed.clear()
+            try:
+                resubscribe = await self._consume(codes)
+                if resubscribe:
+                    delay = self.reconnect_min
+                    continue
+                logger.warning("推送行情连接被服务端关闭")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"推送行情连接异常: {str(e)}")
+            finally:
+                self.connected = False
+
+            if self._rows:
+                delay = self.reconnect_min  # 上一条连接收到过数据，重新从最短等待开始退避
+            self.reconnect_count += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max)
+
+    async def _consume(self, codes: List[str]) -> bool:
+        """
+        建立一条连接并持续读取推送
+
+        Returns:
+            True 表示订阅列表变化需要重新订阅，False 表示连接结束
+        """
+        session = http_client.session(UPSTREAM_EASTMONEY_STREAM)
+        params = stock_api_service.get_list_quote_params(codes)
+
+        async with session.get(self.url, params=params,
+                               timeout=http_client.timeout(ENDPOINT_STREAM)) as response:
+            if response.status != 200:
+                raise RuntimeError(f"推送行情返回状态码 {response.status}")
+
+            self._streaming = codes
+            self._rows = {}
+            self.connected = True
+            logger.info(f"推送行情已订阅 {len(codes)} 只股票")
+
+            reader = asyncio.create_task(self._read_events(response))
+            changed = asyncio.create_task(self._changed.wait())
+            try:
+                done, _ = await asyncio.wait({reader, changed}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                reader.cancel()
+                changed.cancel()
+
+            if reader in done:
+                reader.result()  # 读取异常向上抛出，触发重连
+                return False
+            return True
+
+    async def _read_events(self, response) -> None:
+        """按 SSE 格式读取事件，空行表示一条事件结束"""
+        data_lines: List[str] = []
+        async for raw in response.content:
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if line.startswith("data:"):
+                data_lines.append(line[5:].lstrip())
+            elif not line and data_lines:
+                self._handle_event("\n".join(data_lines))
+                data_lines = []
+
+    def _handle_event(self, payload: str) -> None:
+        """处理一条推送：合并增量字段并写入监测行情缓存"""
+        self.last_message_at = datetime.now()
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+
+        diff = (message.get("data") or {}).get("diff")
+        if not diff:
+            return  # 心跳
+
+        items = diff.items() if isinstance(diff, dict) else enumerate(diff)
+        updated = []
+        for key, fields in items:
+            row = self._rows.setdefault(str(key), {})
+            row.update(fields)
+            if "f12" in row:
+                updated.append(row)
+
+        quotes = stock_api_service.parse_list_quotes(updated)
+        if not quotes:
+            return
+
+        from app.services.data_fetcher import data_fetcher
+        for code, quote in quotes.items():
+            if quote.get("price", 0) > 0:
+                data_fetcher.put_monitor_quote(code, quote)
+
+
+# 全局单例
+quote_stream = QuoteStreamService()
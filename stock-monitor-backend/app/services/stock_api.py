@@ -2,41 +2,195 @@
 股票数据API服务
 提供实时行情、历史数据、资金流向等数据获取功能
 """
-import aiohttp
 import asyncio
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import json
 import re
+import numpy as np
+import pandas as pd
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库解析
+    orjson = None
+from app.config import get_settings
+from app.core.http_client import (
+    http_client, UPSTREAM_EASTMONEY, UPSTREAM_EASTMONEY_HIS, UPSTREAM_EASTMONEY_SEARCH,
+    UPSTREAM_SINA, ENDPOINT_QUOTE, ENDPOINT_KLINE, ENDPOINT_SEARCH
+)
 from app.core.logging import get_logger
+from app.services.kline_store import KlineSeries
+from app.utils.cache import UpstreamError
 
 logger = get_logger(__name__)
 
 
+def _json_loads(body: bytes) -> Any:
+    """解析 JSON 响应体（安装了 orjson 时使用 orjson）"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _split_rows(lines: List[str], min_width: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    将东方财富逗号分隔的 klines 数组一次性拆分为列
+
+    Args:
+        lines: ["2024-01-02,10.1,10.2,...", ...]
+        min_width: 每行至少需要的字段数
+
+    Returns:
+        (日期列, 数值矩阵)，数值矩阵不含日期列；无有效数据时返回 None
+    """
+    if not lines:
+        return None
+    width = lines[0].count(",") + 1
+    flat = ",".join(lines).split(",")
+    if width >= min_width and len(flat) == len(lines) * width:
+        rows = np.array(flat).reshape(len(lines), width)
+    else:
+        # 各行字段数不一致时逐行处理，丢弃字段不足的行
+        parts = [line.split(",")[:min_width] for line in lines]
+        parts = [p for p in parts if len(p) == min_width]
+        if not parts:
+            return None
+        rows = np.array(parts)
+    
+    dates = rows[:, 0]
+    raw = rows[:, 1:]
+    try:
+        values = raw.astype(np.float64)
+    except ValueError:
+        # 停牌等情况会出现 "-"，按 0 处理
+        values = pd.to_numeric(pd.Series(raw.ravel()), errors="coerce").fillna(0).to_numpy().reshape(raw.shape)
+    return dates, values
+
+
+# 资金流向字段在 fields2（f51-f65）去掉日期后的下标
+_FUND_FLOW_COLUMNS = {
+    "main_net_inflow": 0,  # 主力净流入
+    "small_net_inflow": 4,  # 小单净流入
+    "medium_net_inflow": 2,  # 中单净流入
+    "large_net_inflow": 6,  # 大单净流入
+    "super_large_net_inflow": 8,  # 超大单净流入
+    "main_net_inflow_percent": 1,  # 主力净流入占比
+    "close": 10,  # 收盘价
+    "change_percent": 11,  # 涨跌幅
+}
+
+# 东方财富列表行情字段 -> 行情字典字段（fltt=2 时数值已换算为小数）
+_BATCH_QUOTE_NUMERIC_FIELDS = {
+    "f2": "price",              # 最新价
+    "f4": "change",             # 涨跌额
+    "f3": "change_percent",     # 涨跌幅
+    "f17": "open",              # 开盘价
+    "f15": "high",              # 最高价
+    "f16": "low",               # 最低价
+    "f18": "pre_close",         # 昨收
+    "f5": "volume",             # 成交量（手）
+    "f6": "amount",             # 成交额
+    "f7": "amplitude",          # 振幅
+    "f8": "turnover_rate",      # 换手率
+    "f9": "pe_ratio",           # 市盈率（动态）
+    "f23": "pb_ratio",          # 市净率
+    "f10": "volume_ratio",      # 量比
+    "f20": "market_cap",        # 总市值
+    "f21": "float_market_cap",  # 流通市值
+}
+_BATCH_QUOTE_FIELDS = ["f12", "f14"] + list(_BATCH_QUOTE_NUMERIC_FIELDS)
+
+
+def _parse_batch_quotes(diff: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    向量化解析东方财富列表行情
+
+    停牌等情况下字段值为 '-'，统一按 0 处理。
+    """
+    if not diff:
+        return {}
+    
+    df = pd.DataFrame.from_records(diff)
+    numeric_columns = [col for col in _BATCH_QUOTE_NUMERIC_FIELDS if col in df.columns]
+    values = df[numeric_columns].apply(pd.to_numeric, errors="coerce").fillna(0)
+    values = values.rename(columns=_BATCH_QUOTE_NUMERIC_FIELDS)
+    if "volume" in values.columns:
+        values["volume"] = values["volume"].astype("int64")
+    values.insert(0, "name", df["f14"].astype(str) if "f14" in df.columns else "")
+    values.insert(0, "code", df["f12"].astype(str))
+    values["timestamp"] = datetime.now().isoformat()
+    
+    records = values.to_dict("records")
+    return {record["code"]: record for record in records}
+
+
+# 新浪行情每行格式：var hq_str_sh600000="名称,今开,昨收,最新价,最高,最低,...";
+_SINA_QUOTE_RE = re.compile(r'hq_str_[a-z]{2}(\d{6})="([^"]*)"')
+# 新浪行情数值字段下标：今开、昨收、最新价、最高、最低、成交量（股）、成交额
+_SINA_NUMERIC_INDEXES = [1, 2, 3, 4, 5, 8, 9]
+
+
+def _parse_sina_quotes(text: str) -> Dict[str, Dict[str, Any]]:
+    """
+    一次扫描解析新浪批量行情响应
+
+    无效代码返回空字符串，会被直接跳过；数值字段整体转换为浮点数组后计算涨跌。
+    """
+    codes, names, rows = [], [], []
+    for match in _SINA_QUOTE_RE.finditer(text):
+        parts = match.group(2).split(',')
+        if len(parts) < 32:
+            continue
+        codes.append(match.group(1))
+        names.append(parts[0])
+        rows.append([parts[i] for i in _SINA_NUMERIC_INDEXES])
+    
+    if not rows:
+        return {}
+    
+    values = pd.DataFrame(rows).apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy()
+    open_, pre_close, price, high, low, volume, amount = values.T
+    change = price - pre_close
+    change_percent = np.divide(change * 100, pre_close, out=np.zeros_like(change), where=pre_close != 0)
+    timestamp = datetime.now().isoformat()
+    
+    quotes = {}
+    for i, code in enumerate(codes):
+        quotes[code] = {
+            "code": code,
+            "name": names[i],
+            "price": float(price[i]),
+            "change": float(change[i]),
+            "change_percent": float(change_percent[i]),
+            "open": float(open_[i]),
+            "high": float(high[i]),
+            "low": float(low[i]),
+            "pre_close": float(pre_close[i]),
+            "volume": int(volume[i]),
+            "amount": float(amount[i]),
+            "timestamp": timestamp
+        }
+    return quotes
+
+
 class StockAPIService:
     """股票数据API服务类"""
     
     def __init__(self):
-        self.session: Optional[aiohttp.ClientSession] = None
+        settings = get_settings()
         # 东方财富API基础URL
-        self.eastmoney_quote_url = "https://push2.eastmoney.com/api/qt/stock/get"
-        self.eastmoney_kline_url = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
-        self.eastmoney_fund_flow_url = "https://push2.eastmoney.com/api/qt/stock/fflow/kline/get"
+        self.eastmoney_quote_url = f"{settings.EASTMONEY_PUSH2_URL}/api/qt/stock/get"
+        self.eastmoney_batch_quote_url = f"{settings.EASTMONEY_PUSH2_URL}/api/qt/ulist.np/get"
+        self.eastmoney_kline_url = f"{settings.EASTMONEY_PUSH2HIS_URL}/api/qt/stock/kline/get"
+        self.eastmoney_fund_flow_url = f"{settings.EASTMONEY_PUSH2_URL}/api/qt/stock/fflow/kline/get"
+        self.eastmoney_search_url = f"{settings.EASTMONEY_SEARCH_URL}/api/suggest/get"
         # 新浪财经API（备用）
-        self.sina_realtime_url = "https://hq.sinajs.cn/list="
+        self.sina_realtime_url = f"{settings.SINA_QUOTE_URL}/list="
+        # 批量行情每个请求包含的最大股票数，以及同时发出的请求数
+        self.batch_size = settings.QUOTE_BATCH_SIZE
+        self.batch_concurrency = settings.QUOTE_BATCH_CONCURRENCY
+        self.sina_batch_size = settings.SINA_BATCH_SIZE
         
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建HTTP会话"""
-        if self.session is None or self.session.closed:
-            timeout = aiohttp.ClientTimeout(total=30)
-            self.session = aiohttp.ClientSession(timeout=timeout)
-        return self.session
-    
-    async def close(self):
-        """关闭HTTP会话"""
-        if self.session and not self.session.closed:
-            await self.session.close()
-    
     def _get_market_code(self, stock_code: str) -> str:
         """
         根据股票代码获取市场代码
@@ -54,89 +208,140 @@ class StockAPIService:
     
     async def get_realtime_quote(self, stock_code: str) -> Optional[Dict[str, Any]]:
         """
-        获取股票实时行情
+        获取股票实时行情（东方财富没有数据时使用新浪）
         
         Args:
             stock_code: 股票代码，如 "000001"
             
         Returns:
-            包含实时行情数据的字典
+            包含实时行情数据的字典；东方财富和新浪都正常返回但没有该股票时返回 None
+            
+        Raises:
+            UpstreamError: 没有拿到数据且至少一个数据源请求失败
         """
+        error = None
         try:
-            session = await self._get_session()
-            secid = self._get_secid(stock_code)
-            
-            params = {
-                "secid": secid,
-                "fields": "f43,f44,f45,f46,f47,f48,f50,f51,f52,f55,f57,f58,f60,f116,f117,f168,f169,f170",
-                "ut": "fa5fd1943c7b386f172d6893dbfba10b"
-            }
-            
-            async with session.get(self.eastmoney_quote_url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get("data"):
-                        raw = data["data"]
-                        return {
-                            "code": stock_code,
-                            "name": raw.get("f58", ""),
-                            "price": raw.get("f43", 0) / 100,  # 当前价
-                            "change": raw.get("f169", 0) / 100,  # 涨跌额
-                            "change_percent": raw.get("f170", 0) / 100,  # 涨跌幅
-                            "open": raw.get("f46", 0) / 100,  # 开盘价
-                            "high": raw.get("f44", 0) / 100,  # 最高价
-                            "low": raw.get("f45", 0) / 100,  # 最低价
-                            "pre_close": raw.get("f60", 0) / 100,  # 昨收
-                            "volume": raw.get("f47", 0),  # 成交量（手）
-                            "amount": raw.get("f48", 0),  # 成交额
-                            "turnover_rate": raw.get("f168", 0) / 100,  # 换手率
-                            "pe_ratio": raw.get("f55", 0) / 100,  # 市盈率
-                            "market_cap": raw.get("f116", 0),  # 总市值
-                            "float_market_cap": raw.get("f117", 0),  # 流通市值
-                            "timestamp": datetime.now().isoformat()
-                        }
-            
-            # 如果东方财富API失败，尝试新浪API
-            return await self._get_sina_realtime(stock_code)
-            
+            quote = await self._get_eastmoney_realtime(stock_code)
+            if quote:
+                return quote
         except Exception as e:
             logger.error(f"获取实时行情失败: {stock_code}, 错误: {str(e)}")
+            error = e
+        
+        # 如果东方财富API失败，尝试新浪API
+        try:
+            quote = await self._get_sina_realtime(stock_code)
+        except UpstreamError as e:
+            error = error or e
+            quote = None
+        if quote:
+            return quote
+        if error is not None:
+            raise UpstreamError(f"实时行情请求失败: {stock_code}, 错误: {str(error)}")
+        return None
+    
+    async def _get_eastmoney_realtime(self, stock_code: str) -> Optional[Dict[str, Any]]:
+        """东方财富个股行情，没有数据时返回 None，请求失败时抛出异常"""
+        session = http_client.session(UPSTREAM_EASTMONEY)
+        secid = self._get_secid(stock_code)
+        
+        params = {
+            "secid": secid,
+            "fields": "f43,f44,f45,f46,f47,f48,f50,f51,f52,f55,f57,f58,f60,f116,f117,f168,f169,f170",
+            "ut": "fa5fd1943c7b386f172d6893dbfba10b"
+        }
+        
+        async with session.get(self.eastmoney_quote_url, params=params,
+                               timeout=http_client.timeout(ENDPOINT_QUOTE)) as response:
+            if response.status != 200:
+                raise UpstreamError(f"东方财富行情返回状态码 {response.status}")
+            data = await response.json()
+        
+        if not data.get("data"):
             return None
+        raw = data["data"]
+        return {
+            "code": stock_code,
+            "name": raw.get("f58", ""),
+            "price": raw.get("f43", 0) / 100,  # 当前价
+            "change": raw.get("f169", 0) / 100,  # 涨跌额
+            "change_percent": raw.get("f170", 0) / 100,  # 涨跌幅
+            "open": raw.get("f46", 0) / 100,  # 开盘价
+            "high": raw.get("f44", 0) / 100,  # 最高价
+            "low": raw.get("f45", 0) / 100,  # 最低价
+            "pre_close": raw.get("f60", 0) / 100,  # 昨收
+            "volume": raw.get("f47", 0),  # 成交量（手）
+            "amount": raw.get("f48", 0),  # 成交额
+            "turnover_rate": raw.get("f168", 0) / 100,  # 换手率
+            "pe_ratio": raw.get("f55", 0) / 100,  # 市盈率
+            "market_cap": raw.get("f116", 0),  # 总市值
+            "float_market_cap": raw.get("f117", 0),  # 流通市值
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def _get_sina_symbol(self, stock_code: str) -> str:
+        """获取新浪格式的证券代码，如 sh600000"""
+        market = "sh" if stock_code.startswith(('6', '9', '5')) else "sz"
+        return f"{market}{stock_code}"
     
     async def _get_sina_realtime(self, stock_code: str) -> Optional[Dict[str, Any]]:
-        """从新浪财经获取实时行情（备用）"""
+        """从新浪财经获取实时行情（备用），请求失败时抛出 UpstreamError"""
+        quotes = await self._get_sina_chunk([stock_code])
+        return quotes.get(stock_code)
+    
+    async def _get_sina_batch(self, stock_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        从新浪财经批量获取实时行情（备用）
+        
+        hq.sinajs.cn/list= 接口支持逗号分隔的多个代码，按 sina_batch_size 分组并发请求。
+        
+        Args:
+            stock_codes: 股票代码列表
+            
+        Returns:
+            股票代码到行情数据的映射（请求失败的分组不包含在内）
+        """
+        codes = list(dict.fromkeys(stock_codes))
+        if not codes:
+            return {}
+        
+        chunks = [codes[i:i + self.sina_batch_size] for i in range(0, len(codes), self.sina_batch_size)]
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        
+        async def fetch_chunk(chunk: List[str]) -> Dict[str, Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return await self._get_sina_chunk(chunk)
+                except UpstreamError:
+                    return {}
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        for chunk_result in await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks]):
+            results.update(chunk_result)
+        return results
+    
+    async def _get_sina_chunk(self, stock_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """一次请求获取一组股票的新浪行情，请求失败时抛出 UpstreamError"""
         try:
-            session = await self._get_session()
-            market = "sh" if stock_code.startswith(('6', '9', '5')) else "sz"
-            url = f"{self.sina_realtime_url}{market}{stock_code}"
+            session = http_client.session(UPSTREAM_SINA)
+            symbols = ",".join(self._get_sina_symbol(code) for code in stock_codes)
+            url = f"{self.sina_realtime_url}{symbols}"
             
             headers = {"Referer": "https://finance.sina.com.cn"}
             
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    text = await response.text(encoding='gbk')
-                    # 解析新浪数据格式
-                    match = re.search(r'"(.+)"', text)
-                    if match:
-                        parts = match.group(1).split(',')
-                        if len(parts) >= 32:
-                            return {
-                                "code": stock_code,
-                                "name": parts[0],
-                                "price": float(parts[3]) if parts[3] else 0,
-                                "change": float(parts[3]) - float(parts[2]) if parts[3] and parts[2] else 0,
-                                "change_percent": ((float(parts[3]) - float(parts[2])) / float(parts[2]) * 100) if parts[3] and parts[2] and float(parts[2]) != 0 else 0,
-                                "open": float(parts[1]) if parts[1] else 0,
-                                "high": float(parts[4]) if parts[4] else 0,
-                                "low": float(parts[5]) if parts[5] else 0,
-                                "pre_close": float(parts[2]) if parts[2] else 0,
-                                "volume": int(float(parts[8])) if parts[8] else 0,
-                                "amount": float(parts[9]) if parts[9] else 0,
-                                "timestamp": datetime.now().isoformat()
-                            }
+            async with session.get(url, headers=headers,
+                                   timeout=http_client.timeout(ENDPOINT_QUOTE)) as response:
+                if response.status != 200:
+                    raise UpstreamError(f"新浪行情返回状态码 {response.status}")
+                text = await response.text(encoding='gbk')
+            
+            return _parse_sina_quotes(text)
+            
         except Exception as e:
-            logger.error(f"新浪API获取失败: {stock_code}, 错误: {str(e)}")
-        return None
+            logger.error(f"新浪API获取失败: {len(stock_codes)} 只, 错误: {str(e)}")
+            if isinstance(e, UpstreamError):
+                raise
+            raise UpstreamError(str(e)) from e
     
     async def get_kline_data(
         self, 
@@ -144,7 +349,8 @@ class StockAPIService:
         period: str = "daily",
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        limit: int = 100
+        limit: int = 100,
+        adjust: str = "qfq"
     ) -> List[Dict[str, Any]]:
         """
         获取K线数据
@@ -156,12 +362,34 @@ class StockAPIService:
             start_date: 开始日期 YYYY-MM-DD
             end_date: 结束日期 YYYY-MM-DD
             limit: 返回数据条数
+            adjust: 复权类型 - qfq(前复权), hfq(后复权), 空字符串(不复权)
             
         Returns:
             K线数据列表
         """
+        series = await self.get_kline_series(stock_code, period, limit, adjust)
+        if series is None:
+            return []
+        return series.to_records(start_date, end_date)
+    
+    async def get_kline_series(
+        self,
+        stock_code: str,
+        period: str = "daily",
+        limit: int = 100,
+        adjust: str = "qfq"
+    ) -> Optional[KlineSeries]:
+        """
+        获取列式K线数据（最近 limit 条）
+        
+        整个 klines 数组一次性拆分为列，不逐根构建字典，
+        日期过滤由调用方在日期列上二分查找完成。
+        
+        Returns:
+            K线序列，失败时返回 None
+        """
         try:
-            session = await self._get_session()
+            session = http_client.session(UPSTREAM_EASTMONEY_HIS)
             secid = self._get_secid(stock_code)
             
             # 周期映射
@@ -172,10 +400,14 @@ class StockAPIService:
             }
             klt = klt_map.get(period, "101")
             
+            # 复权映射：0 不复权，1 前复权，2 后复权
+            fqt_map = {"qfq": "1", "hfq": "2"}
+            fqt = fqt_map.get(adjust, "0")
+            
             params = {
                 "secid": secid,
                 "klt": klt,
-                "fqt": "1",  # 前复权
+                "fqt": fqt,
                 "lmt": limit,
                 "end": "20500101",
                 "fields1": "f1,f2,f3,f4,f5,f6",
@@ -183,43 +415,22 @@ class StockAPIService:
                 "ut": "fa5fd1943c7b386f172d6893dbfba10b"
             }
             
-            async with session.get(self.eastmoney_kline_url, params=params) as response:
+            async with session.get(self.eastmoney_kline_url, params=params,
+                                   timeout=http_client.timeout(ENDPOINT_KLINE)) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = _json_loads(await response.read())
                     if data.get("data") and data["data"].get("klines"):
-                        klines = []
-                        for line in data["data"]["klines"]:
-                            parts = line.split(',')
-                            if len(parts) >= 11:
-                                kline = {
-                                    "date": parts[0],
-                                    "open": float(parts[1]),
-                                    "close": float(parts[2]),
-                                    "high": float(parts[3]),
-                                    "low": float(parts[4]),
-                                    "volume": int(parts[5]),
-                                    "amount": float(parts[6]),
-                                    "amplitude": float(parts[7]),  # 振幅
-                                    "change_percent": float(parts[8]),  # 涨跌幅
-                                    "change": float(parts[9]),  # 涨跌额
-                                    "turnover_rate": float(parts[10])  # 换手率
-                                }
-                                
-                                # 日期过滤
-                                if start_date and kline["date"] < start_date:
-                                    continue
-                                if end_date and kline["date"] > end_date:
-                                    continue
-                                    
-                                klines.append(kline)
-                        
-                        return klines
+                        # 日期 + 开收高低、成交量、成交额、振幅、涨跌幅、涨跌额、换手率
+                        split = _split_rows(data["data"]["klines"], 11)
+                        if split is not None:
+                            dates, values = split
+                            return KlineSeries.from_arrays(dates, values[:, :10], limit)
             
-            return []
+            return None
             
         except Exception as e:
             logger.error(f"获取K线数据失败: {stock_code}, 错误: {str(e)}")
-            return []
+            return None
     
     async def get_fund_flow(self, stock_code: str, days: int = 10) -> List[Dict[str, Any]]:
         """
@@ -233,7 +444,7 @@ class StockAPIService:
             资金流向数据列表
         """
         try:
-            session = await self._get_session()
+            session = http_client.session(UPSTREAM_EASTMONEY)
             secid = self._get_secid(stock_code)
             
             params = {
@@ -245,26 +456,18 @@ class StockAPIService:
                 "ut": "fa5fd1943c7b386f172d6893dbfba10b"
             }
             
-            async with session.get(self.eastmoney_fund_flow_url, params=params) as response:
+            async with session.get(self.eastmoney_fund_flow_url, params=params,
+                                   timeout=http_client.timeout(ENDPOINT_KLINE)) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = _json_loads(await response.read())
                     if data.get("data") and data["data"].get("klines"):
-                        flows = []
-                        for line in data["data"]["klines"]:
-                            parts = line.split(',')
-                            if len(parts) >= 13:
-                                flows.append({
-                                    "date": parts[0],
-                                    "main_net_inflow": float(parts[1]),  # 主力净流入
-                                    "small_net_inflow": float(parts[5]),  # 小单净流入
-                                    "medium_net_inflow": float(parts[3]),  # 中单净流入
-                                    "large_net_inflow": float(parts[7]),  # 大单净流入
-                                    "super_large_net_inflow": float(parts[9]),  # 超大单净流入
-                                    "main_net_inflow_percent": float(parts[2]),  # 主力净流入占比
-                                    "close": float(parts[11]),  # 收盘价
-                                    "change_percent": float(parts[12])  # 涨跌幅
-                                })
-                        return flows
+                        split = _split_rows(data["data"]["klines"], 13)
+                        if split is not None:
+                            dates, values = split
+                            columns = {"date": dates.tolist()}
+                            for field, index in _FUND_FLOW_COLUMNS.items():
+                                columns[field] = values[:, index].tolist()
+                            return [dict(zip(columns, row)) for row in zip(*columns.values())]
             
             return []
             
@@ -276,27 +479,80 @@ class StockAPIService:
         """
         批量获取股票实时行情
         
+        使用东方财富列表行情接口，一个请求携带多只股票的 secid，
+        按 batch_size 分组后并发请求；东方财富未返回的股票再用新浪批量接口补取。
+        
         Args:
             stock_codes: 股票代码列表
             
         Returns:
             股票代码到行情数据的映射
         """
-        results = {}
+        codes = list(dict.fromkeys(stock_codes))
+        if not codes:
+            return {}
         
-        # 并发获取，但限制并发数
-        semaphore = asyncio.Semaphore(10)
+        chunks = [codes[i:i + self.batch_size] for i in range(0, len(codes), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
         
-        async def fetch_one(code: str):
+        async def fetch_chunk(chunk: List[str]) -> Dict[str, Dict[str, Any]]:
             async with semaphore:
-                quote = await self.get_realtime_quote(code)
-                if quote:
-                    results[code] = quote
+                return await self._get_eastmoney_batch(chunk)
         
-        await asyncio.gather(*[fetch_one(code) for code in stock_codes])
+        results: Dict[str, Dict[str, Any]] = {}
+        for chunk_result in await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks]):
+            results.update(chunk_result)
+        
+        # 东方财富缺失的股票统一走新浪批量接口
+        missing = [code for code in codes if code not in results]
+        if missing:
+            logger.info(f"批量行情缺失 {len(missing)} 只，使用新浪批量备用: {missing[:10]}")
+            results.update(await self._get_sina_batch(missing))
         
         return results
     
+    async def _get_eastmoney_batch(self, stock_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        一次请求获取一组股票的行情（东方财富列表行情接口）
+        
+        Args:
+            stock_codes: 股票代码列表（不超过 batch_size）
+            
+        Returns:
+            股票代码到行情数据的映射，失败时返回空字典
+        """
+        try:
+            session = http_client.session(UPSTREAM_EASTMONEY)
+            params = self.get_list_quote_params(stock_codes)
+            
+            async with session.get(self.eastmoney_batch_quote_url, params=params,
+                                   timeout=http_client.timeout(ENDPOINT_QUOTE)) as response:
+                if response.status != 200:
+                    logger.warning(f"东方财富批量行情返回状态码 {response.status}")
+                    return {}
+                data = await response.json(content_type=None)
+            
+            diff = (data.get("data") or {}).get("diff") or []
+            return _parse_batch_quotes(diff)
+            
+        except Exception as e:
+            logger.error(f"东方财富批量行情获取失败: {len(stock_codes)} 只, 错误: {str(e)}")
+            return {}
+    
+    def get_list_quote_params(self, stock_codes: List[str]) -> Dict[str, str]:
+        """东方财富列表行情请求参数（批量接口与推送接口共用）"""
+        return {
+            "fltt": "2",  # 返回已换算的小数，无需再除以100
+            "invt": "2",
+            "fields": ",".join(_BATCH_QUOTE_FIELDS),
+            "secids": ",".join(self._get_secid(code) for code in stock_codes),
+            "ut": "fa5fd1943c7b386f172d6893dbfba10b"
+        }
+    
+    def parse_list_quotes(self, rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """解析东方财富列表行情记录（f12 代码、f14 名称及各数值字段）"""
+        return _parse_batch_quotes(rows)
+    
     async def search_stock(self, keyword: str, limit: int = 10) -> List[Dict[str, str]]:
         """
         搜索股票
@@ -309,8 +565,8 @@ class StockAPIService:
             匹配的股票列表
         """
         try:
-            session = await self._get_session()
-            url = "https://searchapi.eastmoney.com/api/suggest/get"
+            session = http_client.session(UPSTREAM_EASTMONEY_SEARCH)
+            url = self.eastmoney_search_url
             
             params = {
                 "input": keyword,
@@ -319,7 +575,8 @@ class StockAPIService:
                 "count": limit
             }
             
-            async with session.get(url, params=params) as response:
+            async with session.get(url, params=params,
+                                   timeout=http_client.timeout(ENDPOINT_SEARCH)) as response:
                 if response.status == 200:
                     data = await response.json()
                     if data.get("QuotationCodeTable") and data["QuotationCodeTable"].get("Data"):
@@ -6,9 +6,17 @@ from app.schemas.stock import StockSearch
 from app.services.stock_api import stock_api_service
 from app.services.akshare_api import akshare_service
 from app.core.logging import get_logger
+from app.utils.cache import UpstreamError
 
 logger = get_logger(__name__)
 
+async def _try_quote(fetch, stock_code: str) -> Optional[Dict[str, Any]]:
+    """请求一个行情数据源，请求失败时返回 None 以便继续尝试下一个数据源"""
+    try:
+        return await fetch(stock_code)
+    except UpstreamError:
+        return None
+
 async def search_stocks(db: AsyncSession, query: str, search_type: Optional[str] = None, limit: int = 10) -> List[StockSearch]:
     """
     搜索股票 - 优先从数据库搜索，如果没有结果则使用在线API
@@ -99,13 +107,13 @@ async def get_realtime_quote(stock_code: str) -> Optional[Dict[str, Any]]:
     """
     try:
         # 首先尝试东方财富API（主数据源）
-        quote = await stock_api_service.get_realtime_quote(stock_code)
+        quote = await _try_quote(stock_api_service.get_realtime_quote, stock_code)
         if quote:
             return quote
         
         # 如果主数据源失败，尝试AkShare
         logger.info(f"主数据源失败，尝试AkShare获取行情: {stock_code}")
-        quote = await akshare_service.get_realtime_quote(stock_code)
+        quote = await _try_quote(akshare_service.get_realtime_quote, stock_code)
         if quote:
             return quote
         
@@ -132,19 +140,19 @@ async def get_realtime_quote_for_monitor(stock_code: str) -> Optional[Dict[str,
     """
     try:
         # 优先使用 AkShare 的个股专用接口（雪球数据源）
-        quote = await akshare_service.get_realtime_quote_individual(stock_code)
+        quote = await _try_quote(akshare_service.get_realtime_quote_individual, stock_code)
         if quote:
             return quote
         
         # 如果个股接口失败，回退到东方财富API
         logger.info(f"个股接口失败，回退到东方财富API: {stock_code}")
-        quote = await stock_api_service.get_realtime_quote(stock_code)
+        quote = await _try_quote(stock_api_service.get_realtime_quote, stock_code)
         if quote:
             return quote
         
         # 最后尝试 AkShare 全市场接口
         logger.info(f"东方财富API失败，尝试AkShare全市场接口: {stock_code}")
-        quote = await akshare_service.get_realtime_quote(stock_code)
+        quote = await _try_quote(akshare_service.get_realtime_quote, stock_code)
         if quote:
             return quote
         
@@ -229,8 +237,15 @@ async def get_batch_quotes(stock_codes: List[str]) -> Dict[str, Dict[str, Any]]:
         股票代码到行情数据的映射
     """
     try:
-        # 首先尝试东方财富API批量获取
-        quotes = await stock_api_service.get_batch_quotes(stock_codes)
+        # 首先从全市场快照获取，只有快照中没有的股票才请求上游
+        from app.services.market_cache import market_cache
+        quotes = market_cache.get_stocks_realtime(stock_codes)
+        remaining = [code for code in stock_codes if code not in quotes]
+        if not remaining:
+            return quotes
+        
+        # 其余股票尝试东方财富API批量获取
+        quotes.update(await stock_api_service.get_batch_quotes(remaining))
         
         # 对于获取失败的股票，尝试用AkShare单独获取
         failed_codes = [code for code in stock_codes if code not in quotes]
@@ -0,0 +1,323 @@
+"""
+全市场技术信号扫描
+把全部A股最近 N 根日K（前复权）按交易日对齐成 (股票数, 交易日数) 的收盘价矩阵，
+一次向量化计算出所有股票、所有交易日的均线交叉、RSI 超买超卖、布林带突破和 MACD 交叉，
+结果按交易日写入 indicator_signals 表。"今天哪些股票金叉"就变成一次查表，而不是几千次K线请求。
+
+- 历史矩阵每个交易日收盘后重建一次（逐只下载上游前复权K线，不下载复权因子）
+- 盘中用全市场快照的最新价作为当日这一列重新扫描，只更新当日的信号
+- 停牌日沿用前一交易日收盘价；上市不足计算周期的股票对应信号不触发
+"""
+import asyncio
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.core.logging import get_logger
+from app.database import AsyncSessionLocal
+from app.models.stock import IndicatorSignal
+from app.services.data_fetcher import data_fetcher
+from app.services.market_cache import market_cache
+from app.utils.indicators import bollinger, macd, rsi, sma_multi
+from app.utils.singleflight import SingleFlight
+
+logger = get_logger(__name__)
+
+# 信号类型 -> 说明
+SIGNAL_TYPES = {
+    "ma_golden_cross": "MA5 上穿 MA20",
+    "ma_death_cross": "MA5 下穿 MA20",
+    "rsi_overbought": "RSI14 高于 70",
+    "rsi_oversold": "RSI14 低于 30",
+    "boll_break_upper": "收盘价突破布林带上轨",
+    "boll_break_lower": "收盘价跌破布林带下轨",
+    "macd_golden_cross": "DIF 上穿 DEA",
+    "macd_death_cross": "DIF 下穿 DEA",
+}
+
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+
+
+def align_closes(
+    series: List[Tuple[np.ndarray, np.ndarray]], bars: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把各股票的 (日期数组, 收盘价数组) 对齐到共同的交易日轴
+
+    Args:
+        series: 每只股票的 (日期, 收盘价)，日期为 YYYY-MM-DD 字符串且升序
+        bars: 保留的交易日数量
+
+    Returns:
+        (交易日数组, 收盘价矩阵)，停牌日沿用前一交易日收盘价，上市前为 NaN
+    """
+    non_empty = [dates for dates, _ in series if len(dates)]
+    if not non_empty:
+        return np.array([], dtype="<U10"), np.full((len(series), 0), np.nan)
+    axis_dates = np.unique(np.concatenate(non_empty))[-bars:]
+
+    matrix = np.full((len(series), len(axis_dates)), np.nan)
+    last = len(axis_dates) - 1
+    for i, (dates, closes) in enumerate(series):
+        if not len(dates):
+            continue
+        pos = np.searchsorted(axis_dates, dates)
+        hit = axis_dates[np.minimum(pos, last)] == dates
+        matrix[i, pos[hit]] = closes[hit]
+
+    # 前向填充：每个位置取不晚于它的最近一个有效值
+    valid = ~np.isnan(matrix)
+    idx = np.where(valid, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return axis_dates, np.take_along_axis(matrix, idx, axis=1)
+
+
+def compute_signals(closes: np.ndarray) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    一次计算全部股票、全部交易日的信号
+
+    Args:
+        closes: (股票数, 交易日数) 收盘价矩阵
+
+    Returns:
+        信号类型 -> (触发矩阵, 信号值矩阵)，矩阵形状与 closes 相同
+    """
+    ma = sma_multi(closes, (5, 20))
+    dif, dea, _ = macd(closes)
+    rsi14 = rsi(closes, 14)
+    upper, _, lower = bollinger(closes, 20, 2.0)
+
+    def crossed_above(fast: np.ndarray, slow: np.ndarray) -> np.ndarray:
+        result = np.zeros(closes.shape, dtype=bool)
+        result[:, 1:] = (fast[:, 1:] > slow[:, 1:]) & (fast[:, :-1] <= slow[:, :-1])
+        return result
+
+    # NaN 参与比较结果为 False，数据不足的位置不会触发信号
+    with np.errstate(invalid="ignore"):
+        return {
+            "ma_golden_cross": (crossed_above(ma[5], ma[20]), closes),
+            "ma_death_cross": (crossed_above(ma[20], ma[5]), closes),
+            "rsi_overbought": (rsi14 > RSI_OVERBOUGHT, rsi14),
+            "rsi_oversold": (rsi14 < RSI_OVERSOLD, rsi14),
+            "boll_break_upper": (closes > upper, closes),
+            "boll_break_lower": (closes < lower, closes),
+            "macd_golden_cross": (crossed_above(dif, dea), closes),
+            "macd_death_cross": (crossed_above(dea, dif), closes),
+        }
+
+
+class UniverseScanService:
+    """全市场技术信号扫描服务"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.bars = settings.UNIVERSE_SCAN_BARS
+        self.keep_days = settings.UNIVERSE_SCAN_KEEP_DAYS
+        self.concurrency = settings.UNIVERSE_SCAN_CONCURRENCY
+        # 历史收盘价矩阵
+        self._codes: List[str] = []
+        self._dates = np.array([], dtype="<U10")
+        self._closes = np.full((0, 0), np.nan)
+        self._built_on: Optional[date] = None
+        self._flight = SingleFlight("universe_scan")
+        self._last_scan: Optional[Dict[str, Any]] = None
+
+    # ==================== 历史矩阵 ====================
+
+    async def build_history(self) -> bool:
+        """重建全市场收盘价矩阵（并发请求合并为一次）"""
+        return await self._flight.do("history", self._build_history)
+
+    async def _build_history(self) -> bool:
+        codes = market_cache.get_stock_codes()
+        if not codes:
+            await market_cache.refresh_market_data()
+            codes = market_cache.get_stock_codes()
+        if not codes:
+            logger.warning("全市场快照不可用，无法构建信号扫描矩阵")
+            return False
+
+        start = datetime.now()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def load(code: str) -> Tuple[np.ndarray, np.ndarray]:
+            # 上游前复权K线，避免逐只下载复权因子
+            async with semaphore:
+                try:
+                    series = await data_fetcher.get_adjusted_kline_series(code, "daily", limit=self.bars)
+                except Exception as e:
+                    logger.debug(f"获取 {code} K线失败: {e}")
+                    series = None
+            if series is None or not len(series):
+                return np.array([], dtype="<U10"), np.array([], dtype=np.float64)
+            return series.dates.astype("<U10"), series.columns["close"].astype(np.float64)
+
+        series = await asyncio.gather(*(load(code) for code in codes))
+        dates, closes = align_closes(series, self.bars)
+        loaded = sum(1 for d, _ in series if len(d))
+
+        self._codes, self._dates, self._closes = list(codes), dates, closes
+        self._built_on = date.today()
+        elapsed = (datetime.now() - start).total_seconds()
+        logger.info(f"信号扫描矩阵构建完成: {loaded}/{len(codes)} 只股票, {len(dates)} 个交易日, 耗时 {elapsed:.1f} 秒")
+        return loaded > 0
+
+    def _with_today(self) -> Tuple[np.ndarray, np.ndarray]:
+        """用快照最新价作为当日这一列（当日K线已在矩阵中时替换，否则追加）"""
+        today = date.today().isoformat()
+        prices = market_cache.get_price_column(self._codes)
+        if len(self._dates) and self._dates[-1] == today:
+            closes = self._closes.copy()
+            closes[:, -1] = np.where(np.isnan(prices), closes[:, -1], prices)
+            return self._dates, closes
+        previous = self._closes[:, -1] if self._closes.shape[1] else np.full(len(self._codes), np.nan)
+        column = np.where(np.isnan(prices), previous, prices)
+        dates = np.append(self._dates, today)
+        closes = np.concatenate([self._closes, column[:, None]], axis=1)
+        return dates[-self.bars:], closes[:, -self.bars:]
+
+    # ==================== 扫描 ====================
+
+    async def run_scan(self, intraday: bool = False) -> bool:
+        """
+        扫描并保存信号
+
+        Args:
+            intraday: 盘中扫描，只更新当日信号；否则重建矩阵并写入最近 keep_days 个交易日
+        """
+        try:
+            if not intraday or self._built_on is None:
+                if not await self.build_history():
+                    return False
+
+            if intraday:
+                dates, closes = self._with_today()
+                days = 1
+            else:
+                dates, closes = self._dates, self._closes
+                days = self.keep_days
+            if not len(dates):
+                return False
+            days = min(days, len(dates))
+
+            start = datetime.now()
+            signals = compute_signals(closes)
+            rows = self._collect(dates, signals, days)
+            target_dates = [date.fromisoformat(d) for d in dates[-days:].tolist()]
+            async with AsyncSessionLocal() as db:
+                await self._save(db, target_dates, rows)
+
+            elapsed = (datetime.now() - start).total_seconds()
+            self._last_scan = {
+                "scanned_at": datetime.now().isoformat(),
+                "stock_count": len(self._codes),
+                "dates": [d.isoformat() for d in target_dates],
+                "signal_count": len(rows),
+                "elapsed": round(elapsed, 3),
+            }
+            logger.info(f"全市场信号扫描完成: {len(rows)} 条信号, 交易日 {target_dates[0]}~{target_dates[-1]}, 耗时 {elapsed:.2f} 秒")
+            return True
+        except Exception as e:
+            logger.error(f"全市场信号扫描失败: {str(e)}")
+            return False
+
+    def _collect(
+        self, dates: np.ndarray, signals: Dict[str, Tuple[np.ndarray, np.ndarray]], days: int
+    ) -> List[Dict[str, Any]]:
+        """取最近 days 个交易日的触发记录"""
+        codes = np.array(self._codes)
+        first = len(dates) - days
+        rows = []
+        for signal_type, (hits, values) in signals.items():
+            stock_idx, day_idx = np.nonzero(hits[:, first:])
+            day_idx = day_idx + first
+            for code, day, value in zip(
+                codes[stock_idx].tolist(),
+                dates[day_idx].tolist(),
+                np.round(values[stock_idx, day_idx], 4).tolist(),
+            ):
+                rows.append({
+                    "trade_date": date.fromisoformat(day),
+                    "signal_type": signal_type,
+                    "stock_code": code,
+                    "value": value,
+                })
+        return rows
+
+    @staticmethod
+    async def _save(db: AsyncSession, trade_dates: List[date], rows: List[Dict[str, Any]]) -> None:
+        """整日替换：先删除这些交易日的旧信号再批量写入"""
+        await db.execute(delete(IndicatorSignal).where(IndicatorSignal.trade_date.in_(trade_dates)))
+        if rows:
+            await db.execute(insert(IndicatorSignal), rows)
+        await db.commit()
+
+    # ==================== 查询 ====================
+
+    @staticmethod
+    async def latest_trade_date(db: AsyncSession) -> Optional[date]:
+        """已有信号的最近交易日"""
+        result = await db.execute(select(func.max(IndicatorSignal.trade_date)))
+        return result.scalar()
+
+    async def get_signals(
+        self, db: AsyncSession, signal_type: str, trade_date: Optional[date] = None, limit: int = 200
+    ) -> Dict[str, Any]:
+        """
+        查询某个交易日触发某种信号的股票
+
+        Returns:
+            {"date": 交易日, "signal": 信号类型, "stocks": [{code, name, value, price, change_percent}]}
+        """
+        trade_date = trade_date or await self.latest_trade_date(db)
+        if trade_date is None:
+            return {"date": None, "signal": signal_type, "stocks": []}
+
+        result = await db.execute(
+            select(IndicatorSignal.stock_code, IndicatorSignal.value)
+            .where(IndicatorSignal.trade_date == trade_date, IndicatorSignal.signal_type == signal_type)
+            .order_by(IndicatorSignal.stock_code)
+            .limit(limit)
+        )
+        hits = result.all()
+        quotes = market_cache.get_stocks_realtime([code for code, _ in hits])
+        stocks = []
+        for code, value in hits:
+            quote = quotes.get(code, {})
+            stocks.append({
+                "code": code,
+                "name": quote.get("name"),
+                "value": float(value) if value is not None else None,
+                "price": quote.get("price"),
+                "change_percent": quote.get("change_percent"),
+            })
+        return {"date": trade_date.isoformat(), "signal": signal_type, "stocks": stocks}
+
+    async def get_summary(self, db: AsyncSession, trade_date: Optional[date] = None) -> Dict[str, Any]:
+        """某个交易日各信号的触发股票数"""
+        trade_date = trade_date or await self.latest_trade_date(db)
+        counts = {signal_type: 0 for signal_type in SIGNAL_TYPES}
+        if trade_date is not None:
+            result = await db.execute(
+                select(IndicatorSignal.signal_type, func.count())
+                .where(IndicatorSignal.trade_date == trade_date)
+                .group_by(IndicatorSignal.signal_type)
+            )
+            counts.update({signal_type: count for signal_type, count in result.all()})
+        return {
+            "date": trade_date.isoformat() if trade_date else None,
+            "signals": [
+                {"signal": signal_type, "description": SIGNAL_TYPES[signal_type], "count": counts[signal_type]}
+                for signal_type in SIGNAL_TYPES
+            ],
+            "last_scan": self._last_scan,
+        }
+
+
+# 全局单例
+universe_scan = UniverseScanService()
@@ -0,0 +1,37 @@
+"""
+缓存工具
+"""
+
+
+class _KnownEmpty:
+    """
+    负缓存标记：表示数据源已确认没有数据（北交所、退市、停牌股票，空新闻、空K线等）
+
+    与"缓存未命中"（None）区分开，命中该标记时直接返回空结果，不再请求上游。
+    布尔值为 False，沿用 `if cached:` 判断的旧代码会把它当作未命中，不会误当成数据返回。
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return "KNOWN_EMPTY"
+
+
+KNOWN_EMPTY = _KnownEmpty()
+
+
+class UpstreamError(Exception):
+    """
+    数据源请求失败（网络错误、超时、非 200 状态码、接口异常等）
+
+    与"数据源确认没有数据"（返回 None）区分开：请求失败的结果不能写入负缓存，
+    只有所有数据源都正常返回且都没有数据时才记为 KNOWN_EMPTY。
+    """
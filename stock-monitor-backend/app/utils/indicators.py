@@ -1,198 +1,467 @@
 """
 技术指标计算工具函数
 统一的技术指标计算逻辑，避免代码重复
+
+计算基于 numpy 数组，沿最后一维（时间）计算，既可以传入单只股票的收盘价序列，
+也可以传入 (股票数, K线数) 的二维数组一次算出多只股票：
+- 移动平均：累计和相减，O(n)，多个周期共用一次累计和
+- EMA / RSI / MACD：一阶递推滤波，以前 period 个值的简单平均作为初值
+- 布林带：累计和与累计平方和得到滚动方差
+数据不足的位置为 NaN；开头为 NaN 的行（如上市较晚的股票）从该行第一个有效值开始计算，
+NaN 只影响各自的预热区间。calculate_* 系列函数保持原有的返回格式（列表、None 占位、保留两位小数）。
 """
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+import warnings
+import numpy as np
+
+
+# ==================== 数组计算 ====================
+
+def closes_array(klines: List[dict], field: str = "close") -> np.ndarray:
+    """K线列表转换为 float64 数组"""
+    return np.fromiter((kline[field] for kline in klines), dtype=np.float64, count=len(klines))
+
+
+def sma(values: np.ndarray, period: int) -> np.ndarray:
+    """简单移动平均，前 period-1 个位置为 NaN"""
+    return sma_multi(values, (period,))[period]
+
+
+def _nan_cumsum(values: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    沿时间轴的累计和（首位补 0，NaN 按 0 累计）
+
+    Returns:
+        (累计和, NaN 个数的累计和)，没有 NaN 时后者为 None；
+        窗口内 NaN 个数大于 0 的窗口结果应视为 NaN
+    """
+    n = values.shape[-1]
+    missing = np.isnan(values)
+    has_missing = bool(missing.any())
+    csum = np.zeros(values.shape[:-1] + (n + 1,))
+    np.cumsum(np.where(missing, 0.0, values) if has_missing else values, axis=-1, out=csum[..., 1:])
+    if not has_missing:
+        return csum, None
+    counts = np.zeros(values.shape[:-1] + (n + 1,), dtype=np.int64)
+    np.cumsum(missing, axis=-1, out=counts[..., 1:])
+    return csum, counts
+
+
+def _window_diff(csum: np.ndarray, counts: Optional[np.ndarray], period: int) -> np.ndarray:
+    """由累计和得到长度为 period 的滚动窗口和，包含 NaN 的窗口为 NaN"""
+    window = csum[..., period:] - csum[..., :-period]
+    if counts is not None:
+        window[(counts[..., period:] - counts[..., :-period]) > 0] = np.nan
+    return window
+
+
+def sma_multi(values: np.ndarray, periods: Iterable[int]) -> Dict[int, np.ndarray]:
+    """
+    多个周期的简单移动平均（共用一次累计和）
+
+    Returns:
+        周期 -> 均线数组
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    csum, counts = _nan_cumsum(values)
+
+    result = {}
+    for period in periods:
+        out = np.full(values.shape, np.nan)
+        if 0 < period <= n:
+            out[..., period - 1:] = _window_diff(csum, counts, period) / period
+        result[period] = out
+    return result
+
+
+def _recursive_filter(values: np.ndarray, alpha: float, start: int) -> np.ndarray:
+    """
+    一阶递推滤波 y[t] = y[t-1] + alpha * (x[t] - y[t-1])，从 start 位置开始，y[start] = x[start]
+
+    递推只能按时间逐步进行：单只股票用浮点数循环，多只股票每一步对整列做向量运算。
+    start 之前为 NaN
+    """
+    out = np.full(values.shape, np.nan)
+    n = values.shape[-1]
+    if start >= n:
+        return out
+
+    if values.ndim == 1:
+        y = float(values[start])
+        smoothed = []
+        for x in values[start:].tolist():
+            y += alpha * (x - y)
+            smoothed.append(y)
+        out[start:] = smoothed
+        return out
+
+    series = np.moveaxis(values, -1, 0)  # (时间, ...)
+    target = np.moveaxis(out, -1, 0)
+    y = series[start].copy()
+    target[start] = y
+    decay = 1 - alpha
+    for t in range(start + 1, n):
+        y *= decay
+        y += alpha * series[t]
+        target[t] = y
+    return out
+
+
+def _seeded_filter(values: np.ndarray, period: int, alpha: float, offset: int = 0) -> np.ndarray:
+    """
+    以前 period 个有效值的简单平均为初值的递推滤波（EMA、Wilder 平滑共用）
+
+    offset 用于跳过输入开头的 NaN（如 MACD 的 DIF）；二维输入中各行开头 NaN 个数不同时，
+    每行从自己的第一个有效值开始取初值
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    starts = _first_valid(values) if values.ndim > 1 else None
+    if starts is None or (starts <= offset).all():
+        start = offset + period - 1
+        if start >= n:
+            return np.full(values.shape, np.nan)
+        seeded = values.copy()
+        seeded[..., start] = values[..., offset:start + 1].mean(axis=-1)
+        return _recursive_filter(seeded, alpha, start)
+
+    # 各行初值位置不同：初值由累计和取出，递推时每行在自己的初值位置接入
+    starts = np.maximum(starts, offset) + period - 1
+    flat = values.reshape(-1, n)
+    starts = starts.reshape(-1)
+    csum, _ = _nan_cumsum(flat)
+    ready = starts < n
+    at = np.minimum(starts, n - 1)[:, None]
+    seed = (np.take_along_axis(csum, at + 1, axis=-1) - np.take_along_axis(csum, at + 1 - period, axis=-1))[:, 0] / period
+
+    out = np.full(flat.shape, np.nan)
+    if not ready.any():
+        return out.reshape(values.shape)
+    y = np.full(len(flat), np.nan)
+    decay = 1 - alpha
+    for t in range(int(starts[ready].min()), n):
+        y *= decay
+        y += alpha * flat[:, t]
+        begin = starts == t
+        y[begin] = seed[begin]
+        out[:, t] = y
+    return out.reshape(values.shape)
+
+
+def _first_valid(values: np.ndarray) -> np.ndarray:
+    """每行第一个非 NaN 值的位置，整行为 NaN 时为行长度"""
+    valid = ~np.isnan(values)
+    return np.where(valid.any(axis=-1), valid.argmax(axis=-1), values.shape[-1])
+
+
+def ema(values: np.ndarray, period: int, offset: int = 0) -> np.ndarray:
+    """指数移动平均，首个值为前 period 个值的简单平均"""
+    return _seeded_filter(values, period, 2 / (period + 1), offset)
+
+
+def rsi(values: np.ndarray, period: int = 14) -> np.ndarray:
+    """相对强弱指标（Wilder 平滑），前 period 个位置为 NaN；没有下跌时为 100"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < period + 1:
+        return out
+    changes = np.diff(values, axis=-1)
+    avg_gain = _seeded_filter(np.maximum(changes, 0), period, 1 / period)
+    avg_loss = _seeded_filter(np.maximum(-changes, 0), period, 1 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = 100 - 100 / (1 + avg_gain / avg_loss)
+    result = np.where(avg_loss == 0, 100.0, result)
+    result[np.isnan(avg_gain)] = np.nan
+    out[..., 1:] = result
+    return out
+
+
+def macd(
+    values: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    MACD 指标
+
+    Returns:
+        (DIF, DEA, MACD柱)，MACD柱 = (DIF - DEA) * 2
+    """
+    values = np.asarray(values, dtype=np.float64)
+    dif = ema(values, fast) - ema(values, slow)
+    dea = ema(dif, signal, offset=slow - 1)
+    return dif, dea, (dif - dea) * 2
+
+
+def bollinger(
+    values: np.ndarray, period: int = 20, std_dev: float = 2.0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    布林带（总体标准差）
+
+    Returns:
+        (上轨, 中轨, 下轨)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    upper = np.full(values.shape, np.nan)
+    middle = np.full(values.shape, np.nan)
+    lower = np.full(values.shape, np.nan)
+    if n < period:
+        return upper, middle, lower
+
+    # 先减去整体均值再累计，降低累计平方和的数值误差
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # 整行为 NaN 时 nanmean 告警
+        offset = np.nanmean(values, axis=-1, keepdims=True)
+    centered = values - offset
+    csum, counts = _nan_cumsum(centered)
+    csq, _ = _nan_cumsum(centered * centered)
+    window_sum = _window_diff(csum, counts, period)
+    window_sq = _window_diff(csq, counts, period)
+    mean = window_sum / period
+    std = np.sqrt(np.maximum(window_sq / period - mean * mean, 0))
 
+    ma = mean + offset
+    middle[..., period - 1:] = ma
+    upper[..., period - 1:] = ma + std_dev * std
+    lower[..., period - 1:] = ma - std_dev * std
+    return upper, middle, lower
+
+
+def _rolling_extreme(values: np.ndarray, period: int, func) -> np.ndarray:
+    """滚动最大/最小值，前 period-1 个位置为 NaN"""
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(values, period, axis=-1)
+        out[..., period - 1:] = func(windows, axis=-1)
+    return out
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """平均真实波幅（Wilder 平滑），真实波幅从第二根K线开始计算"""
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    out = np.full(close.shape, np.nan)
+    if close.shape[-1] < period + 1:
+        return out
+    prev_close = close[..., :-1]
+    true_range = np.maximum.reduce([
+        high[..., 1:] - low[..., 1:],
+        np.abs(high[..., 1:] - prev_close),
+        np.abs(low[..., 1:] - prev_close),
+    ])
+    out[..., 1:] = _seeded_filter(true_range, period, 1 / period)
+    return out
+
+
+def kdj(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, n: int = 9, m1: int = 3, m2: int = 3
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    KDJ 随机指标（K、D 以 50 为初值，平滑系数 1/m1、1/m2）
+
+    Returns:
+        (K, D, J)
+    """
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    shape = close.shape
+    if shape[-1] < n:
+        nan = np.full(shape, np.nan)
+        return nan, nan.copy(), nan.copy()
+    highest = _rolling_extreme(high, n, np.max)
+    lowest = _rolling_extreme(low, n, np.min)
+    span = highest - lowest
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsv = np.where(span > 0, (close - lowest) / span * 100, 50.0)
+    rsv[..., :n - 1] = np.nan
+
+    start = n - 1
+
+    def smooth(values: np.ndarray, m: int) -> np.ndarray:
+        seeded = values.copy()
+        seeded[..., start] = 50 + (values[..., start] - 50) / m
+        return _recursive_filter(seeded, 1 / m, start)
+
+    k = smooth(rsv, m1)
+    d = smooth(k, m2)
+    return k, d, 3 * k - 2 * d
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """能量潮：上涨日累加成交量，下跌日减去成交量，首根为 0"""
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    out = np.zeros(close.shape)
+    if close.shape[-1] > 1:
+        direction = np.sign(np.diff(close, axis=-1))
+        np.cumsum(direction * volume[..., 1:], axis=-1, out=out[..., 1:])
+    return out
+
+
+def volume_ratio(volume: np.ndarray, period: int = 5) -> np.ndarray:
+    """量比：当根成交量 / 之前 period 根的平均成交量，前 period 个位置为 NaN"""
+    volume = np.asarray(volume, dtype=np.float64)
+    out = np.full(volume.shape, np.nan)
+    if volume.shape[-1] <= period:
+        return out
+    average = sma(volume, period)[..., period - 1:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[..., period:] = np.where(average > 0, volume[..., period:] / average, np.nan)
+    return out
+
+
+def to_list(values: np.ndarray, digits: int = 2) -> List[Optional[float]]:
+    """一维数组转换为保留小数的列表，NaN 转为 None"""
+    rounded = np.round(values, digits)
+    return [None if v != v else v for v in rounded.tolist()]
+
+
+# ==================== K线列表接口（保持原有返回格式） ====================
 
 def calculate_ma(klines: List[dict], period: int) -> List[Optional[float]]:
     """
     计算移动平均线 (Moving Average)
-    
+
     Args:
         klines: K线数据列表，每个元素需包含 'close' 字段
         period: 计算周期
-        
+
     Returns:
         移动平均线数值列表，前 period-1 个值为 None
     """
     if not klines or len(klines) < period:
         return []
-    
-    ma_values = []
-    for i in range(len(klines)):
-        if i < period - 1:
-            ma_values.append(None)
-        else:
-            sum_close = sum(kline["close"] for kline in klines[i-period+1:i+1])
-            ma_values.append(round(sum_close / period, 2))
-    
-    return ma_values
+    return to_list(sma(closes_array(klines), period))
+
+
+def calculate_ma_lines(klines: List[dict], periods: Iterable[int]) -> Dict[str, List[Optional[float]]]:
+    """
+    一次计算多条均线
+
+    Args:
+        klines: K线数据列表
+        periods: 周期列表，如 (5, 10, 20)
+
+    Returns:
+        {"ma5": [...], "ma10": [...]}，数据不足的周期为空列表
+    """
+    periods = list(periods)
+    if not klines:
+        return {f"ma{period}": [] for period in periods}
+    lines = sma_multi(closes_array(klines), periods)
+    return {
+        f"ma{period}": to_list(lines[period]) if len(klines) >= period else []
+        for period in periods
+    }
 
 
 def calculate_ema(klines: List[dict], period: int) -> List[Optional[float]]:
     """
     计算指数移动平均线 (Exponential Moving Average)
-    
+
     Args:
         klines: K线数据列表
         period: 计算周期
-        
+
     Returns:
         EMA数值列表
     """
     if not klines or len(klines) < period:
         return []
-    
-    multiplier = 2 / (period + 1)
-    ema_values = []
-    
-    # 第一个EMA值使用SMA
-    first_sma = sum(kline["close"] for kline in klines[:period]) / period
-    ema_values.extend([None] * (period - 1))
-    ema_values.append(round(first_sma, 2))
-    
-    # 后续使用EMA公式
-    for i in range(period, len(klines)):
-        ema = (klines[i]["close"] - ema_values[-1]) * multiplier + ema_values[-1]
-        ema_values.append(round(ema, 2))
-    
-    return ema_values
+    return to_list(ema(closes_array(klines), period))
 
 
 def calculate_rsi(klines: List[dict], period: int = 14) -> List[Optional[float]]:
     """
     计算相对强弱指标 (Relative Strength Index)
-    
+
     Args:
         klines: K线数据列表
         period: 计算周期，默认14
-        
+
     Returns:
         RSI数值列表
     """
     if not klines or len(klines) < period + 1:
         return []
-    
-    rsi_values = [None] * period
-    
-    # 计算价格变化
-    changes = []
-    for i in range(1, len(klines)):
-        changes.append(klines[i]["close"] - klines[i-1]["close"])
-    
-    # 计算初始平均涨跌
-    gains = [max(0, c) for c in changes[:period]]
-    losses = [abs(min(0, c)) for c in changes[:period]]
-    
-    avg_gain = sum(gains) / period
-    avg_loss = sum(losses) / period
-    
-    if avg_loss == 0:
-        rsi_values.append(100.0)
-    else:
-        rs = avg_gain / avg_loss
-        rsi_values.append(round(100 - (100 / (1 + rs)), 2))
-    
-    # 计算后续RSI
-    for i in range(period, len(changes)):
-        gain = max(0, changes[i])
-        loss = abs(min(0, changes[i]))
-        
-        avg_gain = (avg_gain * (period - 1) + gain) / period
-        avg_loss = (avg_loss * (period - 1) + loss) / period
-        
-        if avg_loss == 0:
-            rsi_values.append(100.0)
-        else:
-            rs = avg_gain / avg_loss
-            rsi_values.append(round(100 - (100 / (1 + rs)), 2))
-    
-    return rsi_values
+    return to_list(rsi(closes_array(klines), period))
 
 
 def calculate_macd(klines: List[dict], fast: int = 12, slow: int = 26, signal: int = 9) -> dict:
     """
     计算MACD指标
-    
+
     Args:
         klines: K线数据列表
         fast: 快线周期，默认12
         slow: 慢线周期，默认26
         signal: 信号线周期，默认9
-        
+
     Returns:
         包含 dif, dea, macd 的字典
     """
     if not klines or len(klines) < slow:
         return {"dif": [], "dea": [], "macd": []}
-    
-    # 计算快慢EMA
-    ema_fast = calculate_ema(klines, fast)
-    ema_slow = calculate_ema(klines, slow)
-    
-    # 计算DIF
-    dif = []
-    for i in range(len(klines)):
-        if ema_fast[i] is None or ema_slow[i] is None:
-            dif.append(None)
-        else:
-            dif.append(round(ema_fast[i] - ema_slow[i], 2))
-    
-    # 计算DEA (DIF的EMA)
-    dif_for_dea = [{"close": d} for d in dif if d is not None]
-    dea_raw = calculate_ema(dif_for_dea, signal) if len(dif_for_dea) >= signal else []
-    
-    # 对齐DEA
-    dea = [None] * (len(dif) - len(dea_raw)) + dea_raw
-    
-    # 计算MACD柱
-    macd = []
-    for i in range(len(dif)):
-        if dif[i] is None or dea[i] is None:
-            macd.append(None)
-        else:
-            macd.append(round((dif[i] - dea[i]) * 2, 2))
-    
-    return {"dif": dif, "dea": dea, "macd": macd}
+
+    dif, dea, hist = macd(closes_array(klines), fast, slow, signal)
+    return {"dif": to_list(dif), "dea": to_list(dea), "macd": to_list(hist)}
 
 
 def calculate_bollinger_bands(klines: List[dict], period: int = 20, std_dev: float = 2.0) -> dict:
     """
     计算布林带 (Bollinger Bands)
-    
+
     Args:
         klines: K线数据列表
         period: 计算周期，默认20
         std_dev: 标准差倍数，默认2
-        
+
     Returns:
         包含 upper, middle, lower 的字典
     """
     if not klines or len(klines) < period:
         return {"upper": [], "middle": [], "lower": []}
-    
-    import math
-    
-    upper = []
-    middle = []
-    lower = []
-    
-    for i in range(len(klines)):
-        if i < period - 1:
-            upper.append(None)
-            middle.append(None)
-            lower.append(None)
-        else:
-            closes = [kline["close"] for kline in klines[i-period+1:i+1]]
-            ma = sum(closes) / period
-            
-            # 计算标准差
-            variance = sum((c - ma) ** 2 for c in closes) / period
-            std = math.sqrt(variance)
-            
-            middle.append(round(ma, 2))
-            upper.append(round(ma + std_dev * std, 2))
-            lower.append(round(ma - std_dev * std, 2))
-    
-    return {"upper": upper, "middle": middle, "lower": lower}
+
+    upper, middle, lower = bollinger(closes_array(klines), period, std_dev)
+    return {"upper": to_list(upper), "middle": to_list(middle), "lower": to_list(lower)}
+
+
+def calculate_technical_summary(klines: List[dict], volume_period: int = 5) -> dict:
+    """
+    计算最新一根K线的常用技术指标（一次读取K线列，所有指标共用）
+
+    Args:
+        klines: K线数据列表，需包含 high、low、close、volume 字段
+        volume_period: 量比的平均成交量周期
+
+    Returns:
+        ma5/ma10/ma20/ma60、rsi、macd、boll、atr、kdj、obv、volume_ratio、current_price，
+        数据不足的指标为 None
+    """
+    if not klines:
+        return {}
+    close = closes_array(klines)
+    high = closes_array(klines, "high")
+    low = closes_array(klines, "low")
+    volume = closes_array(klines, "volume")
+
+    def last(values: np.ndarray, digits: int = 2) -> Optional[float]:
+        value = float(values[-1])
+        return None if value != value else round(value, digits)
+
+    ma_lines = sma_multi(close, (5, 10, 20, 60))
+    dif, dea, hist = macd(close)
+    upper, middle, lower = bollinger(close)
+    k, d, j = kdj(high, low, close)
+
+    summary = {f"ma{period}": last(line) for period, line in ma_lines.items()}
+    summary.update({
+        "rsi": last(rsi(close)),
+        "macd": {"dif": last(dif), "dea": last(dea), "macd": last(hist)},
+        "boll": {"upper": last(upper), "middle": last(middle), "lower": last(lower)},
+        "atr": last(atr(high, low, close)),
+        "kdj": {"k": last(k), "d": last(d), "j": last(j)},
+        "obv": int(obv(close, volume)[-1]),
+        "volume_ratio": last(volume_ratio(volume, volume_period)),
+        "current_price": float(close[-1]),
+    })
+    return summary
@@ -0,0 +1,109 @@
+"""
+并发请求合并（single flight）
+同一时刻对同一数据的多个请求只向上游发起一次，其余请求等待并共享同一个结果。
+请求在独立任务中执行，单个调用方被取消不会影响其他等待者。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+
+from app.core.metrics import metrics
+
+
+class SingleFlight:
+    """按请求键合并并发请求"""
+
+    def __init__(self, group: str):
+        """
+        Args:
+            group: 分组名称，用于指标标签
+        """
+        self.group = group
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def inflight(self) -> int:
+        """正在执行的请求数"""
+        return len(self._calls)
+
+    def _record(self, executed: int, coalesced: int) -> None:
+        if executed:
+            metrics.inc("singleflight_calls_total", executed, group=self.group, result="executed")
+        if coalesced:
+            metrics.inc("singleflight_calls_total", coalesced, group=self.group, result="coalesced")
+        metrics.set_gauge("singleflight_inflight", len(self._calls), group=self.group)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        metrics.set_gauge("singleflight_inflight", len(self._calls), group=self.group)
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        执行请求；同一 key 已有请求在执行时直接等待其结果
+
+        Args:
+            key: 规范化的请求键（同样的数据必须得到同样的键）
+            func: 异步函数
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self._record(0, 1)
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(func(*args, **kwargs))
+        self._calls[key] = future
+        future.add_done_callback(lambda f: self._forget(key, f))
+        self._record(1, 0)
+        return await asyncio.shield(future)
+
+    async def do_many(
+        self,
+        namespace: str,
+        keys: Iterable[Hashable],
+        func: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ) -> Dict[Hashable, Any]:
+        """
+        批量请求：已在执行中的 key 等待原请求，其余 key 合并为一次 func 调用
+
+        Args:
+            namespace: 批量请求的命名空间，与 key 组合成请求键
+            keys: 请求的全部 key
+            func: 接收未在执行中的 key 列表，返回 key -> 结果 的映射
+
+        Returns:
+            key -> 结果（func 没有返回的 key 为 None）
+        """
+        loop = asyncio.get_running_loop()
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        own: List[Hashable] = []
+        for key in dict.fromkeys(keys):
+            future = self._calls.get((namespace, key))
+            if future is not None:
+                waiting[key] = future
+            else:
+                own.append(key)
+
+        if own:
+            futures = {key: loop.create_future() for key in own}
+            for key, future in futures.items():
+                self._calls[(namespace, key)] = future
+                future.add_done_callback(lambda f, k=(namespace, key): self._forget(k, f))
+
+            def _resolve(task: asyncio.Task) -> None:
+                for key, future in futures.items():
+                    if future.done():
+                        continue
+                    if task.cancelled():
+                        future.cancel()
+                    elif task.exception() is not None:
+                        future.set_exception(task.exception())
+                    else:
+                        future.set_result((task.result() or {}).get(key))
+
+            asyncio.ensure_future(func(own)).add_done_callback(_resolve)
+            waiting.update(futures)
+
+        self._record(1 if own else 0, len(waiting) - len(own))
+        keys_order = list(waiting)
+        values = await asyncio.gather(*(asyncio.shield(waiting[k]) for k in keys_order))
+        return dict(zip(keys_order, values))
@@ -0,0 +1,331 @@
+"""
+增量技术指标
+用历史K线初始化后，每来一根新K线或盘中最后一根K线价格变化时 O(1) 更新最新指标值，
+不需要重新计算整段序列。计算口径与 app/utils/indicators.py 一致：
+- EMA / Wilder 平滑以前 period 个值的简单平均为初值
+- MACD 柱 = (DIF - DEA) * 2，DEA 从 DIF 可计算后的第 signal 根开始
+- 布林带使用总体标准差
+
+每个指标对象提供：
+    update(value)        追加一根新K线
+    replace_last(value)  修正最后一根（盘中未收盘）K线
+    seed(values)         用历史序列初始化
+数据不足时指标值为 None。
+"""
+import math
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Any
+
+
+class MovingAverage:
+    """简单移动平均"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self._window: Deque[float] = deque()
+        self._sum = 0.0
+
+    def seed(self, values: Iterable[float]) -> "MovingAverage":
+        for value in values:
+            self.update(value)
+        return self
+
+    def update(self, value: float) -> None:
+        self._window.append(value)
+        self._sum += value
+        if len(self._window) > self.period:
+            self._sum -= self._window.popleft()
+
+    def replace_last(self, value: float) -> None:
+        if not self._window:
+            self.update(value)
+            return
+        self._sum += value - self._window[-1]
+        self._window[-1] = value
+
+    @property
+    def value(self) -> Optional[float]:
+        if len(self._window) < self.period:
+            return None
+        return self._sum / self.period
+
+
+class SeededFilter:
+    """
+    以前 period 个值的简单平均为初值的一阶递推滤波
+    y = y_prev + alpha * (x - y_prev)，EMA 与 Wilder 平滑共用
+    """
+
+    def __init__(self, period: int, alpha: float):
+        self.period = period
+        self.alpha = alpha
+        self._count = 0
+        self._seed_sum = 0.0  # 初值阶段的累计和
+        self._last_input = 0.0
+        self._prev: Optional[float] = None  # 最后一根之前的值
+        self._value: Optional[float] = None
+
+    def seed(self, values: Iterable[float]) -> "SeededFilter":
+        for value in values:
+            self.update(value)
+        return self
+
+    def update(self, value: float) -> None:
+        self._count += 1
+        if self._count <= self.period:
+            self._seed_sum += value
+            if self._count == self.period:
+                self._value = self._seed_sum / self.period
+        else:
+            self._prev = self._value
+            self._value = self._prev + self.alpha * (value - self._prev)
+        self._last_input = value
+
+    def replace_last(self, value: float) -> None:
+        if self._count == 0:
+            self.update(value)
+            return
+        if self._count <= self.period:
+            self._seed_sum += value - self._last_input
+            if self._count == self.period:
+                self._value = self._seed_sum / self.period
+        else:
+            self._value = self._prev + self.alpha * (value - self._prev)
+        self._last_input = value
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._value
+
+
+class ExponentialMovingAverage(SeededFilter):
+    """指数移动平均"""
+
+    def __init__(self, period: int):
+        super().__init__(period, 2 / (period + 1))
+
+
+class RSI:
+    """相对强弱指标（Wilder 平滑）"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self._gain = SeededFilter(period, 1 / period)
+        self._loss = SeededFilter(period, 1 / period)
+        self._prev_close: Optional[float] = None  # 最后一根之前的收盘价
+        self._last_close: Optional[float] = None
+
+    def seed(self, values: Iterable[float]) -> "RSI":
+        for value in values:
+            self.update(value)
+        return self
+
+    def update(self, value: float) -> None:
+        self._prev_close = self._last_close
+        self._last_close = value
+        if self._prev_close is not None:
+            change = value - self._prev_close
+            self._gain.update(max(change, 0.0))
+            self._loss.update(max(-change, 0.0))
+
+    def replace_last(self, value: float) -> None:
+        if self._last_close is None:
+            self.update(value)
+            return
+        self._last_close = value
+        if self._prev_close is not None:
+            change = value - self._prev_close
+            self._gain.replace_last(max(change, 0.0))
+            self._loss.replace_last(max(-change, 0.0))
+
+    @property
+    def value(self) -> Optional[float]:
+        gain, loss = self._gain.value, self._loss.value
+        if gain is None or loss is None:
+            return None
+        if loss == 0:
+            return 100.0
+        return 100 - 100 / (1 + gain / loss)
+
+
+class MACD:
+    """MACD 指标"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self._fast = ExponentialMovingAverage(fast)
+        self._slow = ExponentialMovingAverage(slow)
+        self._signal = ExponentialMovingAverage(signal)
+        self._last_fed = False  # 最后一根K线的 DIF 是否已计入 DEA
+
+    def seed(self, values: Iterable[float]) -> "MACD":
+        for value in values:
+            self.update(value)
+        return self
+
+    def update(self, value: float) -> None:
+        self._fast.update(value)
+        self._slow.update(value)
+        dif = self.dif
+        self._last_fed = dif is not None
+        if dif is not None:
+            self._signal.update(dif)
+
+    def replace_last(self, value: float) -> None:
+        self._fast.replace_last(value)
+        self._slow.replace_last(value)
+        dif = self.dif
+        if dif is None:
+            return
+        if self._last_fed:
+            self._signal.replace_last(dif)
+        else:
+            self._signal.update(dif)
+            self._last_fed = True
+
+    @property
+    def dif(self) -> Optional[float]:
+        fast, slow = self._fast.value, self._slow.value
+        if fast is None or slow is None:
+            return None
+        return fast - slow
+
+    @property
+    def dea(self) -> Optional[float]:
+        return self._signal.value
+
+    @property
+    def histogram(self) -> Optional[float]:
+        dif, dea = self.dif, self.dea
+        if dif is None or dea is None:
+            return None
+        return (dif - dea) * 2
+
+
+class BollingerBands:
+    """布林带"""
+
+    def __init__(self, period: int = 20, std_dev: float = 2.0):
+        self.period = period
+        self.std_dev = std_dev
+        self._window: Deque[float] = deque()
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    def seed(self, values: Iterable[float]) -> "BollingerBands":
+        for value in values:
+            self.update(value)
+        return self
+
+    def update(self, value: float) -> None:
+        self._window.append(value)
+        self._sum += value
+        self._sum_sq += value * value
+        if len(self._window) > self.period:
+            dropped = self._window.popleft()
+            self._sum -= dropped
+            self._sum_sq -= dropped * dropped
+
+    def replace_last(self, value: float) -> None:
+        if not self._window:
+            self.update(value)
+            return
+        last = self._window[-1]
+        self._sum += value - last
+        self._sum_sq += value * value - last * last
+        self._window[-1] = value
+
+    @property
+    def middle(self) -> Optional[float]:
+        if len(self._window) < self.period:
+            return None
+        return self._sum / self.period
+
+    @property
+    def std(self) -> Optional[float]:
+        mean = self.middle
+        if mean is None:
+            return None
+        return math.sqrt(max(self._sum_sq / self.period - mean * mean, 0.0))
+
+    @property
+    def upper(self) -> Optional[float]:
+        mean = self.middle
+        return None if mean is None else mean + self.std_dev * self.std
+
+    @property
+    def lower(self) -> Optional[float]:
+        mean = self.middle
+        return None if mean is None else mean - self.std_dev * self.std
+
+
+def _round(value: Optional[float], digits: int = 2) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+class IndicatorSet:
+    """
+    一只股票一个周期的常用指标组合（MA5/10/20/60、MACD、RSI14、布林带）
+
+    按K线的时间标识区分新K线与盘中修正：标识与最后一根相同则修正，否则追加。
+    """
+
+    MA_PERIODS = (5, 10, 20, 60)
+
+    def __init__(self):
+        self.ma = {period: MovingAverage(period) for period in self.MA_PERIODS}
+        self.macd = MACD()
+        self.rsi = RSI()
+        self.boll = BollingerBands()
+        self.last_key: Optional[str] = None
+        self.last_close: Optional[float] = None
+
+    def _all(self):
+        return list(self.ma.values()) + [self.macd, self.rsi, self.boll]
+
+    def seed(self, klines: Iterable[Dict[str, Any]], key_field: str = "date") -> "IndicatorSet":
+        """用历史K线初始化"""
+        for kline in klines:
+            self.on_bar(str(kline[key_field]), float(kline["close"]))
+        return self
+
+    def on_bar(self, key: str, close: float) -> None:
+        """
+        最新价更新
+
+        Args:
+            key: K线时间标识（日K为日期）
+            close: 最新价/收盘价
+        """
+        if self.last_key is not None and key < self.last_key:
+            return  # 迟到的旧数据
+        if key == self.last_key:
+            for indicator in self._all():
+                indicator.replace_last(close)
+        else:
+            for indicator in self._all():
+                indicator.update(close)
+            self.last_key = key
+        self.last_close = close
+
+    def snapshot(self) -> Dict[str, Any]:
+        """最新指标值（保留两位小数）"""
+        return {
+            "key": self.last_key,
+            "close": _round(self.last_close),
+            "ma": {f"ma{p}": _round(ma.value) for p, ma in self.ma.items()},
+            "macd": {
+                "dif": _round(self.macd.dif),
+                "dea": _round(self.macd.dea),
+                "macd": _round(self.macd.histogram),
+            },
+            "rsi": _round(self.rsi.value),
+            "boll": {
+                "upper": _round(self.boll.upper),
+                "middle": _round(self.boll.middle),
+                "lower": _round(self.boll.lower),
+            },
+        }
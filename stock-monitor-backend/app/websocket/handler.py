@@ -1,13 +1,18 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Set
+from typing import Set, Optional
 import json
 
+from app.database import AsyncSessionLocal
+from app.models.stock import Stock
+from app.services.quote_stream import quote_stream, SOURCE_WEBSOCKET
+
 router = APIRouter()
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Set[WebSocket] = set()
         self.stock_subscriptions: dict[WebSocket, set[int]] = {}
+        self.stock_codes: dict[int, str] = {}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
@@ -17,14 +22,33 @@ class ConnectionManager:
     def disconnect(self, websocket: WebSocket):
         self.active_connections.discard(websocket)
         self.stock_subscriptions.pop(websocket, None)
+        self._sync_quote_stream()
 
     async def subscribe_stock(self, websocket: WebSocket, stock_id: int):
         if websocket in self.stock_subscriptions:
             self.stock_subscriptions[websocket].add(stock_id)
+            await self._resolve_code(stock_id)
+            self._sync_quote_stream()
 
     async def unsubscribe_stock(self, websocket: WebSocket, stock_id: int):
         if websocket in self.stock_subscriptions:
             self.stock_subscriptions[websocket].discard(stock_id)
+            self._sync_quote_stream()
+
+    async def _resolve_code(self, stock_id: int) -> Optional[str]:
+        """股票ID转换为股票代码（结果缓存）"""
+        if stock_id not in self.stock_codes:
+            async with AsyncSessionLocal() as db:
+                stock = await db.get(Stock, stock_id)
+            if stock:
+                self.stock_codes[stock_id] = stock.code
+        return self.stock_codes.get(stock_id)
+
+    def _sync_quote_stream(self):
+        """把所有客户端订阅的股票同步给推送行情服务"""
+        stock_ids = set().union(*self.stock_subscriptions.values())
+        codes = [self.stock_codes[i] for i in stock_ids if i in self.stock_codes]
+        quote_stream.set_codes(SOURCE_WEBSOCKET, codes)
 
     async def broadcast_stock_data(self, stock_id: int, data: dict):
         for websocket, subscriptions in self.stock_subscriptions.items():
@@ -0,0 +1,10 @@
+"""
+上游模拟器
+离线压测和调试用的本地替身，不依赖东方财富、新浪和 AkShare 的在线服务：
+- market:       随机游走模拟市场（约 5500 只股票）和录制数据回放
+- server:       模拟 StockAPIService 访问的 HTTP 接口（含 SSE 推送），延迟/错误率/限流可配置
+- fake_akshare: 后端调用的 AkShare 函数替身
+- record:       从真实上游录制回放数据
+
+启动：python -m simulator，然后按输出设置后端的上游地址环境变量。
+"""
@@ -0,0 +1,58 @@
+"""
+启动上游模拟服务
+
+    python -m simulator --port 18900 --symbols 5500 --latency-ms 30 --jitter-ms 10 --error-rate 0.01
+    python -m simulator --fixtures fixtures/market.json --animate
+"""
+import argparse
+
+from aiohttp import web
+
+from simulator.market import SyntheticMarket, FixtureMarket
+from simulator.server import SimulatorConfig, UpstreamSimulator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="东方财富/新浪上游模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18900)
+    parser.add_argument("--symbols", type=int, default=5500, help="随机市场的股票数量")
+    parser.add_argument("--seed", type=int, default=20240101, help="随机种子，相同种子生成相同数据")
+    parser.add_argument("--history-days", type=int, default=750, help="随机日K的历史长度")
+    parser.add_argument("--fixtures", default=None, help="录制文件（simulator.record 生成），指定后回放录制数据")
+    parser.add_argument("--animate", action="store_true", help="回放录制数据时在录制价格基础上随机游走")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="平均响应延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="延迟抖动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 502 的概率")
+    parser.add_argument("--throttle-rps", type=float, default=0.0, help="全局每秒请求上限，0 表示不限流")
+    parser.add_argument("--throttle-burst", type=int, default=50, help="限流令牌桶容量")
+    parser.add_argument("--tick-interval", type=float, default=3.0, help="行情推进间隔（秒），0 表示静止")
+    parser.add_argument("--active-ratio", type=float, default=0.3, help="每次推进时价格变动的股票比例")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        market = FixtureMarket(args.fixtures, seed=args.seed, animate=args.animate)
+    else:
+        market = SyntheticMarket(symbols=args.symbols, seed=args.seed, history_days=args.history_days)
+    config = SimulatorConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rps=args.throttle_rps,
+        throttle_burst=args.throttle_burst,
+        tick_interval=args.tick_interval,
+        active_ratio=args.active_ratio,
+    )
+    simulator = UpstreamSimulator(market, config)
+
+    base = f"http://{args.host}:{args.port}"
+    print(f"模拟市场: {len(market.codes)} 只股票")
+    print("后端环境变量：")
+    for name in ("EASTMONEY_PUSH2_URL", "EASTMONEY_PUSH2HIS_URL", "EASTMONEY_SEARCH_URL", "SINA_QUOTE_URL"):
+        print(f"  {name}={base}")
+    print(f"  QUOTE_STREAM_URL={base}/api/qt/ulist/sse")
+    web.run_app(simulator.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+AkShare 替身
+用模拟市场数据实现后端调用的 AkShare 函数，返回与真实函数相同列名的 DataFrame。
+未实现的函数返回空 DataFrame，调用方会按"无数据"处理。
+
+用法（必须在导入 app 之前调用，部分模块在导入时就执行 import akshare）：
+    from simulator import fake_akshare
+    fake_akshare.install()
+"""
+import random
+import sys
+import time
+import types
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from simulator.market import SyntheticMarket
+from simulator.server import SimulatorConfig
+
+_market: Optional[SyntheticMarket] = None
+_config = SimulatorConfig(tick_interval=0)
+
+
+def _simulate() -> None:
+    """同步模拟延迟和错误（AkShare 在线程池中同步执行）"""
+    delay = _config.delay()
+    if delay:
+        time.sleep(delay)
+    if _config.should_fail():
+        raise ConnectionError("simulated upstream failure")
+
+
+def _strip_market(symbol: str) -> str:
+    """sh600000 / 600000 统一为 600000"""
+    return symbol[-6:]
+
+
+def _date_filter(df: pd.DataFrame, column: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """按 YYYYMMDD 或 YYYY-MM-DD 格式的日期区间过滤"""
+    keys = df[column].astype(str).str[:10].str.replace("-", "")
+    start = (start_date or "19700101").replace("-", "")
+    end = (end_date or "20500101").replace("-", "")
+    return df[(keys >= start) & (keys <= end)].reset_index(drop=True)
+
+
+def stock_zh_a_spot_em() -> pd.DataFrame:
+    _simulate()
+    quotes = _market.quotes()
+    df = pd.DataFrame({
+        "序号": np.arange(1, len(quotes) + 1),
+        "代码": [q["code"] for q in quotes],
+        "名称": [q["name"] for q in quotes],
+        "最新价": [None if q["suspended"] else q["price"] for q in quotes],
+        "涨跌幅": [None if q["suspended"] else q["change_percent"] for q in quotes],
+        "涨跌额": [None if q["suspended"] else q["change"] for q in quotes],
+        "成交量": [q["volume"] for q in quotes],
+        "成交额": [q["amount"] for q in quotes],
+        "振幅": [q["amplitude"] for q in quotes],
+        "最高": [q["high"] for q in quotes],
+        "最低": [q["low"] for q in quotes],
+        "今开": [q["open"] for q in quotes],
+        "昨收": [q["pre_close"] for q in quotes],
+        "量比": [q["volume_ratio"] for q in quotes],
+        "换手率": [q["turnover_rate"] for q in quotes],
+        "市盈率-动态": [q["pe_ratio"] for q in quotes],
+        "市净率": [q["pb_ratio"] for q in quotes],
+        "总市值": [q["market_cap"] for q in quotes],
+        "流通市值": [q["float_market_cap"] for q in quotes],
+        "涨速": 0.0,
+        "5分钟涨跌": 0.0,
+        "60日涨跌幅": 0.0,
+        "年初至今涨跌幅": 0.0,
+    })
+    return df
+
+
+def stock_bid_ask_em(symbol: str = "000001") -> pd.DataFrame:
+    _simulate()
+    quote = _market.quote(_strip_market(symbol))
+    if quote is None:
+        return pd.DataFrame(columns=["item", "value"])
+    price = quote["price"]
+    items = {}
+    for level in range(5, 0, -1):
+        items[f"sell_{level}"] = round(price + 0.01 * level, 2)
+        items[f"sell_{level}_vol"] = 100 * random.randint(1, 500)
+    for level in range(1, 6):
+        items[f"buy_{level}"] = round(price - 0.01 * level, 2)
+        items[f"buy_{level}_vol"] = 100 * random.randint(1, 500)
+    volume = quote["volume"]
+    items.update({
+        "最新": "-" if quote["suspended"] else price,
+        "均价": round(quote["amount"] / volume / 100, 2) if volume else price,
+        "涨幅": quote["change_percent"],
+        "涨跌": quote["change"],
+        "总手": volume,
+        "金额": quote["amount"],
+        "换手": quote["turnover_rate"],
+        "量比": quote["volume_ratio"],
+        "最高": quote["high"] or "-",
+        "最低": quote["low"] or "-",
+        "今开": quote["open"] or "-",
+        "昨收": quote["pre_close"],
+        "涨停": quote["limit_up"],
+        "跌停": quote["limit_down"],
+        "外盘": volume // 2,
+        "内盘": volume - volume // 2,
+    })
+    return pd.DataFrame({"item": list(items), "value": list(items.values())})
+
+
+def _bars_frame(code: str, period: str, limit: int, adjust: str) -> pd.DataFrame:
+    bars = _market.bars(code, period, limit, adjust)
+    if not bars:
+        return pd.DataFrame()
+    return pd.DataFrame({
+        "日期": bars["dates"],
+        "股票代码": code,
+        "开盘": bars["open"],
+        "收盘": bars["close"],
+        "最高": bars["high"],
+        "最低": bars["low"],
+        "成交量": bars["volume"],
+        "成交额": bars["amount"],
+        "振幅": bars["amplitude"],
+        "涨跌幅": bars["change_percent"],
+        "涨跌额": bars["change"],
+        "换手率": bars["turnover_rate"],
+    })
+
+
+def stock_zh_a_hist(symbol: str = "000001", period: str = "daily", start_date: str = "19700101",
+                    end_date: str = "20500101", adjust: str = "", timeout: float = None) -> pd.DataFrame:
+    _simulate()
+    df = _bars_frame(_strip_market(symbol), period, _market.history_days, adjust)
+    if df.empty:
+        return df
+    return _date_filter(df, "日期", start_date, end_date)
+
+
+def stock_zh_a_daily(symbol: str = "sh600000", start_date: str = "19900101",
+                     end_date: str = "21000118", adjust: str = "") -> pd.DataFrame:
+    """新浪日K；adjust 为 hfq-factor/qfq-factor 时返回复权因子表"""
+    _simulate()
+    code = _strip_market(symbol)
+    if code not in _market.index:
+        return pd.DataFrame()
+    if adjust in ("hfq-factor", "qfq-factor"):
+        table = _market.factors(code)
+        dates = pd.to_datetime([r["date"] for r in table])
+        factors = np.array([r["factor"] for r in table])
+        if adjust == "hfq-factor":
+            return pd.DataFrame({"date": dates, "hfq_factor": factors})
+        return pd.DataFrame({"date": dates, "qfq_factor": factors[-1] / factors})
+
+    bars = _market.bars(code, "daily", _market.history_days, adjust)
+    i = _market.index[code]
+    df = pd.DataFrame({
+        "date": pd.to_datetime(bars["dates"]),
+        "open": bars["open"],
+        "high": bars["high"],
+        "low": bars["low"],
+        "close": bars["close"],
+        "volume": bars["volume"] * 100,
+        "amount": bars["amount"],
+        "outstanding_share": _market.float_shares[i],
+        "turnover": bars["turnover_rate"] / 100,
+    })
+    return _date_filter(df, "date", start_date, end_date)
+
+
+def stock_zh_a_hist_min_em(symbol: str = "000001", start_date: str = "1979-09-01 09:32:00",
+                           end_date: str = "2222-01-01 09:32:00", period: str = "5",
+                           adjust: str = "") -> pd.DataFrame:
+    _simulate()
+    code = _strip_market(symbol)
+    bars = _market.bars(code, str(period), 240 // int(period) * 5)
+    if not bars:
+        return pd.DataFrame()
+    if str(period) == "1":
+        return pd.DataFrame({
+            "时间": bars["dates"],
+            "开盘": bars["open"],
+            "收盘": bars["close"],
+            "最高": bars["high"],
+            "最低": bars["low"],
+            "成交量": bars["volume"],
+            "成交额": bars["amount"],
+            "最新价": bars["close"],
+        })
+    return pd.DataFrame({
+        "时间": bars["dates"],
+        "开盘": bars["open"],
+        "收盘": bars["close"],
+        "最高": bars["high"],
+        "最低": bars["low"],
+        "涨跌幅": bars["change_percent"],
+        "涨跌额": bars["change"],
+        "成交量": bars["volume"],
+        "成交额": bars["amount"],
+        "振幅": bars["amplitude"],
+        "换手率": bars["turnover_rate"],
+    })
+
+
+def stock_individual_fund_flow(stock: str = "600094", market: str = "sh") -> pd.DataFrame:
+    _simulate()
+    flows = _market.fund_flow(_strip_market(stock), 120)
+    if not flows:
+        return pd.DataFrame()
+    return pd.DataFrame({
+        "日期": flows["dates"],
+        "收盘价": flows["close"],
+        "涨跌幅": flows["change_percent"],
+        "主力净流入-净额": flows["main"],
+        "主力净流入-净占比": flows["main_pct"],
+        "超大单净流入-净额": flows["super_large"],
+        "超大单净流入-净占比": flows["super_large_pct"],
+        "大单净流入-净额": flows["large"],
+        "大单净流入-净占比": flows["large_pct"],
+        "中单净流入-净额": flows["medium"],
+        "中单净流入-净占比": flows["medium_pct"],
+        "小单净流入-净额": flows["small"],
+        "小单净流入-净占比": flows["small_pct"],
+    })
+
+
+def stock_info_a_code_name() -> pd.DataFrame:
+    _simulate()
+    return pd.DataFrame({"code": _market.codes, "name": _market.names})
+
+
+_FUNCTIONS = (
+    stock_zh_a_spot_em,
+    stock_bid_ask_em,
+    stock_zh_a_hist,
+    stock_zh_a_daily,
+    stock_zh_a_hist_min_em,
+    stock_individual_fund_flow,
+    stock_info_a_code_name,
+)
+
+
+def _unsupported(name: str):
+    def _empty(*args, **kwargs) -> pd.DataFrame:
+        _simulate()
+        return pd.DataFrame()
+    _empty.__name__ = name
+    return _empty
+
+
+def install(market: Optional[SyntheticMarket] = None, config: Optional[SimulatorConfig] = None) -> types.ModuleType:
+    """
+    用替身替换 sys.modules 中的 akshare
+
+    Args:
+        market: 模拟市场（默认新建 SyntheticMarket）
+        config: 延迟/错误率配置（限流和行情推进参数不生效）
+
+    Returns:
+        替身模块
+    """
+    global _market, _config
+    _market = market or SyntheticMarket()
+    if config is not None:
+        _config = config
+
+    module = types.ModuleType("akshare")
+    module.__version__ = "simulator"
+    for func in _FUNCTIONS:
+        setattr(module, func.__name__, func)
+    module.__getattr__ = _unsupported
+    sys.modules["akshare"] = module
+    return module
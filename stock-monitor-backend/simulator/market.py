@@ -0,0 +1,441 @@
+"""
+模拟行情数据
+SyntheticMarket：按随机游走生成约 5500 只股票的实时行情、日K/周K/月K/分钟K、复权因子和资金流向，
+同一个种子每次生成的数据完全相同，便于重复压测。
+FixtureMarket：加载 record.py 录制的真实行情和日K，未录制的部分仍使用随机数据补齐。
+"""
+import json
+import zlib
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional, Any, Tuple
+import numpy as np
+import pandas as pd
+
+# 原始日K列（不复权），与东方财富 kline/get 的 f51-f61 顺序一致
+BAR_FIELDS = (
+    "open", "close", "high", "low", "volume", "amount",
+    "amplitude", "change_percent", "change", "turnover_rate",
+)
+PRICE_FIELDS = ("open", "close", "high", "low", "change")
+
+# 代码段：(起始代码, 数量占比)
+_CODE_RANGES = (
+    (600000, 0.30),  # 沪市主板
+    (688001, 0.10),  # 科创板
+    (1, 0.28),       # 深市主板
+    (300001, 0.24),  # 创业板
+    (2001, 0.08),    # 中小板
+)
+
+
+def _code_seed(seed: int, *parts: str) -> int:
+    """由代码等字符串派生稳定的随机种子"""
+    return (seed * 1000003 + zlib.crc32("|".join(parts).encode())) & 0xFFFFFFFF
+
+
+def _make_codes(count: int) -> List[str]:
+    codes = []
+    for start, share in _CODE_RANGES:
+        n = int(round(count * share))
+        codes.extend(f"{start + i:06d}" for i in range(n))
+    return codes[:count]
+
+
+class SyntheticMarket:
+    """随机游走模拟市场"""
+
+    def __init__(self, symbols: int = 5500, seed: int = 20240101, history_days: int = 750,
+                 suspended_ratio: float = 0.005, today: Optional[date] = None):
+        self.seed = seed
+        self.history_days = history_days
+        self.today = today or date.today()
+        self._bars: Dict[Tuple[str, str, int], Dict[str, np.ndarray]] = {}
+        self._factors: Dict[str, List[Dict[str, Any]]] = {}
+        self.version = 0
+        self._init_universe(symbols, suspended_ratio)
+        self._init_limits()
+
+    # ==================== 实时行情 ====================
+
+    def _init_universe(self, symbols: int, suspended_ratio: float) -> None:
+        rng = np.random.default_rng(self.seed)
+        self.codes = _make_codes(symbols)
+        n = len(self.codes)
+        self.names = [f"模拟{code[-4:]}" for code in self.codes]
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.pre_close = np.round(np.clip(rng.lognormal(2.4, 0.7, n), 2.0, 1500.0), 2)
+        self.float_shares = rng.uniform(5e7, 5e9, n)
+        self.total_shares = self.float_shares * rng.uniform(1.0, 2.5, n)
+        self.eps = self.pre_close / rng.uniform(8, 80, n)
+        self.bps = self.pre_close / rng.uniform(0.6, 8, n)
+        self.suspended = rng.random(n) < suspended_ratio
+        self._reset_session(rng)
+
+    def _init_limits(self) -> None:
+        """涨跌停幅度：科创板、创业板 20%，其余 10%"""
+        self.limit_ratio = np.array([0.2 if c.startswith(("688", "300")) else 0.1 for c in self.codes])
+
+    def _reset_session(self, rng: np.random.Generator) -> None:
+        """开盘：按昨收生成开盘价，清空成交"""
+        n = len(self.codes)
+        self.open = np.round(self.pre_close * (1 + rng.normal(0, 0.01, n)), 2)
+        self.price = self.open.copy()
+        self.high = self.open.copy()
+        self.low = self.open.copy()
+        self.volume = np.zeros(n, dtype=np.int64)  # 手
+        self.amount = np.zeros(n)
+        self.avg_volume = rng.lognormal(10.5, 0.8, n)  # 近期日均成交量（手），用于量比
+        self._rng = rng
+
+    def step(self, active_ratio: float = 0.3, volatility: float = 0.002) -> np.ndarray:
+        """
+        推进一个行情周期：随机选取部分股票按对数正态随机游走，价格限制在涨跌停之内
+
+        Returns:
+            本次发生变化的股票下标
+        """
+        rng = self._rng
+        n = len(self.codes)
+        changed = np.flatnonzero((rng.random(n) < active_ratio) & ~self.suspended)
+        if not len(changed):
+            return changed
+        moved = self.price[changed] * np.exp(rng.normal(0, volatility, len(changed)))
+        limit = self.limit_ratio[changed]
+        pre = self.pre_close[changed]
+        moved = np.round(np.clip(moved, pre * (1 - limit), pre * (1 + limit)), 2)
+        self.price[changed] = moved
+        self.high[changed] = np.maximum(self.high[changed], moved)
+        self.low[changed] = np.minimum(self.low[changed], moved)
+        traded = rng.poisson(self.avg_volume[changed] / 4800).astype(np.int64) + 1
+        self.volume[changed] += traded
+        self.amount[changed] += traded * 100 * moved
+        self.version += 1
+        return changed
+
+    def quote(self, code: str) -> Optional[Dict[str, Any]]:
+        """单只股票的实时行情（停牌股票的价格类字段为 None）"""
+        i = self.index.get(code)
+        if i is None:
+            return None
+        return self.quotes([i])[0]
+
+    def quotes(self, indexes=None) -> List[Dict[str, Any]]:
+        """批量生成实时行情字典"""
+        if indexes is None:
+            indexes = range(len(self.codes))
+        limit = self.limit_ratio
+        result = []
+        for i in indexes:
+            pre = float(self.pre_close[i])
+            suspended = bool(self.suspended[i])
+            price = pre if suspended else float(self.price[i])
+            change = round(price - pre, 2)
+            amplitude = (self.high[i] - self.low[i]) / pre * 100 if pre else 0
+            result.append({
+                "code": self.codes[i],
+                "name": self.names[i],
+                "suspended": suspended,
+                "price": price,
+                "change": change,
+                "change_percent": round(change / pre * 100, 2) if pre else 0.0,
+                "open": None if suspended else float(self.open[i]),
+                "high": None if suspended else float(self.high[i]),
+                "low": None if suspended else float(self.low[i]),
+                "pre_close": pre,
+                "volume": 0 if suspended else int(self.volume[i]),
+                "amount": 0.0 if suspended else round(float(self.amount[i]), 2),
+                "amplitude": 0.0 if suspended else round(float(amplitude), 2),
+                "turnover_rate": round(float(self.volume[i] * 100 / self.float_shares[i] * 100), 2),
+                "volume_ratio": round(float(self.volume[i] / max(self.avg_volume[i], 1) * 4), 2),
+                "pe_ratio": round(price / float(self.eps[i]), 2),
+                "pb_ratio": round(price / float(self.bps[i]), 2),
+                "market_cap": round(price * float(self.total_shares[i]), 2),
+                "float_market_cap": round(price * float(self.float_shares[i]), 2),
+                "limit_up": round(pre * (1 + limit[i]), 2),
+                "limit_down": round(pre * (1 - limit[i]), 2),
+            })
+        return result
+
+    def search(self, keyword: str, limit: int = 10) -> List[Dict[str, str]]:
+        """按代码或名称模糊搜索"""
+        keyword = keyword.strip()
+        matches = []
+        for code, name in zip(self.codes, self.names):
+            if keyword in code or keyword in name:
+                matches.append({"code": code, "name": name})
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    # ==================== 日K与复权 ====================
+
+    def trading_days(self, count: int) -> np.ndarray:
+        """截至今天的最近 count 个交易日（只排除周末）"""
+        end = pd.Timestamp(self.today)
+        if end.weekday() >= 5:
+            end = end - pd.offsets.BDay(1)
+        return pd.bdate_range(end=end, periods=count).strftime("%Y-%m-%d").to_numpy()
+
+    def _daily_raw(self, code: str) -> Dict[str, np.ndarray]:
+        """生成不复权日K，最后一根收盘价与当前昨收对齐；同时生成后复权因子表"""
+        key = (code, "daily", 0)
+        if key in self._bars:
+            return self._bars[key]
+
+        i = self.index[code]
+        rng = np.random.default_rng(_code_seed(self.seed, code, "daily"))
+        n = self.history_days
+        dates = self.trading_days(n)
+        returns = np.clip(rng.normal(0.0003, 0.02, n), -0.095, 0.095)
+        adjusted = np.exp(np.cumsum(returns))
+
+        # 每年约一次除权除息，后复权因子在除权日跳升
+        events = np.sort(rng.choice(np.arange(20, n), size=max(1, n // 250), replace=False))
+        ratios = 1 + rng.uniform(0.005, 0.3, len(events))
+        factor = np.ones(n)
+        for event, ratio in zip(events, ratios):
+            factor[event:] *= ratio
+
+        close = adjusted / factor
+        scale = self.pre_close[i] / close[-1]
+        close = np.round(close * scale, 2)
+        # 除权后的前收盘价
+        reference = close / (1 + returns)
+        open_ = np.round(reference * (1 + rng.normal(0, 0.008, n)), 2)
+        high = np.round(np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n))), 2)
+        low = np.round(np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n))), 2)
+        volume = rng.lognormal(np.log(self.avg_volume[i]), 0.5, n).astype(np.int64)
+        bars = {
+            "dates": dates,
+            "open": open_,
+            "close": close,
+            "high": high,
+            "low": low,
+            "volume": volume,
+            "amount": np.round(volume * 100 * (open_ + close) / 2, 2),
+            "amplitude": np.round((high - low) / reference * 100, 2),
+            "change_percent": np.round(returns * 100, 2),
+            "change": np.round(close - reference, 2),
+            "turnover_rate": np.round(volume * 100 / self.float_shares[i] * 100, 2),
+        }
+        self._bars[key] = bars
+        self._factors[code] = [{"date": dates[0], "factor": 1.0}] + [
+            {"date": dates[e], "factor": round(float(factor[e]), 6)} for e in events
+        ]
+        return bars
+
+    def factors(self, code: str) -> List[Dict[str, Any]]:
+        """后复权因子表 [{"date", "factor"}]（只在除权日有记录）"""
+        if code not in self._factors:
+            self._daily_raw(code)
+        return self._factors.get(code, [])
+
+    def _factor_series(self, code: str, dates: np.ndarray) -> np.ndarray:
+        table = self.factors(code)
+        if not table:
+            return np.ones(len(dates))
+        table_dates = np.array([r["date"] for r in table])
+        table_factors = np.array([r["factor"] for r in table])
+        idx = np.searchsorted(table_dates, dates.astype("<U10"), side="right") - 1
+        return np.where(idx >= 0, table_factors[np.clip(idx, 0, None)], 1.0)
+
+    def _adjust(self, code: str, bars: Dict[str, np.ndarray], adjust: str) -> Dict[str, np.ndarray]:
+        if adjust not in ("qfq", "hfq"):
+            return bars
+        factor = self._factor_series(code, bars["dates"])
+        if adjust == "qfq":
+            factor = factor / self.factors(code)[-1]["factor"]
+        adjusted = dict(bars)
+        for field in PRICE_FIELDS:
+            adjusted[field] = np.round(bars[field] * factor, 2)
+        return adjusted
+
+    def bars(self, code: str, period: str = "daily", limit: int = 100, adjust: str = "") -> Dict[str, np.ndarray]:
+        """
+        获取K线（列式）
+
+        Args:
+            code: 股票代码
+            period: daily/weekly/monthly 或 1/5/15/30/60（分钟）
+            limit: 最近条数
+            adjust: qfq/hfq/空字符串
+
+        Returns:
+            {"dates": ..., "open": ..., ...}
+        """
+        if code not in self.index:
+            return {}
+        if period in ("daily", "weekly", "monthly"):
+            bars = self._adjust(code, self._daily_raw(code), adjust)
+            if period != "daily":
+                bars = self._resample(bars, "W-FRI" if period == "weekly" else "M")
+        else:
+            bars = self._minute_bars(code, int(period), limit)
+        return {field: col[-limit:] for field, col in bars.items()}
+
+    def _resample(self, bars: Dict[str, np.ndarray], freq: str) -> Dict[str, np.ndarray]:
+        """日K合成周K/月K，日期取该周期最后一个交易日"""
+        days = pd.to_datetime(bars["dates"])
+        df = pd.DataFrame({k: v for k, v in bars.items() if k != "dates"})
+        df["day"] = bars["dates"]
+        grouped = df.groupby(days.to_period(freq), sort=True)
+        out = pd.DataFrame({
+            "day": grouped["day"].last(),
+            "open": grouped["open"].first(),
+            "close": grouped["close"].last(),
+            "high": grouped["high"].max(),
+            "low": grouped["low"].min(),
+            "volume": grouped["volume"].sum(),
+            "amount": grouped["amount"].sum(),
+            "turnover_rate": grouped["turnover_rate"].sum(),
+        })
+        prev = out["close"].shift(1).fillna(out["open"])
+        out["change"] = (out["close"] - prev).round(2)
+        out["change_percent"] = (out["change"] / prev * 100).round(2)
+        out["amplitude"] = ((out["high"] - out["low"]) / prev * 100).round(2)
+        result = {"dates": out["day"].to_numpy()}
+        for field in BAR_FIELDS:
+            result[field] = out[field].to_numpy()
+        return result
+
+    def _minute_bars(self, code: str, minutes: int, limit: int) -> Dict[str, np.ndarray]:
+        """生成分钟K，最后一根收盘价等于当前价"""
+        per_day = 240 // minutes
+        days = max(1, -(-limit // per_day))
+        key = (code, "minute", minutes * 10000 + days)
+        if key in self._bars:
+            return self._bars[key]
+
+        session = []
+        for start, end in (("09:30", "11:30"), ("13:00", "15:00")):
+            t = datetime.strptime(start, "%H:%M")
+            stop = datetime.strptime(end, "%H:%M")
+            while t < stop:
+                t += timedelta(minutes=minutes)
+                session.append(t.strftime("%H:%M"))
+        stamps = np.array([f"{d} {s}" for d in self.trading_days(days) for s in session])
+
+        i = self.index[code]
+        rng = np.random.default_rng(_code_seed(self.seed, code, str(minutes)))
+        n = len(stamps)
+        path = np.exp(np.cumsum(rng.normal(0, 0.002 * np.sqrt(minutes), n)))
+        close = np.round(path / path[-1] * self.price[i], 2)
+        open_ = np.round(np.r_[close[0], close[:-1]], 2)
+        high = np.round(np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.001, n))), 2)
+        low = np.round(np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.001, n))), 2)
+        volume = rng.poisson(self.avg_volume[i] / per_day, n).astype(np.int64)
+        bars = {
+            "dates": stamps,
+            "open": open_,
+            "close": close,
+            "high": high,
+            "low": low,
+            "volume": volume,
+            "amount": np.round(volume * 100 * close, 2),
+            "amplitude": np.round((high - low) / open_ * 100, 2),
+            "change_percent": np.round((close - open_) / open_ * 100, 2),
+            "change": np.round(close - open_, 2),
+            "turnover_rate": np.round(volume * 100 / self.float_shares[i] * 100, 4),
+        }
+        self._bars[key] = bars
+        return bars
+
+    # ==================== 资金流向 ====================
+
+    def fund_flow(self, code: str, days: int = 10) -> Dict[str, np.ndarray]:
+        """
+        资金流向（列式），字段顺序与东方财富 fflow/kline/get 的 f51-f65 一致：
+        日期、主力/小单/中单/大单/超大单净额、对应净占比、收盘价、涨跌幅
+        """
+        if code not in self.index:
+            return {}
+        daily = self._daily_raw(code)
+        rng = np.random.default_rng(_code_seed(self.seed, code, "flow"))
+        n = len(daily["dates"])
+        amount = daily["amount"]
+        super_large = amount * rng.normal(0, 0.04, n)
+        large = amount * rng.normal(0, 0.04, n)
+        medium = amount * rng.normal(0, 0.03, n)
+        small = -(super_large + large + medium)
+        main = super_large + large
+        flows = {
+            "dates": daily["dates"],
+            "main": main, "small": small, "medium": medium, "large": large, "super_large": super_large,
+        }
+        for name in ("main", "small", "medium", "large", "super_large"):
+            flows[f"{name}_pct"] = np.round(flows[name] / np.maximum(amount, 1) * 100, 2)
+            flows[name] = np.round(flows[name], 2)
+        flows["close"] = daily["close"]
+        flows["change_percent"] = daily["change_percent"]
+        return {field: col[-days:] for field, col in flows.items()}
+
+
+class FixtureMarket(SyntheticMarket):
+    """
+    录制行情回放
+
+    股票列表、实时行情、日K和复权因子来自 record.py 录制的 JSON 文件，
+    分钟K和资金流向仍由随机数据生成（收盘价与录制数据对齐）。
+    """
+
+    def __init__(self, path: str, seed: int = 20240101, animate: bool = False):
+        with open(path, "r", encoding="utf-8") as f:
+            self._fixture = json.load(f)
+        self.animate = animate
+        recorded = self._fixture.get("recorded_at")
+        today = datetime.fromisoformat(recorded).date() if recorded else None
+        super().__init__(symbols=0, seed=seed, today=today)
+
+    def _init_universe(self, symbols: int, suspended_ratio: float) -> None:
+        quotes = self._fixture.get("quotes", [])
+        rng = np.random.default_rng(self.seed)
+        n = len(quotes)
+        self.codes = [q["code"] for q in quotes]
+        self.names = [q.get("name", "") for q in quotes]
+        self.index = {code: i for i, code in enumerate(self.codes)}
+
+        def column(field: str) -> np.ndarray:
+            return np.array([float(q.get(field) or 0) for q in quotes])
+
+        price = column("price")
+        self.pre_close = np.where(column("pre_close") > 0, column("pre_close"), price)
+        market_cap = column("market_cap")
+        float_cap = column("float_market_cap")
+        safe_price = np.where(price > 0, price, 1)
+        self.total_shares = np.where(market_cap > 0, market_cap / safe_price, 1e9)
+        self.float_shares = np.where(float_cap > 0, float_cap / safe_price, self.total_shares)
+        pe = column("pe_ratio")
+        pb = column("pb_ratio")
+        self.eps = np.where(pe > 0, safe_price / np.where(pe > 0, pe, 1), safe_price / 30)
+        self.bps = np.where(pb > 0, safe_price / np.where(pb > 0, pb, 1), safe_price / 2)
+        self.suspended = price <= 0
+        self._reset_session(rng)
+        self.open = np.where(column("open") > 0, column("open"), self.pre_close)
+        self.price = np.where(price > 0, price, self.pre_close)
+        self.high = np.where(column("high") > 0, column("high"), self.price)
+        self.low = np.where(column("low") > 0, column("low"), self.price)
+        self.volume = column("volume").astype(np.int64)
+        self.amount = column("amount")
+
+    def step(self, active_ratio: float = 0.3, volatility: float = 0.002) -> np.ndarray:
+        """默认原样回放录制的行情，animate=True 时在录制价格基础上随机游走"""
+        if not self.animate:
+            return np.array([], dtype=np.int64)
+        return super().step(active_ratio, volatility)
+
+    def _daily_raw(self, code: str) -> Dict[str, np.ndarray]:
+        key = (code, "daily", 0)
+        if key in self._bars:
+            return self._bars[key]
+        recorded = self._fixture.get("daily", {}).get(code)
+        if not recorded:
+            return super()._daily_raw(code)
+        bars = {"dates": np.array(recorded["dates"])}
+        for field in BAR_FIELDS:
+            dtype = np.int64 if field == "volume" else np.float64
+            bars[field] = np.array(recorded[field], dtype=dtype)
+        self._bars[key] = bars
+        self._factors[code] = self._fixture.get("factors", {}).get(code) or [
+            {"date": bars["dates"][0], "factor": 1.0}
+        ]
+        return bars
@@ -0,0 +1,81 @@
+"""
+行情录制
+从真实上游录制实时行情、不复权日K和复权因子，生成 FixtureMarket 使用的 JSON 文件。
+
+用法：
+    python -m simulator.record --codes 600000,000001 --days 500 --out fixtures/market.json
+    python -m simulator.record --all --kline-codes 600000,000001 --out fixtures/market.json
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import List
+
+from simulator.market import BAR_FIELDS
+
+# 录制的实时行情字段
+_QUOTE_FIELDS = (
+    "code", "name", "price", "open", "high", "low", "pre_close", "volume", "amount",
+    "turnover_rate", "pe_ratio", "pb_ratio", "market_cap", "float_market_cap",
+)
+
+
+async def record(codes: List[str], kline_codes: List[str], days: int, out: str) -> None:
+    from app.core.http_client import http_client
+    from app.services.stock_api import stock_api_service
+    from app.services.akshare_api import akshare_service
+
+    await http_client.start()
+    try:
+        if not codes:
+            stocks = await akshare_service.get_stock_list() or []
+            codes = [s["code"] for s in stocks]
+        quotes = await stock_api_service.get_batch_quotes(codes)
+        print(f"实时行情: {len(quotes)}/{len(codes)}")
+
+        daily, factors = {}, {}
+        for code in kline_codes:
+            series = await stock_api_service.get_kline_series(code, "daily", days, adjust="")
+            if series is not None and len(series):
+                daily[code] = {"dates": series.dates.tolist()}
+                for field in BAR_FIELDS:
+                    daily[code][field] = series.columns[field].tolist()
+            records = await akshare_service.get_adjust_factors(code)
+            if records:
+                factors[code] = records
+        print(f"日K: {len(daily)}/{len(kline_codes)}，复权因子: {len(factors)}/{len(kline_codes)}")
+    finally:
+        await http_client.close()
+
+    fixture = {
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "quotes": [{k: q.get(k) for k in _QUOTE_FIELDS} for q in quotes.values()],
+        "daily": daily,
+        "factors": factors,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, ensure_ascii=False)
+    print(f"已写入 {out}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="录制真实行情供模拟服务回放")
+    parser.add_argument("--codes", default="", help="逗号分隔的股票代码")
+    parser.add_argument("--all", action="store_true", help="录制全部 A 股的实时行情")
+    parser.add_argument("--kline-codes", default=None, help="需要录制日K的股票，默认同 --codes")
+    parser.add_argument("--days", type=int, default=500, help="日K条数")
+    parser.add_argument("--out", default="fixtures/market.json", help="输出文件")
+    args = parser.parse_args()
+
+    codes = [c for c in args.codes.split(",") if c]
+    if not codes and not args.all:
+        parser.error("需要指定 --codes 或 --all")
+    kline_codes = [c for c in (args.kline_codes or args.codes).split(",") if c]
+    asyncio.run(record([] if args.all else codes, kline_codes, args.days, args.out))
+
+
+if __name__ == "__main__":
+    main()
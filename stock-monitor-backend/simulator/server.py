@@ -0,0 +1,365 @@
+"""
+上游模拟服务
+用 aiohttp 模拟 StockAPIService 访问的全部上游接口，响应格式与真实接口一致：
+- push2:     /api/qt/stock/get、/api/qt/ulist.np/get、/api/qt/ulist/sse、/api/qt/stock/fflow/kline/get
+- push2his:  /api/qt/stock/kline/get
+- searchapi: /api/suggest/get
+- 新浪:      /list=sh600000,sz000001（GBK 编码）
+所有主机共用一个端口，把后端的上游地址配置都指向本服务即可。
+延迟、错误率、限流均可配置，/__simulator/stats 返回各接口的请求统计。
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+from aiohttp import web
+
+from simulator.market import SyntheticMarket, BAR_FIELDS
+
+# 东方财富 kline/get 的 klt 参数
+_KLT_PERIODS = {
+    "1": "1", "5": "5", "15": "15", "30": "30", "60": "60",
+    "101": "daily", "102": "weekly", "103": "monthly",
+}
+_FQT_ADJUST = {"0": "", "1": "qfq", "2": "hfq"}
+
+
+@dataclass
+class SimulatorConfig:
+    """模拟服务行为配置"""
+    latency_ms: float = 0.0       # 平均响应延迟（毫秒）
+    jitter_ms: float = 0.0        # 延迟抖动（正态分布标准差，毫秒）
+    error_rate: float = 0.0       # 返回 502 的概率
+    throttle_rps: float = 0.0     # 全局每秒请求上限，超出返回 429；0 表示不限流
+    throttle_burst: int = 50      # 限流令牌桶容量
+    tick_interval: float = 3.0    # 行情推进间隔（秒）；0 表示行情静止
+    active_ratio: float = 0.3     # 每次推进时价格变动的股票比例
+
+    def delay(self) -> float:
+        """本次请求的模拟延迟（秒）"""
+        if self.latency_ms <= 0 and self.jitter_ms <= 0:
+            return 0.0
+        return max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class TokenBucket:
+    """令牌桶限流"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def acquire(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def _market_of(code: str) -> str:
+    """东方财富市场代码：沪市 1，深市 0"""
+    return "1" if code.startswith(("6", "9")) else "0"
+
+
+def _number(value: Any, scale: int = 1) -> Any:
+    """东方财富数值：停牌等无数据时返回 '-'，scale=100 时返回放大后的整数（fltt 未指定时的格式）"""
+    if value is None:
+        return "-"
+    if scale != 1:
+        return int(round(value * scale))
+    return value
+
+
+class UpstreamSimulator:
+    """上游模拟服务"""
+
+    def __init__(self, market: SyntheticMarket, config: Optional[SimulatorConfig] = None):
+        self.market = market
+        self.config = config or SimulatorConfig()
+        self.bucket = TokenBucket(self.config.throttle_rps, self.config.throttle_burst) \
+            if self.config.throttle_rps > 0 else None
+        self.stats: Counter = Counter()
+        self._ticker: Optional[asyncio.Task] = None
+        self._tick_event = asyncio.Event()
+        self._last_changed = np.array([], dtype=np.int64)
+
+    # ==================== 应用 ====================
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/api/qt/stock/get", self.stock_get)
+        app.router.add_get("/api/qt/ulist.np/get", self.ulist_get)
+        app.router.add_get("/api/qt/ulist/sse", self.ulist_sse)
+        app.router.add_get("/api/qt/stock/kline/get", self.kline_get)
+        app.router.add_get("/api/qt/stock/fflow/kline/get", self.fflow_get)
+        app.router.add_get("/api/suggest/get", self.suggest_get)
+        app.router.add_get("/__simulator/stats", self.stats_get)
+        app.router.add_get("/{tail:list=.*}", self.sina_list)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app: web.Application) -> None:
+        if self.config.tick_interval > 0:
+            self._ticker = asyncio.create_task(self._tick_loop())
+
+    async def _on_cleanup(self, app: web.Application) -> None:
+        if self._ticker:
+            self._ticker.cancel()
+
+    async def _tick_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.tick_interval)
+            self._last_changed = self.market.step(self.config.active_ratio)
+            # 唤醒所有推送连接
+            self._tick_event.set()
+            self._tick_event = asyncio.Event()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        route = request.path if not request.path.startswith("/list=") else "/list="
+        if route.startswith("/__simulator"):
+            return await handler(request)
+        self.stats[f"requests {route}"] += 1
+        if self.bucket is not None and not self.bucket.acquire():
+            self.stats[f"throttled {route}"] += 1
+            return web.Response(status=429, text="Too Many Requests")
+        delay = self.config.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if self.config.should_fail():
+            self.stats[f"errors {route}"] += 1
+            return web.Response(status=502, text="Bad Gateway")
+        return await handler(request)
+
+    async def stats_get(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "symbols": len(self.market.codes),
+            "market_version": self.market.version,
+            "stats": dict(self.stats),
+        })
+
+    # ==================== 东方财富 push2 ====================
+
+    def _codes_from_secids(self, secids: str) -> List[str]:
+        codes = []
+        for secid in secids.split(","):
+            code = secid.split(".")[-1].strip()
+            if code in self.market.index:
+                codes.append(code)
+        return codes
+
+    async def stock_get(self, request: web.Request) -> web.Response:
+        """个股行情：价格类字段为放大 100 倍的整数"""
+        code = request.query.get("secid", "").split(".")[-1]
+        quote = self.market.quote(code)
+        if quote is None:
+            return web.json_response({"rc": 0, "data": None})
+        data = {
+            "f43": _number(None if quote["suspended"] else quote["price"], 100),
+            "f44": _number(quote["high"], 100),
+            "f45": _number(quote["low"], 100),
+            "f46": _number(quote["open"], 100),
+            "f47": quote["volume"],
+            "f48": quote["amount"],
+            "f50": _number(quote["volume_ratio"], 100),
+            "f51": _number(quote["limit_up"], 100),
+            "f52": _number(quote["limit_down"], 100),
+            "f55": round(quote["price"] / max(quote["pe_ratio"], 0.01), 4),
+            "f57": code,
+            "f58": quote["name"],
+            "f60": _number(quote["pre_close"], 100),
+            "f116": quote["market_cap"],
+            "f117": quote["float_market_cap"],
+            "f168": _number(quote["turnover_rate"], 100),
+            "f169": _number(quote["change"], 100),
+            "f170": _number(quote["change_percent"], 100),
+        }
+        fields = request.query.get("fields")
+        if fields:
+            data = {k: v for k, v in data.items() if k in fields.split(",")}
+        return web.json_response({"rc": 0, "data": data})
+
+    def _list_row(self, quote: Dict[str, Any], fields: List[str], scale: int) -> Dict[str, Any]:
+        """列表行情单行（fltt=2 时为小数，否则价格类字段放大 100 倍）"""
+        suspended = quote["suspended"]
+        row = {
+            "f2": _number(None if suspended else quote["price"], scale),
+            "f3": _number(None if suspended else quote["change_percent"], scale),
+            "f4": _number(None if suspended else quote["change"], scale),
+            "f5": _number(None if suspended else quote["volume"]),
+            "f6": _number(None if suspended else quote["amount"]),
+            "f7": _number(None if suspended else quote["amplitude"], scale),
+            "f8": _number(quote["turnover_rate"], scale),
+            "f9": _number(quote["pe_ratio"], scale),
+            "f10": _number(None if suspended else quote["volume_ratio"], scale),
+            "f12": quote["code"],
+            "f13": int(_market_of(quote["code"])),
+            "f14": quote["name"],
+            "f15": _number(quote["high"], scale),
+            "f16": _number(quote["low"], scale),
+            "f17": _number(quote["open"], scale),
+            "f18": _number(quote["pre_close"], scale),
+            "f20": quote["market_cap"],
+            "f21": quote["float_market_cap"],
+            "f23": _number(quote["pb_ratio"], scale),
+        }
+        if fields:
+            row = {k: v for k, v in row.items() if k in fields}
+        return row
+
+    def _list_params(self, request: web.Request):
+        fields = [f for f in request.query.get("fields", "").split(",") if f]
+        scale = 1 if request.query.get("fltt") == "2" else 100
+        codes = self._codes_from_secids(request.query.get("secids", ""))
+        return codes, fields, scale
+
+    async def ulist_get(self, request: web.Request) -> web.Response:
+        """列表行情（批量）"""
+        codes, fields, scale = self._list_params(request)
+        quotes = self.market.quotes([self.market.index[c] for c in codes])
+        diff = [self._list_row(q, fields, scale) for q in quotes]
+        return web.json_response({"rc": 0, "data": {"total": len(diff), "diff": diff}})
+
+    async def ulist_sse(self, request: web.Request) -> web.StreamResponse:
+        """
+        列表行情推送：首条消息为全量，之后每次行情推进只推送变化的行和变化的字段，
+        行以订阅顺序的位置下标为键，空闲时发送心跳
+        """
+        codes, fields, scale = self._list_params(request)
+        positions = {self.market.index[c]: str(pos) for pos, c in enumerate(codes)}
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+        })
+        await response.prepare(request)
+
+        last: Dict[str, Dict[str, Any]] = {}
+        quotes = self.market.quotes(list(positions))
+        for pos, quote in zip(positions.values(), quotes):
+            last[pos] = self._list_row(quote, fields, scale)
+        await self._send_event(response, {"rc": 0, "data": {"total": len(last), "diff": last}})
+
+        heartbeat = max(self.config.tick_interval, 1.0) * 5
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._tick_event.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    await self._send_event(response, {"rc": 0, "data": None})
+                    continue
+                changed = [i for i in self._last_changed.tolist() if i in positions]
+                diff = {}
+                for i, quote in zip(changed, self.market.quotes(changed)):
+                    pos = positions[i]
+                    row = self._list_row(quote, fields, scale)
+                    delta = {k: v for k, v in row.items() if last[pos].get(k) != v}
+                    if delta:
+                        diff[pos] = delta
+                        last[pos] = row
+                if diff:
+                    self.stats["sse events"] += 1
+                    await self._send_event(response, {"rc": 0, "data": {"diff": diff}})
+        except ConnectionResetError:
+            # 客户端断开（重新订阅）
+            return response
+
+    @staticmethod
+    async def _send_event(response: web.StreamResponse, payload: Dict[str, Any]) -> None:
+        await response.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    # ==================== 东方财富 K线 / 资金流向 ====================
+
+    async def kline_get(self, request: web.Request) -> web.Response:
+        """K线：klines 为逗号分隔字符串数组（f51-f61）"""
+        code = request.query.get("secid", "").split(".")[-1]
+        period = _KLT_PERIODS.get(request.query.get("klt", "101"), "daily")
+        adjust = _FQT_ADJUST.get(request.query.get("fqt", "0"), "")
+        limit = int(request.query.get("lmt", 100) or 100)
+        bars = self.market.bars(code, period, limit, adjust)
+        if not bars:
+            return web.json_response({"rc": 0, "data": None})
+
+        columns = [bars["dates"]] + [bars[field] for field in BAR_FIELDS]
+        klines = [",".join(str(v) for v in row) for row in zip(*(c.tolist() for c in columns))]
+        i = self.market.index[code]
+        return web.json_response({"rc": 0, "data": {
+            "code": code,
+            "market": int(_market_of(code)),
+            "name": self.market.names[i],
+            "decimal": 2,
+            "dktotal": len(klines),
+            "preKPrice": float(bars["close"][0]) if len(klines) else 0,
+            "klines": klines,
+        }})
+
+    async def fflow_get(self, request: web.Request) -> web.Response:
+        """资金流向：f51-f65（日期、五类净额、五类净占比、收盘价、涨跌幅、两个保留字段）"""
+        code = request.query.get("secid", "").split(".")[-1]
+        days = int(request.query.get("lmt", 10) or 10)
+        flows = self.market.fund_flow(code, days)
+        if not flows:
+            return web.json_response({"rc": 0, "data": None})
+        names = ("main", "small", "medium", "large", "super_large")
+        columns = [flows["dates"]] + [flows[n] for n in names] + [flows[f"{n}_pct"] for n in names] + [
+            flows["close"], flows["change_percent"],
+        ]
+        klines = [
+            ",".join(str(v) for v in row) + ",0.00,0.00"
+            for row in zip(*(c.tolist() for c in columns))
+        ]
+        return web.json_response({"rc": 0, "data": {"code": code, "klines": klines}})
+
+    # ==================== 搜索 ====================
+
+    async def suggest_get(self, request: web.Request) -> web.Response:
+        keyword = request.query.get("input", "")
+        count = int(request.query.get("count", 10) or 10)
+        data = [{
+            "Code": item["code"],
+            "Name": item["name"],
+            "MktNum": _market_of(item["code"]),
+            "SecurityTypeName": "沪A" if _market_of(item["code"]) == "1" else "深A",
+        } for item in self.market.search(keyword, count)]
+        return web.json_response({"QuotationCodeTable": {"Data": data, "Status": 0, "TotalCount": len(data)}})
+
+    # ==================== 新浪 ====================
+
+    async def sina_list(self, request: web.Request) -> web.Response:
+        """新浪行情：var hq_str_sh600000="名称,今开,昨收,最新价,最高,最低,买一,卖一,成交量(股),成交额,...";"""
+        symbols = request.path[len("/list="):].split(",")
+        now = datetime.now()
+        lines = []
+        for symbol in symbols:
+            quote = self.market.quote(symbol[2:]) if len(symbol) == 8 else None
+            if quote is None:
+                lines.append(f'var hq_str_{symbol}="";')
+                continue
+            suspended = quote["suspended"]
+            price = 0.0 if suspended else quote["price"]
+            parts = [
+                quote["name"],
+                f"{quote['open'] or 0:.3f}", f"{quote['pre_close']:.3f}", f"{price:.3f}",
+                f"{quote['high'] or 0:.3f}", f"{quote['low'] or 0:.3f}",
+                f"{price:.3f}", f"{price:.3f}",
+                str(quote["volume"] * 100), f"{quote['amount']:.3f}",
+            ]
+            parts += ["0", f"{price:.3f}"] * 10  # 五档买卖盘
+            parts += [now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), "00" if not suspended else "03"]
+            lines.append(f'var hq_str_{symbol}="{",".join(parts)}";')
+        body = "\n".join(lines) + "\n"
+        return web.Response(body=body.encode("gbk"), content_type="application/javascript", charset="gbk")
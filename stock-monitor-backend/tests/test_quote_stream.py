@@ -0,0 +1,122 @@
+"""
+推送行情测试：连接本地模拟服务的 /api/qt/ulist/sse，验证订阅、重新订阅和断线重连
+"""
+import asyncio
+import socket
+
+from aiohttp import web
+
+from app.core.http_client import http_client
+from app.services.data_fetcher import data_fetcher
+from app.services.quote_stream import QuoteStreamService, SOURCE_MONITORS, SOURCE_WEBSOCKET
+from simulator.market import SyntheticMarket
+from simulator.server import SimulatorConfig, UpstreamSimulator
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _serve(market: SyntheticMarket, port: int) -> web.AppRunner:
+    simulator = UpstreamSimulator(market, SimulatorConfig(tick_interval=0.05, active_ratio=1.0))
+    runner = web.AppRunner(simulator.create_app(), shutdown_timeout=0.1)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "等待超时"
+        await asyncio.sleep(0.02)
+
+
+def _make_stream(port: int) -> QuoteStreamService:
+    stream = QuoteStreamService()
+    stream.enabled = True
+    stream.url = f"http://127.0.0.1:{port}/api/qt/ulist/sse"
+    stream.reconnect_min = 0.05
+    stream.reconnect_max = 0.2
+    return stream
+
+
+def test_resubscribe_and_reconnect(monkeypatch):
+    market = SyntheticMarket(symbols=20, seed=7, history_days=5)
+    first, second, third = market.codes[:3]
+    received = []
+    monkeypatch.setattr(data_fetcher, "put_monitor_quote", lambda code, quote: received.append(code))
+
+    async def scenario():
+        port = _free_port()
+        runner = await _serve(market, port)
+        stream = _make_stream(port)
+        try:
+            stream.set_codes(SOURCE_WEBSOCKET, [first])
+            await stream.start()
+            await _wait_for(lambda: first in received)
+            assert stream.connected
+            assert stream.get_status()["codes"] == 1
+
+            # 订阅列表变化：断开旧连接，按新列表重新订阅
+            stream.set_codes(SOURCE_WEBSOCKET, [first, second])
+            await _wait_for(lambda: second in received)
+            assert stream.get_status()["codes"] == 2
+            assert stream.reconnect_count == 0
+
+            # 服务端断开：按退避重连，恢复后继续收到推送
+            await runner.cleanup()
+            await _wait_for(lambda: not stream.connected)
+            received.clear()
+            runner = await _serve(market, port)
+            stream.set_codes(SOURCE_WEBSOCKET, [first, second, third])
+            await _wait_for(lambda: third in received and stream.connected)
+            assert stream.reconnect_count >= 1
+        finally:
+            await stream.stop()
+            await runner.cleanup()
+            await http_client.close()
+
+    asyncio.run(scenario())
+
+
+def test_monitors_follow_leadership(monkeypatch):
+    market = SyntheticMarket(symbols=20, seed=7, history_days=5)
+    monitored, watched = market.codes[:2]
+    monkeypatch.setattr(data_fetcher, "put_monitor_quote", lambda code, quote: None)
+
+    async def scenario():
+        port = _free_port()
+        runner = await _serve(market, port)
+        stream = _make_stream(port)
+
+        async def refresh():
+            stream.set_codes(SOURCE_MONITORS, [monitored])
+            await asyncio.Event().wait()
+
+        monkeypatch.setattr(stream, "_refresh_monitored_codes", refresh)
+        try:
+            # 非主进程只订阅自己的 WebSocket 股票
+            stream.set_codes(SOURCE_WEBSOCKET, [watched])
+            await stream.start()
+            await _wait_for(lambda: stream.connected)
+            assert stream.codes == [watched]
+
+            # 当选主进程后加入活跃监测股票
+            await stream.start_monitors()
+            await _wait_for(lambda: stream.get_status()["codes"] == 2)
+            assert stream.get_status()["monitors"]
+
+            # 卸任后移除活跃监测股票
+            await stream.stop_monitors()
+            await _wait_for(lambda: stream.get_status()["codes"] == 1 and stream.connected)
+            assert stream.codes == [watched]
+        finally:
+            await stream.stop()
+            await runner.cleanup()
+            await http_client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,49 @@
+"""
+全市场信号扫描测试：上市较晚（矩阵开头为 NaN）的股票只在预热区间内不触发信号
+"""
+import numpy as np
+
+from app.services.universe_scan import align_closes, compute_signals
+
+
+def _dates(start: int, count: int) -> np.ndarray:
+    days = np.datetime64("2024-01-01") + np.arange(start, start + count)
+    return days.astype("<U10")
+
+
+def test_late_listed_row_matches_own_history():
+    rng = np.random.default_rng(42)
+    bars, listed_at = 160, 60
+    prices = np.round(np.cumsum(rng.normal(0, 0.6, (2, bars)), axis=1) + 30, 2)
+    series = [
+        (_dates(0, bars), prices[0]),
+        (_dates(listed_at, bars - listed_at), prices[1, listed_at:]),  # 晚上市
+    ]
+    _, closes = align_closes(series, bars)
+    assert np.isnan(closes[1, :listed_at]).all()
+
+    signals = compute_signals(closes)
+    alone = compute_signals(prices[1:, listed_at:])
+
+    triggered = 0
+    for signal_type, (hits, values) in signals.items():
+        # 上市前不触发，上市后与只用该股票自身历史计算的结果一致
+        assert not hits[1, :listed_at].any(), signal_type
+        np.testing.assert_array_equal(hits[1, listed_at:], alone[signal_type][0][0], err_msg=signal_type)
+        np.testing.assert_allclose(values[1, listed_at:], alone[signal_type][1][0], err_msg=signal_type)
+        triggered += int(hits[1].sum())
+    assert triggered > 0
+
+
+def test_full_history_row_unaffected_by_late_row():
+    rng = np.random.default_rng(7)
+    bars = 120
+    prices = np.round(np.cumsum(rng.normal(0, 0.6, (2, bars)), axis=1) + 30, 2)
+    mixed = prices.copy()
+    mixed[1, :50] = np.nan
+
+    signals = compute_signals(mixed)
+    alone = compute_signals(prices[:1])
+    for signal_type, (hits, values) in signals.items():
+        np.testing.assert_array_equal(hits[0], alone[signal_type][0][0], err_msg=signal_type)
+        np.testing.assert_allclose(values[0], alone[signal_type][1][0], err_msg=signal_type)